@@ -5,6 +5,22 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+Despliegue con ASGI (opcional; el Procfile sigue usando WSGI):
+
+    pip install "uvicorn[standard]"
+    gunicorn carlos_roque.asgi:application -k uvicorn.workers.UvicornWorker \
+        --bind 0.0.0.0:$PORT --workers 2 --timeout 120
+
+Con ASGI las vistas async (/api/buscar/, /productos/autocomplete/) no ocupan un
+thread por petición mientras esperan el debounce del servidor (con WSGI no se espera:
+solo queda el del navegador), y si el navegador cancela la petición (AbortController)
+Django cancela la vista. Las vistas síncronas siguen funcionando igual (corren en un
+thread aparte).
+
+Para comparar contra WSGI, levantar ambos servidores y correr:
+
+    python manage.py bench_busqueda --base http://127.0.0.1:8000 --base http://127.0.0.1:8001
 """
 
 import os
@@ -27,7 +27,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
-    "whitenoise.middleware.WhiteNoiseMiddleware",  # 👈 justo aquí
+    "sistema.middleware.AsyncWhiteNoiseMiddleware",  # 👈 justo aquí (WhiteNoise + async)
+    "sistema.lectura.LecturaPegajosaMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -67,10 +68,45 @@ else:
         "default": dj_database_url.parse(
             DATABASE_URL,
             conn_max_age=600,
-            ssl_require=True,
+            # DATABASE_SSL=0 para un PostgreSQL local (pruebas de carga)
+            ssl_require=os.environ.get("DATABASE_SSL", "1") == "1",
         )
     }
 
+# Conexión de solo lectura para listados, reportes y exportaciones (sistema/lectura.py):
+# una réplica de PostgreSQL, o con SQLite el mismo archivo (se abre en modo solo lectura).
+DATABASE_LECTURA_URL = os.environ.get("DATABASE_LECTURA_URL", "")
+
+if DATABASE_LECTURA_URL.startswith("sqlite"):
+    DATABASES["lectura"] = dj_database_url.parse(DATABASE_LECTURA_URL)
+    DATABASES["lectura"]["NAME"] = f"file:{DATABASES['lectura']['NAME']}?mode=ro"
+elif DATABASE_LECTURA_URL:
+    DATABASES["lectura"] = dj_database_url.parse(
+        DATABASE_LECTURA_URL,
+        conn_max_age=600,
+        ssl_require=os.environ.get("DATABASE_SSL", "1") == "1",
+    )
+if DATABASE_LECTURA_URL:
+    # En pruebas es la misma BD de prueba que default
+    DATABASES["lectura"]["TEST"] = {"MIRROR": "default"}
+
+LECTURA_DB = "lectura" if DATABASE_LECTURA_URL else None
+# Segundos que un navegador lee de default después de escribir (atraso de la réplica)
+LECTURA_PEGAJOSA = int(os.environ.get("LECTURA_PEGAJOSA", "10"))
+DATABASE_ROUTERS = ["sistema.lectura.RouterLectura"]
+
+
+# Errores 500 (con traceback) a stderr también con DEBUG=0: así llegan a los logs de
+# Render y la prueba de carga puede contar bloqueos de BD
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {"console": {"class": "logging.StreamHandler"}},
+    "loggers": {
+        "django.request": {"handlers": ["console"], "level": "ERROR", "propagate": False},
+    },
+}
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {"NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator"},
@@ -91,4 +127,10 @@ STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.environ.get("MEDIA_ROOT", str(BASE_DIR / "media"))
 
+# Snapshot del catálogo de productos compartido entre workers vía mmap (opcional)
+CATALOGO_SNAPSHOT_PATH = os.environ.get("CATALOGO_SNAPSHOT_PATH", "")
+
+# Procesos para leer hojas de remisiones en paralelo (0 = uno por CPU, 1 = sin pool)
+IMPORTACION_PROCESOS = int(os.environ.get("IMPORTACION_PROCESOS", "0"))
+
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
@@ -1,13 +1,17 @@
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
-from django.conf.urls.static import static
+
+from sistema.media import servir_media
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("", include("sistema.urls")),
 ]
 
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+# Media (escaneos de remisiones) también en producción: WhiteNoise solo cubre STATIC_ROOT
+if settings.MEDIA_URL.startswith("/"):
+    urlpatterns += [
+        re_path(rf"^{settings.MEDIA_URL.lstrip('/')}(?P<ruta>.+)$", servir_media, name="media"),
+    ]
 
@@ -1,41 +1,74 @@
 import os
+from decimal import Decimal
+
 import django
-import pandas as pd
 
 # 1) Configurar Django
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "carlos_roque.settings")
 django.setup()
 
-from sistema.models import Producto
+from django.db import transaction
+from django.utils import timezone
+
+from sistema.catalogo import invalidar_catalogo
+from sistema.excel import abrir_libro
+from sistema.models import PrecioProducto, Producto
+from sistema.views import safe_decimal, safe_str
+
 
 def importar_productos():
     # 2) Nombre del archivo (debe estar junto a manage.py)
     archivo = "productos_jc.xlsx"
 
-    # 3) Leer el Excel
-    #   header=1 porque la fila 0 tiene los títulos "CLAVE, DESCRIPCION, PRECIO CJA, PRECIO PZ"
-    df = pd.read_excel(archivo, header=1)
+    # 3) Leer el Excel (openpyxl, sin pandas)
+    #   fila 1: título; fila 2: "CLAVE, DESCRIPCION, ..., PRECIO CJA, PRECIO PZ"
+    ws = abrir_libro(archivo, read_only=True).active
+    filas = ws.iter_rows(values_only=True)
+    next(filas, None)
+    encabezados = [safe_str(c).upper() for c in next(filas, ())]
+    columna = {nombre: i for i, nombre in enumerate(encabezados) if nombre}
 
-    # 4) Recorrer filas e insertar en la BD
-    for _, row in df.iterrows():
-        clave = row.get("CLAVE")
-        descripcion = row.get("DESCRIPCION")
-        precio_caja = row.get("PRECIO CJA")
-        precio_pieza = row.get("PRECIO PZ")
+    def valor(row, nombre):
+        i = columna.get(nombre)
+        return row[i] if i is not None and i < len(row) else None
 
-        # Si no hay clave o descripción, saltamos la fila
-        if pd.isna(clave) and pd.isna(descripcion):
-            continue
+    # 4) Recorrer filas y crear/actualizar en la BD
+    hoy = timezone.localdate()
+    centavo = Decimal("0.01")
+    anteriores = {
+        codigo: (venta_cjs, venta_pzs)
+        for codigo, venta_cjs, venta_pzs in Producto.objects.values_list("codigo", "venta_cjs", "venta_pzs")
+    }
+    creados = actualizados = 0
+    historial = []
+    with transaction.atomic():
+        for row in filas:
+            codigo = safe_str(valor(row, "CLAVE"))
+            descripcion = safe_str(valor(row, "DESCRIPCION"))
 
-        Producto.objects.create(
-            clave=clave,
-            descripcion=descripcion,
-            precio_caja=precio_caja,
-            precio_pieza=precio_pieza,
-        )
+            # Si no hay clave, saltamos la fila
+            if not codigo:
+                continue
 
-    print("✅ Productos importados correctamente.")
+            precios = (
+                safe_decimal(valor(row, "PRECIO CJA")).quantize(centavo),
+                safe_decimal(valor(row, "PRECIO PZ")).quantize(centavo),
+            )
+            producto, created = Producto.objects.update_or_create(
+                codigo=codigo,
+                defaults={"descripcion": descripcion, "venta_cjs": precios[0], "venta_pzs": precios[1]},
+            )
+            # Historial de precios solo si el producto es nuevo o cambió de precio
+            if anteriores.get(codigo) != precios:
+                historial.append(PrecioProducto.desde_producto(producto, hoy))
+            if created:
+                creados += 1
+            else:
+                actualizados += 1
+        PrecioProducto.objects.bulk_create(historial, batch_size=1000)
+        transaction.on_commit(invalidar_catalogo)
+
+    print(f"✅ Productos importados correctamente. Nuevos: {creados} | Actualizados: {actualizados}")
 
 if __name__ == "__main__":
     importar_productos()
-
@@ -1,24 +1,163 @@
-from django.contrib import admin
-from .models import Cliente, Producto, Remision, Venta, DetalleVenta
+from django.contrib import admin, messages
+from django.db import transaction
+from django.utils import timezone
+
+from .catalogo import invalidar_catalogo
+from .inventario import registrar_salidas_venta
+from .lectura import ListadoDeLecturaMixin
+from .models import (
+    Cliente,
+    DetalleVenta,
+    DetalleVentaArchivada,
+    DuplicadoCliente,
+    Importacion,
+    LineaHabitual,
+    MovimientoInventario,
+    PedidoHabitual,
+    PeriodoCerrado,
+    PrecioProducto,
+    Producto,
+    Remision,
+    Venta,
+    VentaArchivada,
+)
+from .similitud import fusionar_clientes, indexar_clientes
+from .sugerencias import marcar_desactualizados
 
 
 # --------------------------
 # ADMIN CLIENTE
 # --------------------------
 @admin.register(Cliente)
-class ClienteAdmin(admin.ModelAdmin):
+class ClienteAdmin(ListadoDeLecturaMixin, admin.ModelAdmin):
     list_display = ("numero", "proveedor", "comercio", "contacto", "telefono")
     search_fields = ("proveedor", "comercio", "contacto", "telefono")
 
+    actions = ["fusionar_en_el_mas_antiguo"]
+
+    # Mantiene las claves de bloqueo para la búsqueda de parecidos
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        indexar_clientes([obj])
+
+    @admin.action(description="Fusionar seleccionados en el más antiguo")
+    def fusionar_en_el_mas_antiguo(self, request, queryset):
+        clientes = list(queryset.order_by("pk"))
+        if len(clientes) < 2:
+            self.message_user(request, "Selecciona al menos dos clientes.", messages.WARNING)
+            return
+        try:
+            movidas = fusionar_clientes(clientes[0], clientes[1:])
+        except ValueError as e:
+            self.message_user(request, str(e), messages.ERROR)
+            return
+        self.message_user(
+            request,
+            f"{len(clientes) - 1} cliente(s) fusionados en {clientes[0]} | Remisiones movidas: {movidas}",
+            messages.SUCCESS,
+        )
+
+
+# --------------------------
+# ADMIN POSIBLES DUPLICADOS (los marcan los importadores)
+# --------------------------
+@admin.register(DuplicadoCliente)
+class DuplicadoClienteAdmin(admin.ModelAdmin):
+    list_display = ("cliente", "candidato", "similitud", "importacion", "created_at")
+    list_select_related = ("cliente", "candidato", "importacion")
+    list_filter = ("importacion",)
+    search_fields = ("cliente__proveedor", "cliente__comercio", "candidato__proveedor", "candidato__comercio")
+
+    actions = ["fusionar"]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    @admin.action(description="Fusionar cada cliente en su candidato")
+    def fusionar(self, request, queryset):
+        fusionados = 0
+        for duplicado in queryset.select_related("cliente", "candidato"):
+            # Una fusión anterior de la misma tanda pudo borrar a alguno de los dos
+            if Cliente.objects.filter(pk__in=[duplicado.cliente_id, duplicado.candidato_id]).count() < 2:
+                continue
+            try:
+                fusionar_clientes(duplicado.candidato, [duplicado.cliente])
+            except ValueError as e:
+                self.message_user(request, str(e), messages.ERROR)
+                continue
+            fusionados += 1
+        self.message_user(request, f"Clientes fusionados: {fusionados}", messages.SUCCESS)
+
+
+# --------------------------
+# ADMIN PEDIDO HABITUAL (solo lectura; lo calcula sistema.sugerencias)
+# --------------------------
+class LineaHabitualInline(admin.TabularInline):
+    model = LineaHabitual
+    fields = ("producto", "unidad", "cantidad", "veces", "ultima_fecha")
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(PedidoHabitual)
+class PedidoHabitualAdmin(admin.ModelAdmin):
+    inlines = [LineaHabitualInline]
+    list_display = ("cliente", "ventas", "vigente", "calculado_en")
+    list_select_related = ("cliente",)
+    list_filter = ("vigente",)
+    search_fields = ("cliente__proveedor", "cliente__comercio")
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
 
 # --------------------------
 # ADMIN PRODUCTO
 # --------------------------
 @admin.register(Producto)
 class ProductoAdmin(admin.ModelAdmin):
-    list_display = ("codigo", "descripcion", "compra_cjs", "compra_pzs", "venta_cjs", "venta_pzs")
+    list_display = ("codigo", "descripcion", "compra_cjs", "compra_pzs", "venta_cjs", "venta_pzs", "piezas_por_paquete")
     search_fields = ("codigo", "descripcion")
 
+    # Cualquier cambio de precios/códigos invalida el snapshot del catálogo
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if not change or set(form.changed_data) & set(PrecioProducto.CAMPOS_PRECIO):
+            PrecioProducto.desde_producto(obj, timezone.localdate()).save()
+        transaction.on_commit(invalidar_catalogo)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        transaction.on_commit(invalidar_catalogo)
+
+    def delete_queryset(self, request, queryset):
+        super().delete_queryset(request, queryset)
+        transaction.on_commit(invalidar_catalogo)
+
+
+# --------------------------
+# ADMIN HISTORIAL DE PRECIOS (solo lectura)
+# --------------------------
+@admin.register(PrecioProducto)
+class PrecioProductoAdmin(admin.ModelAdmin):
+    list_display = ("producto", "vigente_desde", "compra_cjs", "compra_pzs", "venta_cjs", "venta_pzs", "importacion")
+    list_select_related = ("producto", "importacion")
+    search_fields = ("producto__codigo", "producto__descripcion")
+    date_hierarchy = "vigente_desde"
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
 
 # --------------------------
 # INLINE DETALLE VENTA
@@ -35,23 +174,34 @@ class DetalleVentaInline(admin.TabularInline):
 # ADMIN REMISION
 # --------------------------
 @admin.register(Remision)
-class RemisionAdmin(admin.ModelAdmin):
+class RemisionAdmin(ListadoDeLecturaMixin, admin.ModelAdmin):
     list_display = ("folio", "cliente", "fecha", "tiene_imagen")
     search_fields = ("folio", "cliente__comercio", "cliente__proveedor")
     list_filter = ("fecha", "cliente")
     date_hierarchy = "fecha"
 
+    actions = ["crear_ventas_faltantes"]
+
     def tiene_imagen(self, obj):
         return bool(obj.imagen)
     tiene_imagen.boolean = True
     tiene_imagen.short_description = "Imagen"
 
+    @admin.action(description="Crear ventas para remisiones seleccionadas sin venta")
+    def crear_ventas_faltantes(self, request, queryset):
+        creadas, ya_tenian = Venta.objects.crear_para_remisiones(queryset)
+        self.message_user(
+            request,
+            f"Ventas creadas: {creadas} | Ya tenían venta: {ya_tenian}",
+            messages.SUCCESS,
+        )
+
 
 # --------------------------
 # ADMIN VENTA (con filtro por cliente y búsqueda por producto)
 # --------------------------
 @admin.register(Venta)
-class VentaAdmin(admin.ModelAdmin):
+class VentaAdmin(ListadoDeLecturaMixin, admin.ModelAdmin):
     inlines = [DetalleVentaInline]
 
     list_display = ("id", "fecha", "folio_remision", "cliente", "subtotal", "descuento", "iva", "total")
@@ -79,17 +229,129 @@ class VentaAdmin(admin.ModelAdmin):
         return obj.remision.cliente
     cliente.short_description = "Cliente"
 
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        registrar_salidas_venta(form.instance)
+        marcar_desactualizados([form.instance.cliente_id])
+        Venta.objects.subir_version([form.instance.pk])
+
     @admin.action(description="Recalcular totales de ventas seleccionadas")
     def recalcular_totales(self, request, queryset):
-        for venta in queryset:
-            venta.recalcular_totales(commit=True)
+        ids = []
+        with transaction.atomic():
+            for venta in queryset:
+                venta.recalcular_totales(commit=True)
+                ids.append(venta.pk)
+            Venta.objects.subir_version(ids)
 
 
 # --------------------------
 # ADMIN DETALLE VENTA
 # --------------------------
 @admin.register(DetalleVenta)
-class DetalleVentaAdmin(admin.ModelAdmin):
+class DetalleVentaAdmin(ListadoDeLecturaMixin, admin.ModelAdmin):
     list_display = ("venta", "producto", "unidad", "cantidad", "precio_unitario", "subtotal")
     list_filter = ("producto", "unidad")
     search_fields = ("venta__remision__folio", "producto__codigo", "producto__descripcion")
+
+    # Mantiene el inventario de la venta alineado con sus líneas
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        registrar_salidas_venta(obj.venta)
+        marcar_desactualizados([obj.venta.cliente_id])
+        Venta.objects.subir_version([obj.venta_id])
+
+    def delete_model(self, request, obj):
+        venta = obj.venta
+        super().delete_model(request, obj)
+        registrar_salidas_venta(venta)
+        marcar_desactualizados([venta.cliente_id])
+        Venta.objects.subir_version([venta.pk])
+
+    def delete_queryset(self, request, queryset):
+        ventas = list(Venta.objects.filter(detalles__in=queryset).distinct())
+        super().delete_queryset(request, queryset)
+        for venta in ventas:
+            registrar_salidas_venta(venta)
+        marcar_desactualizados({venta.cliente_id for venta in ventas})
+        Venta.objects.subir_version([venta.pk for venta in ventas])
+
+
+# --------------------------
+# ADMIN INVENTARIO
+# --------------------------
+@admin.register(MovimientoInventario)
+class MovimientoInventarioAdmin(ListadoDeLecturaMixin, admin.ModelAdmin):
+    list_display = ("id", "fecha", "tipo", "producto", "piezas", "venta", "referencia")
+    list_filter = ("tipo",)
+    list_select_related = ("producto",)
+    search_fields = ("producto__codigo", "producto__descripcion", "referencia")
+    date_hierarchy = "fecha"
+    autocomplete_fields = ("producto",)
+    raw_id_fields = ("venta",)
+
+    # Bitácora: los movimientos no se editan, se corrigen con otro movimiento
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+# --------------------------
+# ADMIN IMPORTACION (bitácora)
+# --------------------------
+@admin.register(Importacion)
+class ImportacionAdmin(ListadoDeLecturaMixin, admin.ModelAdmin):
+    list_display = ("created_at", "tipo", "archivo", "filas", "nuevas", "cambiadas", "sin_cambios")
+    list_filter = ("tipo",)
+    search_fields = ("archivo", "sha256")
+    readonly_fields = (
+        "tipo", "archivo", "sha256", "filas", "nuevas", "cambiadas", "sin_cambios", "cambios", "metricas", "perfil",
+    )
+
+
+# --------------------------
+# ADMIN PERIODOS CERRADOS (solo lectura; se cierran con manage.py cerrar_periodo)
+# --------------------------
+@admin.register(PeriodoCerrado)
+class PeriodoCerradoAdmin(admin.ModelAdmin):
+    list_display = ("hasta", "ventas", "lineas", "created_at")
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+class DetalleVentaArchivadaInline(admin.TabularInline):
+    model = DetalleVentaArchivada
+    fields = ("producto", "unidad", "cantidad", "precio_unitario", "subtotal")
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(VentaArchivada)
+class VentaArchivadaAdmin(ListadoDeLecturaMixin, admin.ModelAdmin):
+    inlines = [DetalleVentaArchivadaInline]
+    list_display = ("id", "fecha", "remision", "cliente", "subtotal", "descuento", "iva", "total")
+    list_select_related = ("remision", "cliente")
+    date_hierarchy = "fecha"
+    search_fields = ("remision__folio", "cliente__comercio", "cliente__proveedor")
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
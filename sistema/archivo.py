@@ -0,0 +1,103 @@
+"""
+Archivo de periodos cerrados.
+
+Cerrar un periodo mueve las ventas con fecha < corte (y sus líneas) de Venta /
+DetalleVenta a VentaArchivada / DetalleVentaArchivada con INSERT ... SELECT y DELETE,
+conservando los ids. Las tablas vivas y sus índices quedan del tamaño de los meses
+abiertos; lo archivado ya no se edita (Venta.save rechaza fechas anteriores al corte).
+
+Como todo lo archivado es anterior al corte, el orden (fecha, id) de la historia
+completa es: archivo y luego tablas vivas. Los reportes piden a `fuentes()` qué
+tablas tocan para su rango y juntan los resultados en ese orden.
+"""
+from django.db import connection, transaction
+
+from .models import (
+    DetalleVenta,
+    DetalleVentaArchivada,
+    MovimientoInventario,
+    PeriodoCerrado,
+    Venta,
+    VentaArchivada,
+)
+
+VIVAS = (Venta, DetalleVenta)
+ARCHIVO = (VentaArchivada, DetalleVentaArchivada)
+
+
+def fuentes(desde=None, hasta=None, corte=None):
+    """
+    [(modelo de venta, modelo de detalle), ...] que pueden tener ventas con fecha en
+    [desde, hasta], en orden cronológico. Sin periodos cerrados, solo las vivas.
+    """
+    corte = corte or PeriodoCerrado.corte()
+    if corte is None:
+        return [VIVAS]
+    tablas = []
+    if desde is None or desde < corte:
+        tablas.append(ARCHIVO)
+    if hasta is None or hasta >= corte:
+        tablas.append(VIVAS)
+    return tablas
+
+
+def _columnas(modelo):
+    q = connection.ops.quote_name
+    return ", ".join(q(campo.column) for campo in modelo._meta.concrete_fields)
+
+
+def _copiar(origen, destino, condicion, params):
+    """INSERT ... SELECT de las filas de `origen` que cumplen `condicion`; regresa cuántas."""
+    q = connection.ops.quote_name
+    columnas = _columnas(destino)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {q(destino._meta.db_table)} ({columnas}) "
+            f"SELECT {columnas} FROM {q(origen._meta.db_table)} WHERE {condicion}",
+            params,
+        )
+        return cursor.rowcount
+
+
+def _borrar(modelo, condicion, params):
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {connection.ops.quote_name(modelo._meta.db_table)} WHERE {condicion}", params)
+
+
+@transaction.atomic
+def cerrar_periodo(hasta):
+    """
+    Archiva las ventas con fecha < hasta. Regresa el PeriodoCerrado creado.
+    Lanza ValueError si `hasta` no es posterior al corte vigente.
+    """
+    corte = PeriodoCerrado.corte()
+    if corte is not None and hasta <= corte:
+        raise ValueError(f"Ya está cerrado hasta el {corte:%Y-%m-%d}.")
+
+    q = connection.ops.quote_name
+    if connection.vendor == "postgresql":
+        # Sin escrituras concurrentes entre el INSERT ... SELECT y el DELETE
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"LOCK TABLE {q(Venta._meta.db_table)}, {q(DetalleVenta._meta.db_table)} "
+                "IN SHARE ROW EXCLUSIVE MODE"
+            )
+
+    # Los movimientos de inventario se quedan (el saldo no cambia); solo se sueltan de
+    # la venta, que sigue identificada en `referencia`
+    MovimientoInventario.objects.filter(venta__fecha__lt=hasta).update(venta=None)
+
+    ventas_viejas = f"SELECT {q('id')} FROM {q(Venta._meta.db_table)} WHERE {q('fecha')} < %s"
+    de_ventas_viejas = f"{q('venta_id')} IN ({ventas_viejas})"
+    ventas = _copiar(Venta, VentaArchivada, f"{q('fecha')} < %s", [hasta])
+    lineas = _copiar(DetalleVenta, DetalleVentaArchivada, de_ventas_viejas, [hasta])
+    _borrar(DetalleVenta, de_ventas_viejas, [hasta])
+    _borrar(Venta, f"{q('fecha')} < %s", [hasta])
+    return PeriodoCerrado.objects.create(hasta=hasta, ventas=ventas, lineas=lineas)
+
+
+def analizar_tablas():
+    """Actualiza estadísticas del planeador después de un cierre (fuera de la transacción)."""
+    with connection.cursor() as cursor:
+        for modelo in (*VIVAS, *ARCHIVO):
+            cursor.execute(f"ANALYZE {connection.ops.quote_name(modelo._meta.db_table)}")
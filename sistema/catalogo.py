@@ -0,0 +1,286 @@
+"""
+Snapshot de solo lectura del catálogo de productos.
+
+Las búsquedas de precio por código (defaults de precio, autocompletado, importadores)
+se resuelven en memoria sin tocar la BD. El snapshot se arma una vez por versión del
+catálogo; los importadores llaman a invalidar_catalogo() para subir la versión.
+
+Formato (un solo bloque de bytes, igual en memoria que en archivo):
+    encabezado  MAGIC + n
+    int64[n]    id, compra_cjs, compra_pzs, venta_cjs, venta_pzs (precios en centavos)
+    int64[n]    posiciones ordenadas por id (para buscar por id con bisect)
+    int64[n+1]  offsets de código, int64[n+1] offsets de descripción
+    bytes       códigos utf-8 (ordenados), descripciones utf-8
+
+Si settings.CATALOGO_SNAPSHOT_PATH está definido, el bloque se guarda en ese archivo y
+cada worker de gunicorn lo abre con mmap: las páginas se comparten entre procesos y el
+cambio de versión se detecta por el mtime del archivo. Sin archivo, la versión es el
+renglón VersionCatalogo de la BD (una consulta por pk), que ven todos los workers en
+cuanto se confirma. En ambos casos no usarlo para decisiones que escriben en la BD: para
+eso está CatalogoSnapshot.desde_bd().
+"""
+import mmap
+import os
+import struct
+import tempfile
+import threading
+from bisect import bisect_left
+from decimal import Decimal
+from typing import NamedTuple
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+from .models import Producto, VersionCatalogo
+
+MAGIC = b"JCRCAT01"
+# Orden de bytes nativo: el archivo solo se comparte entre procesos de la misma máquina
+_ENCABEZADO = struct.Struct("=8sQ")
+_COLUMNAS = ("id", "compra_cjs", "compra_pzs", "venta_cjs", "venta_pzs")
+
+_lock = threading.Lock()
+_snapshot = None
+
+
+class ProductoPrecio(NamedTuple):
+    id: int
+    codigo: str
+    descripcion: str
+    compra_cjs: Decimal
+    compra_pzs: Decimal
+    venta_cjs: Decimal
+    venta_pzs: Decimal
+
+    def precio_venta(self, unidad):
+        """Precio de venta por unidad de DetalleVenta (PAQ -> caja, PZA -> pieza)."""
+        return self.venta_cjs if unidad == "PAQ" else self.venta_pzs
+
+
+class _Textos:
+    """Secuencia de str sobre un blob utf-8 + offsets; sirve directo para bisect."""
+
+    def __init__(self, offsets, blob):
+        self.offsets = offsets
+        self.blob = blob
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return str(self.blob[self.offsets[i]:self.offsets[i + 1]], "utf-8")
+
+
+class _IdsOrdenados:
+    """Vista de los ids en orden ascendente (ids[orden[k]]) para bisect por id."""
+
+    def __init__(self, ids, orden):
+        self.ids = ids
+        self.orden = orden
+
+    def __len__(self):
+        return len(self.orden)
+
+    def __getitem__(self, k):
+        return self.ids[self.orden[k]]
+
+
+def _centavos(valor):
+    return int((valor or Decimal("0")) * 100)
+
+
+def _pesos(centavos):
+    return Decimal(centavos).scaleb(-2)
+
+
+def construir_bytes():
+    """Lee Producto una sola vez y regresa el bloque binario del snapshot."""
+    # Siempre de default: un snapshot armado de una réplica atrasada quedaría fijo con la
+    # versión nueva hasta la siguiente invalidación (ver sistema.lectura)
+    filas = sorted(
+        Producto.objects.using(DEFAULT_DB_ALIAS).values_list("codigo", "descripcion", *_COLUMNAS),
+        key=lambda fila: fila[0],
+    )
+    n = len(filas)
+
+    columnas = [[fila[2]] + [_centavos(v) for v in fila[3:]] for fila in filas]
+    orden_por_id = sorted(range(n), key=lambda i: columnas[i][0])
+
+    codigos = [fila[0].encode("utf-8") for fila in filas]
+    descripciones = [fila[1].encode("utf-8") for fila in filas]
+
+    def offsets(partes):
+        salida = [0]
+        for parte in partes:
+            salida.append(salida[-1] + len(parte))
+        return salida
+
+    enteros = []
+    for c in range(len(_COLUMNAS)):
+        enteros.extend(col[c] for col in columnas)
+    enteros.extend(orden_por_id)
+    enteros.extend(offsets(codigos))
+    enteros.extend(offsets(descripciones))
+
+    return b"".join([
+        _ENCABEZADO.pack(MAGIC, n),
+        struct.pack(f"={len(enteros)}q", *enteros),
+        b"".join(codigos),
+        b"".join(descripciones),
+    ])
+
+
+class CatalogoSnapshot:
+    """Catálogo en columnas sobre un buffer (bytes o mmap). No modifica la BD."""
+
+    def __init__(self, buffer, firma):
+        self.firma = firma
+        self._buffer = buffer
+
+        magic, n = _ENCABEZADO.unpack_from(buffer, 0)
+        if magic != MAGIC:
+            raise ValueError("Archivo de catálogo inválido.")
+
+        vista = memoryview(buffer)
+        inicio = _ENCABEZADO.size
+        fin_enteros = inicio + 8 * (len(_COLUMNAS) * n + n + 2 * (n + 1))
+        enteros = vista[inicio:fin_enteros].cast("q")
+
+        cols = {}
+        pos = 0
+        for nombre in _COLUMNAS:
+            cols[nombre] = enteros[pos:pos + n]
+            pos += n
+        orden = enteros[pos:pos + n]
+        pos += n
+        off_codigos = enteros[pos:pos + n + 1]
+        pos += n + 1
+        off_descripciones = enteros[pos:pos + n + 1]
+
+        blob_codigos = vista[fin_enteros:fin_enteros + off_codigos[n]]
+        blob_descripciones = vista[fin_enteros + off_codigos[n]:]
+
+        self._cols = cols
+        self.codigos = _Textos(off_codigos, blob_codigos)
+        self.descripciones = _Textos(off_descripciones, blob_descripciones)
+        self._ids = _IdsOrdenados(cols["id"], orden)
+        self._orden = orden
+        self._opciones = None
+
+    @classmethod
+    def desde_bd(cls, firma=None):
+        """Snapshot recién leído de la BD (una sola consulta), sin pasar por la versión."""
+        return cls(construir_bytes(), firma)
+
+    def __len__(self):
+        return len(self.codigos)
+
+    def _fila(self, i):
+        cols = self._cols
+        return ProductoPrecio(
+            id=cols["id"][i],
+            codigo=self.codigos[i],
+            descripcion=self.descripciones[i],
+            compra_cjs=_pesos(cols["compra_cjs"][i]),
+            compra_pzs=_pesos(cols["compra_pzs"][i]),
+            venta_cjs=_pesos(cols["venta_cjs"][i]),
+            venta_pzs=_pesos(cols["venta_pzs"][i]),
+        )
+
+    def por_codigo(self, codigo):
+        i = bisect_left(self.codigos, codigo)
+        if i < len(self) and self.codigos[i] == codigo:
+            return self._fila(i)
+        return None
+
+    def por_id(self, producto_id):
+        k = bisect_left(self._ids, producto_id)
+        if k < len(self._ids) and self._ids[k] == producto_id:
+            return self._fila(self._orden[k])
+        return None
+
+    def opciones(self):
+        """Choices para un <select> de productos (se calculan una vez por snapshot)."""
+        if self._opciones is None:
+            self._opciones = [("", "---------")] + [
+                (self._cols["id"][i], f"{self.codigos[i]} - {self.descripciones[i]}")
+                for i in range(len(self))
+            ]
+        return self._opciones
+
+    def con_prefijo(self, prefijo, limite=20):
+        """Productos cuyo código empieza con `prefijo`, en orden de código."""
+        salida = []
+        i = bisect_left(self.codigos, prefijo)
+        while i < len(self) and len(salida) < limite:
+            if not self.codigos[i].startswith(prefijo):
+                break
+            salida.append(self._fila(i))
+            i += 1
+        return salida
+
+
+# -----------------------------
+# VERSIONADO / ARCHIVO COMPARTIDO
+# -----------------------------
+def _ruta_archivo():
+    return getattr(settings, "CATALOGO_SNAPSHOT_PATH", "")
+
+
+def escribir_archivo(ruta):
+    """Escribe el snapshot de forma atómica (archivo temporal + os.replace)."""
+    datos = construir_bytes()
+    carpeta = os.path.dirname(os.path.abspath(ruta))
+    os.makedirs(carpeta, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=carpeta, prefix=".catalogo-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(datos)
+        os.replace(tmp, ruta)
+    except Exception:
+        os.unlink(tmp)
+        raise
+
+
+def _abrir_archivo(ruta):
+    with open(ruta, "rb") as f:
+        firma = os.fstat(f.fileno()).st_mtime_ns
+        # El mapeo sigue vivo aunque se cierre el archivo o se reemplace en disco
+        return CatalogoSnapshot(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ), firma)
+
+
+def obtener_catalogo():
+    """Snapshot vigente; se reconstruye solo si cambió la versión del catálogo."""
+    global _snapshot
+    ruta = _ruta_archivo()
+
+    if ruta:
+        try:
+            firma = os.stat(ruta).st_mtime_ns
+        except FileNotFoundError:
+            firma = None
+    else:
+        firma = VersionCatalogo.actual(using=DEFAULT_DB_ALIAS)
+
+    actual = _snapshot
+    if actual is not None and firma is not None and actual.firma == firma:
+        return actual
+
+    with _lock:
+        if _snapshot is not None and firma is not None and _snapshot.firma == firma:
+            return _snapshot
+        if ruta:
+            if firma is None:
+                escribir_archivo(ruta)
+            _snapshot = _abrir_archivo(ruta)
+        else:
+            _snapshot = CatalogoSnapshot.desde_bd(firma)
+        return _snapshot
+
+
+def invalidar_catalogo():
+    """Cambia la versión del catálogo. Llamar después de importar/editar productos."""
+    VersionCatalogo.subir()
+
+    ruta = _ruta_archivo()
+    if ruta:
+        escribir_archivo(ruta)
@@ -0,0 +1,21 @@
+"""
+Lectura/escritura de Excel con openpyxl, cargado bajo demanda.
+
+openpyxl (y Pillow, que openpyxl importa si está instalado) pesa varios MB y decenas de
+ms de arranque; solo lo usan los importadores. Las vistas importan este módulo, que no
+carga openpyxl hasta que se abre o se crea el primer libro en ese proceso.
+"""
+
+
+def abrir_libro(archivo, **opciones):
+    """load_workbook con valores calculados (data_only) por default."""
+    from openpyxl import load_workbook
+
+    opciones.setdefault("data_only", True)
+    return load_workbook(archivo, **opciones)
+
+
+def libro_nuevo():
+    from openpyxl import Workbook
+
+    return Workbook()
@@ -1,6 +1,9 @@
+from decimal import Decimal
+
 from django import forms
 from django.forms import inlineformset_factory
-from .models import Remision, Venta, DetalleVenta
+from .catalogo import obtener_catalogo
+from .models import DetalleVenta, Producto, Remision, Venta
 
 
 class RemisionForm(forms.ModelForm):
@@ -25,7 +28,8 @@ class VentaForm(forms.ModelForm):
         model = Venta
         fields = ["fecha", "descuento", "iva"]
         widgets = {
-            "fecha": forms.DateInput(attrs={"type": "date", "class": "form-control"}),
+            # <input type="date"> solo acepta AAAA-MM-DD; con el formato local se ve vacío
+            "fecha": forms.DateInput(format="%Y-%m-%d", attrs={"type": "date", "class": "form-control"}),
             "descuento": forms.NumberInput(attrs={"class": "form-control", "step": "0.01"}),
             "iva": forms.NumberInput(attrs={"class": "form-control", "step": "0.01"}),
         }
@@ -39,9 +43,34 @@ class DetalleVentaForm(forms.ModelForm):
             "producto": forms.Select(attrs={"class": "form-select"}),
             "unidad": forms.Select(attrs={"class": "form-select"}),
             "cantidad": forms.NumberInput(attrs={"class": "form-control", "step": "0.001"}),
-            "precio_unitario": forms.NumberInput(attrs={"class": "form-control", "step": "0.01"}),
+            "precio_unitario": forms.NumberInput(
+                attrs={"class": "form-control", "step": "0.01", "placeholder": "Precio de lista"}
+            ),
         }
 
+    def __init__(self, *args, catalogo=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # El select se arma desde el snapshot del catálogo: sin un query por renglón.
+        # Si el snapshot aún no trae el producto de la línea, se queda el queryset normal.
+        # El formset lo pasa en form_kwargs para consultar la versión una sola vez.
+        if catalogo is None:
+            catalogo = obtener_catalogo()
+        producto_id = self.instance.producto_id
+        if not producto_id or catalogo.por_id(producto_id) is not None:
+            self.fields["producto"].widget.choices = catalogo.opciones()
+        # Si se deja vacío, se usa el precio de lista del producto según la unidad
+        self.fields["precio_unitario"].required = False
+
+    def clean(self):
+        cleaned = super().clean()
+        producto = cleaned.get("producto")
+        if producto and cleaned.get("precio_unitario") is None:
+            if cleaned.get("unidad") == DetalleVenta.UNIDAD_PAQUETES:
+                cleaned["precio_unitario"] = producto.venta_cjs
+            else:
+                cleaned["precio_unitario"] = producto.venta_pzs
+        return cleaned
+
 
 DetalleVentaFormSet = inlineformset_factory(
     Venta,
@@ -50,3 +79,26 @@ DetalleVentaFormSet = inlineformset_factory(
     extra=5,          # 5 renglones vacíos por default (puedes subirlo)
     can_delete=True,  # permite borrar líneas
 )
+
+
+class EntradaInventarioForm(forms.Form):
+    producto = forms.ModelChoiceField(
+        queryset=Producto.objects.order_by("codigo"),
+        widget=forms.Select(attrs={"class": "form-select"}),
+    )
+    unidad = forms.ChoiceField(
+        choices=DetalleVenta.UNIDAD_CHOICES,
+        initial=DetalleVenta.UNIDAD_PAQUETES,
+        widget=forms.Select(attrs={"class": "form-select"}),
+    )
+    cantidad = forms.DecimalField(
+        max_digits=12,
+        decimal_places=3,
+        min_value=Decimal("0.001"),
+        widget=forms.NumberInput(attrs={"class": "form-control", "step": "0.001"}),
+    )
+    referencia = forms.CharField(
+        required=False,
+        max_length=255,
+        widget=forms.TextInput(attrs={"class": "form-control", "placeholder": "Factura / proveedor (opcional)"}),
+    )
@@ -0,0 +1,121 @@
+"""
+Bitácora de importaciones (idempotencia).
+
+- Si se sube un archivo idéntico (mismo sha256) a uno ya importado, no se hace nada.
+- Si cambió, cada fila se compara por huella contra la última importación y solo se
+  escriben las filas nuevas o distintas.
+"""
+import hashlib
+
+from django.db import transaction
+
+from .models import HuellaFila, Importacion
+
+# Cuántas claves guardar en Importacion.cambios para mostrar en pantalla
+MAX_CLAVES_RESUMEN = 200
+
+
+def hash_archivo(archivo) -> str:
+    """sha256 de un UploadedFile (por chunks); deja el archivo al inicio."""
+    h = hashlib.sha256()
+    archivo.seek(0)
+    for chunk in archivo.chunks():
+        h.update(chunk)
+    archivo.seek(0)
+    return h.hexdigest()
+
+
+def hash_archivos(archivos) -> str:
+    """sha256 de uno o varios archivos; con varios, no depende del orden en que se suban."""
+    if len(archivos) == 1:
+        return hash_archivo(archivos[0])
+    hashes = sorted(hash_archivo(archivo) for archivo in archivos)
+    return hashlib.sha256("\n".join(hashes).encode("ascii")).hexdigest()
+
+
+def huella(*valores) -> str:
+    """Hash estable de los valores normalizados de una fila."""
+    texto = "\x1f".join("" if v is None else str(v) for v in valores)
+    return hashlib.sha1(texto.encode("utf-8")).hexdigest()
+
+
+class RegistroImportacion:
+    """
+    Acompaña a un importador:
+
+        registro = RegistroImportacion(Importacion.TIPO_PRODUCTOS, archivo)
+        if registro.ya_importado(): ...
+        if registro.cambio(codigo, huella(...)): escribir la fila
+        registro.guardar()
+    """
+
+    def __init__(self, tipo, archivo, forzar=False):
+        self.tipo = tipo
+        # forzar: reimportar aunque el archivo o las filas no hayan cambiado
+        self.forzar = forzar
+        # archivo: un UploadedFile o una lista (varios libros en la misma importación)
+        archivos = archivo if isinstance(archivo, (list, tuple)) else [archivo]
+        self.nombre = ", ".join(getattr(a, "name", "") or "" for a in archivos)
+        self.sha256 = hash_archivos(archivos)
+        self._huellas = None
+        self._pendientes = {}
+        self.filas = 0
+        self.sin_cambios = 0
+        self.nuevas = []
+        self.cambiadas = []
+
+    def ya_importado(self):
+        """Importación previa del mismo archivo, o None (siempre None si se fuerza)."""
+        if self.forzar:
+            return None
+        return Importacion.objects.filter(tipo=self.tipo, sha256=self.sha256).first()
+
+    def cambio(self, clave, valor_huella):
+        """
+        True si la fila es nueva o cambió desde la última importación (hay que escribirla).
+        Las huellas de la BD se cargan completas la primera vez (un solo query).
+        """
+        if self._huellas is None:
+            self._huellas = dict(
+                HuellaFila.objects.filter(tipo=self.tipo).values_list("clave", "huella")
+            )
+
+        self.filas += 1
+        anterior = self._pendientes.get(clave, self._huellas.get(clave))
+        if anterior == valor_huella:
+            self.sin_cambios += 1
+            if not self.forzar:
+                return False
+        elif anterior is None:
+            self.nuevas.append(clave)
+        else:
+            self.cambiadas.append(clave)
+        self._pendientes[clave] = valor_huella
+        return True
+
+    @transaction.atomic
+    def guardar(self):
+        """Crea el registro de la importación y actualiza las huellas en bloque."""
+        importacion = Importacion.objects.create(
+            tipo=self.tipo,
+            archivo=self.nombre[:255],
+            sha256=self.sha256,
+            filas=self.filas,
+            nuevas=len(self.nuevas),
+            cambiadas=len(self.cambiadas),
+            sin_cambios=self.sin_cambios,
+            cambios={
+                "nuevas": self.nuevas[:MAX_CLAVES_RESUMEN],
+                "cambiadas": self.cambiadas[:MAX_CLAVES_RESUMEN],
+            },
+        )
+        HuellaFila.objects.bulk_create(
+            [
+                HuellaFila(tipo=self.tipo, clave=clave, huella=valor, importacion=importacion)
+                for clave, valor in self._pendientes.items()
+            ],
+            update_conflicts=True,
+            unique_fields=["tipo", "clave"],
+            update_fields=["huella", "importacion"],
+        )
+        return importacion
@@ -0,0 +1,162 @@
+"""
+Inventario en piezas.
+
+- Las entradas y las salidas por venta son renglones de MovimientoInventario.
+- Un CorteInventario guarda la existencia de todos los productos hasta cierto movimiento.
+- Existencia actual = último corte + movimientos con id mayor: el costo depende de
+  cuántos movimientos hubo desde el último corte, no del tamaño del historial.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Max, Sum
+from django.utils import timezone
+
+from .models import CorteInventario, ExistenciaCorte, MovimientoInventario
+
+CERO = Decimal("0")
+
+
+def registrar_entrada(producto, cantidad, unidad, referencia="", fecha=None):
+    """Recepción de mercancía."""
+    return MovimientoInventario.objects.create(
+        producto=producto,
+        tipo=MovimientoInventario.TIPO_ENTRADA,
+        piezas=producto.a_piezas(cantidad, unidad),
+        fecha=fecha or timezone.localdate(),
+        referencia=referencia,
+    )
+
+
+def registrar_salidas_venta(venta):
+    """
+    Deja el inventario de la venta igual a sus líneas actuales. No edita movimientos
+    previos: agrega la diferencia por producto (venta nueva -> VTA; edición -> AJU).
+    Llamar dentro de la misma transacción que guarda las líneas.
+    """
+    deseado = defaultdict(lambda: CERO)
+    for d in venta.detalles.select_related("producto"):
+        deseado[d.producto_id] -= d.producto.a_piezas(d.cantidad, d.unidad)
+
+    registrado = dict(
+        MovimientoInventario.objects.filter(venta=venta)
+        .values("producto_id")
+        .annotate(total=Sum("piezas"))
+        .values_list("producto_id", "total")
+    )
+
+    tipo = MovimientoInventario.TIPO_AJUSTE if registrado else MovimientoInventario.TIPO_VENTA
+    nuevos = [
+        MovimientoInventario(
+            producto_id=producto_id,
+            tipo=tipo,
+            piezas=deseado.get(producto_id, CERO) - registrado.get(producto_id, CERO),
+            fecha=venta.fecha,
+            venta=venta,
+            referencia=f"Venta #{venta.pk}",
+        )
+        for producto_id in set(deseado) | set(registrado)
+        if deseado.get(producto_id, CERO) != registrado.get(producto_id, CERO)
+    ]
+    MovimientoInventario.objects.bulk_create(nuevos)
+    return nuevos
+
+
+def registrar_cambio_linea(venta, antes=None, despues=None):
+    """
+    Movimientos de una sola línea editada (alta: antes=None, baja: despues=None).
+    antes/despues son (producto, cantidad, unidad). A diferencia de
+    registrar_salidas_venta no relee las demás líneas: el costo no depende de cuántas
+    tenga la venta. Llamar dentro de la misma transacción que guarda la línea.
+    """
+    cambios = defaultdict(lambda: CERO)
+    if antes is not None:
+        producto, cantidad, unidad = antes
+        cambios[producto.pk] += producto.a_piezas(cantidad, unidad)
+    if despues is not None:
+        producto, cantidad, unidad = despues
+        cambios[producto.pk] -= producto.a_piezas(cantidad, unidad)
+
+    cambios = {producto_id: piezas for producto_id, piezas in cambios.items() if piezas}
+    if not cambios:
+        return []
+    tipo = (
+        MovimientoInventario.TIPO_AJUSTE
+        if MovimientoInventario.objects.filter(venta=venta).exists()
+        else MovimientoInventario.TIPO_VENTA
+    )
+    return MovimientoInventario.objects.bulk_create(
+        [
+            MovimientoInventario(
+                producto_id=producto_id,
+                tipo=tipo,
+                piezas=piezas,
+                fecha=venta.fecha,
+                venta=venta,
+                referencia=f"Venta #{venta.pk}",
+            )
+            for producto_id, piezas in cambios.items()
+        ]
+    )
+
+
+def _ultimo_movimiento_confirmado():
+    """
+    Máximo id de MovimientoInventario con todos los anteriores ya confirmados. En
+    PostgreSQL el id se asigna al insertar pero los commits llegan en cualquier orden:
+    un movimiento con id menor podía confirmarse después de leer el máximo y quedar
+    debajo de la marca del corte para siempre. LOCK TABLE ... IN SHARE MODE espera a las
+    transacciones que están insertando y detiene las nuevas hasta el commit del corte.
+    En SQLite las escrituras ya van de una en una. Llamar dentro de la transacción del
+    corte.
+    """
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            tabla = connection.ops.quote_name(MovimientoInventario._meta.db_table)
+            cursor.execute(f"LOCK TABLE {tabla} IN SHARE MODE")
+    return MovimientoInventario.objects.aggregate(m=Max("id"))["m"] or 0
+
+
+@transaction.atomic
+def tomar_corte():
+    """Foto de existencias de todos los productos (correr periódicamente)."""
+    anterior = CorteInventario.objects.first()
+    hasta = _ultimo_movimiento_confirmado()
+
+    existencias = existencias_actuales(hasta_movimiento=hasta, corte=anterior)
+    corte = CorteInventario.objects.create(hasta_movimiento=hasta)
+    ExistenciaCorte.objects.bulk_create(
+        [
+            ExistenciaCorte(corte=corte, producto_id=producto_id, piezas=piezas)
+            for producto_id, piezas in existencias.items()
+        ],
+        batch_size=1000,
+    )
+    return corte
+
+
+def existencias_actuales(hasta_movimiento=None, corte=None):
+    """
+    {producto_id: piezas} de todos los productos con movimientos.
+    Lee el último corte y suma solo los movimientos posteriores.
+    """
+    if corte is None:
+        corte = CorteInventario.objects.first()
+
+    existencias = defaultdict(lambda: CERO)
+    desde = 0
+    if corte is not None:
+        desde = corte.hasta_movimiento
+        existencias.update(corte.existencias.values_list("producto_id", "piezas"))
+
+    movimientos = MovimientoInventario.objects.filter(id__gt=desde)
+    if hasta_movimiento is not None:
+        movimientos = movimientos.filter(id__lte=hasta_movimiento)
+
+    for producto_id, delta in (
+        movimientos.order_by().values("producto_id").annotate(s=Sum("piezas")).values_list("producto_id", "s")
+    ):
+        existencias[producto_id] += delta
+
+    return dict(existencias)
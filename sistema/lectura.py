@@ -0,0 +1,199 @@
+"""
+Lecturas pesadas (listados, reportes, búsquedas, exportaciones) contra una conexión de
+solo lectura, para que no compitan con la captura ni con los importadores.
+
+- El alias existe solo si se configuró DATABASE_LECTURA_URL (settings.LECTURA_DB): una
+  réplica de PostgreSQL, o en SQLite el mismo archivo abierto en modo solo lectura. Sin
+  él todo va a `default`, como siempre.
+- Nada se lee de la réplica por accidente: solo dentro de `solo_lectura()` (las vistas
+  con @vista_de_lectura y los changelists del admin con ListadoDeLecturaMixin) y solo en
+  GET/HEAD. Las escrituras siempre van a `default`.
+- Pegajosidad: en cuanto una petición escribe, el resto de sus lecturas va a `default`; y
+  la respuesta deja la cookie COOKIE_PRIMARIA por LECTURA_PEGAJOSA segundos para que el
+  redirect de después de guardar (y lo que siga) lea de `default` y vea lo que se guardó
+  aunque la réplica vaya atrasada.
+- Dentro de una transacción de `default` también se lee de `default`.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+COOKIE_PRIMARIA = "leer_primaria"
+METODOS_SEGUROS = ("GET", "HEAD", "OPTIONS")
+
+
+class Peticion:
+    """Estado por petición; es mutable para que lo vea también el hilo de sync_to_async."""
+
+    __slots__ = ("primaria", "escribio")
+
+    def __init__(self, primaria=False):
+        self.primaria = primaria
+        self.escribio = False
+
+
+_peticion = ContextVar("lectura_peticion", default=None)
+_leer_replica = ContextVar("lectura_replica", default=False)
+
+
+def alias_lectura():
+    """Alias al que van las lecturas en este momento, o None si van a `default`."""
+    alias = settings.LECTURA_DB
+    if not alias or not _leer_replica.get():
+        return None
+    peticion = _peticion.get()
+    if peticion is not None and (peticion.primaria or peticion.escribio):
+        return None
+    if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+        return None
+    return alias
+
+
+def marcar_escritura():
+    peticion = _peticion.get()
+    if peticion is not None:
+        peticion.escribio = True
+
+
+@contextmanager
+def solo_lectura():
+    """Las consultas de este bloque leen de la réplica (si la hay y no hay escrituras)."""
+    # Fuera de una petición (comandos, pruebas) lleva su propio estado
+    propia = _peticion.set(Peticion()) if _peticion.get() is None else None
+    token = _leer_replica.set(True)
+    try:
+        yield
+    finally:
+        _leer_replica.reset(token)
+        if propia is not None:
+            _peticion.reset(propia)
+
+
+def _en_lectura(contenido):
+    """Streaming: cada bloque se genera dentro de solo_lectura() (el queryset se evalúa ahí)."""
+    iterador = iter(contenido)
+    while True:
+        with solo_lectura():
+            try:
+                bloque = next(iterador)
+            except StopIteration:
+                return
+        yield bloque
+
+
+def _terminar(response):
+    # TemplateResponse (admin) se renderiza después de la vista y StreamingHttpResponse
+    # al enviarse: sin esto sus consultas saldrían ya fuera de solo_lectura()
+    if getattr(response, "is_rendered", True) is False:
+        response.render()
+    elif getattr(response, "streaming", False) and not getattr(response, "is_async", False):
+        response.streaming_content = _en_lectura(response.streaming_content)
+    return response
+
+
+def vista_de_lectura(vista):
+    """Decorador para vistas de solo consulta (sync o async); solo aplica a GET/HEAD."""
+    if iscoroutinefunction(vista):
+        @wraps(vista)
+        async def envuelta(request, *args, **kwargs):
+            if request.method not in METODOS_SEGUROS:
+                return await vista(request, *args, **kwargs)
+            with solo_lectura():
+                return await vista(request, *args, **kwargs)
+        return envuelta
+
+    @wraps(vista)
+    def envuelta(request, *args, **kwargs):
+        if request.method not in METODOS_SEGUROS:
+            return vista(request, *args, **kwargs)
+        with solo_lectura():
+            return _terminar(vista(request, *args, **kwargs))
+    return envuelta
+
+
+class ListadoDeLecturaMixin:
+    """ModelAdmin cuyo changelist (GET) lee de la réplica; las acciones (POST) no."""
+
+    def changelist_view(self, request, extra_context=None):
+        if request.method not in METODOS_SEGUROS:
+            return super().changelist_view(request, extra_context)
+        with solo_lectura():
+            return _terminar(super().changelist_view(request, extra_context))
+
+
+class RouterLectura:
+    """DATABASE_ROUTERS: lecturas a la réplica solo dentro de solo_lectura()."""
+
+    def db_for_read(self, model, **hints):
+        return alias_lectura()
+
+    def db_for_write(self, model, **hints):
+        marcar_escritura()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Son los mismos datos: un objeto leído de la réplica se puede ligar a uno de default
+        bases = {DEFAULT_DB_ALIAS, settings.LECTURA_DB}
+        if obj1._state.db in bases and obj2._state.db in bases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # La réplica se migra sola (PostgreSQL) o es el mismo archivo (SQLite)
+        if settings.LECTURA_DB and db == settings.LECTURA_DB:
+            return False
+        return None
+
+
+class LecturaPegajosaMiddleware:
+    """
+    Lleva el estado de la petición para el router: lee de `default` si llegó con la
+    cookie o no es GET/HEAD, y deja la cookie cuando la petición escribió.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not settings.LECTURA_DB:
+            return self.get_response(request)
+        peticion = self._iniciar(request)
+        token = _peticion.set(peticion)
+        try:
+            response = self.get_response(request)
+        finally:
+            _peticion.reset(token)
+        return self._pegar(request, peticion, response)
+
+    async def __acall__(self, request):
+        if not settings.LECTURA_DB:
+            return await self.get_response(request)
+        peticion = self._iniciar(request)
+        token = _peticion.set(peticion)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _peticion.reset(token)
+        return self._pegar(request, peticion, response)
+
+    def _iniciar(self, request):
+        return Peticion(primaria=COOKIE_PRIMARIA in request.COOKIES or request.method not in METODOS_SEGUROS)
+
+    def _pegar(self, request, peticion, response):
+        if peticion.escribio or request.method not in METODOS_SEGUROS:
+            response.set_cookie(
+                COOKIE_PRIMARIA, "1", max_age=settings.LECTURA_PEGAJOSA, httponly=True, samesite="Lax"
+            )
+        return response
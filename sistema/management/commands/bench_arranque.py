@@ -0,0 +1,81 @@
+import json
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Módulos pesados que un worker no debería cargar solo por arrancar
+PESADOS = ("openpyxl", "PIL.Image", "pandas", "numpy")
+
+# Corre en un proceso nuevo: mide como un worker recién levantado
+_SCRIPT = r"""
+import json, os, resource, sys, time
+from wsgiref.util import setup_testing_defaults
+
+inicio = time.perf_counter()
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "carlos_roque.settings")
+import django
+django.setup()
+setup = time.perf_counter()
+
+from carlos_roque.wsgi import application
+wsgi = time.perf_counter()
+
+environ = {"PATH_INFO": sys.argv[1], "HTTP_HOST": "localhost"}
+setup_testing_defaults(environ)
+status = []
+b"".join(application(environ, lambda s, h, e=None: status.append(s)))
+fin = time.perf_counter()
+
+print(json.dumps({
+    "setup_ms": (setup - inicio) * 1000,
+    "wsgi_ms": (wsgi - setup) * 1000,
+    "primera_ms": (fin - wsgi) * 1000,
+    "total_ms": (fin - inicio) * 1000,
+    "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "status": status[0] if status else "",
+    "pesados": [m for m in json.loads(sys.argv[2]) if m in sys.modules],
+}))
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide el arranque de un worker en procesos nuevos: django.setup(), carga de la app "
+        "WSGI, primera petición y memoria máxima (RSS). Reporta medianas."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--ruta", action="append", help="Ruta de la primera petición (default: /)")
+        parser.add_argument("--repeticiones", type=int, default=5)
+
+    def handle(self, *args, **options):
+        rutas = options["ruta"] or ["/"]
+        self.stdout.write(
+            f"{'ruta':<24} {'setup ms':>9} {'wsgi ms':>8} {'1a pet ms':>10} {'total ms':>9} {'RSS MB':>7}  status / módulos pesados"
+        )
+        for ruta in rutas:
+            medidas = [self._medir(ruta) for _ in range(options["repeticiones"])]
+
+            def mediana(campo):
+                return statistics.median(m[campo] for m in medidas)
+
+            pesados = sorted({p for m in medidas for p in m["pesados"]})
+            self.stdout.write(
+                f"{ruta:<24} {mediana('setup_ms'):>9.1f} {mediana('wsgi_ms'):>8.1f} {mediana('primera_ms'):>10.1f} "
+                f"{mediana('total_ms'):>9.1f} {mediana('rss_mb'):>7.1f}  {medidas[-1]['status']} / "
+                f"{', '.join(pesados) or 'ninguno'}"
+            )
+
+    def _medir(self, ruta):
+        proceso = subprocess.run(
+            [sys.executable, "-c", _SCRIPT, ruta, json.dumps(PESADOS)],
+            cwd=settings.BASE_DIR,
+            capture_output=True,
+            text=True,
+        )
+        if proceso.returncode:
+            raise CommandError(proceso.stderr)
+        return json.loads(proceso.stdout.strip().splitlines()[-1])
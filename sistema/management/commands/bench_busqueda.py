@@ -0,0 +1,69 @@
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+TERMINOS_DEFAULT = ["a", "ab", "abc", "co", "coca", "pan", "leche", "1", "12", "tienda"]
+
+
+def _pedir(url):
+    inicio = time.perf_counter()
+    try:
+        with urllib.request.urlopen(url, timeout=30) as resp:
+            resp.read()
+            ok = resp.status < 500
+    except urllib.error.HTTPError as e:
+        ok = e.code < 500
+    except OSError:
+        ok = False
+    return time.perf_counter() - inicio, ok
+
+
+def _percentil(valores, p):
+    if not valores:
+        return 0.0
+    valores = sorted(valores)
+    k = min(len(valores) - 1, max(0, round(p / 100 * (len(valores) - 1))))
+    return valores[k]
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark de carga de la búsqueda contra uno o más servidores ya levantados "
+        "(por ejemplo gunicorn WSGI en :8000 y gunicorn+uvicorn ASGI en :8001)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--base", action="append", required=True, help="URL base, ej. http://127.0.0.1:8000")
+        parser.add_argument("--ruta", action="append", help="Rutas a medir (default: /buscar/ y /api/buscar/)")
+        parser.add_argument("--concurrencia", type=int, default=20)
+        parser.add_argument("--peticiones", type=int, default=500)
+        parser.add_argument("--termino", action="append", help="Términos de búsqueda a rotar")
+
+    def handle(self, *args, **options):
+        rutas = options["ruta"] or ["/buscar/", "/api/buscar/"]
+        terminos = options["termino"] or TERMINOS_DEFAULT
+        n = options["peticiones"]
+
+        self.stdout.write(f"{'servidor':<30} {'ruta':<22} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errores':>8}")
+        for base in options["base"]:
+            for ruta in rutas:
+                urls = [
+                    f"{base.rstrip('/')}{ruta}?" + urllib.parse.urlencode({"q": terminos[i % len(terminos)]})
+                    for i in range(n)
+                ]
+                inicio = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=options["concurrencia"]) as pool:
+                    resultados = list(pool.map(_pedir, urls))
+                duracion = time.perf_counter() - inicio
+
+                tiempos = [t for t, _ in resultados]
+                errores = sum(1 for _, ok in resultados if not ok)
+                self.stdout.write(
+                    f"{base:<30} {ruta:<22} {n / duracion:>8.1f} "
+                    f"{_percentil(tiempos, 50) * 1000:>8.1f} {_percentil(tiempos, 95) * 1000:>8.1f} "
+                    f"{_percentil(tiempos, 99) * 1000:>8.1f} {errores:>8}"
+                )
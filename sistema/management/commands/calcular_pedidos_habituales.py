@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from sistema.models import Cliente
+from sistema.sugerencias import actualizar_pedidos
+
+
+class Command(BaseCommand):
+    help = (
+        "Calcula el pedido habitual de todos los clientes. No hace falta correrlo seguido: "
+        "cada pedido se recalcula solo cuando cambian las ventas de su cliente."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lote", type=int, default=200, help="Clientes por bloque")
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        ids = list(Cliente.objects.order_by("pk").values_list("pk", flat=True))
+        lineas = 0
+        for i in range(0, len(ids), options["lote"]):
+            lineas += actualizar_pedidos(ids[i:i + options["lote"]])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{len(ids)} clientes, {lineas} líneas habituales en {time.perf_counter() - inicio:.1f} s"
+            )
+        )
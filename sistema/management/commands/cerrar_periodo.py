@@ -0,0 +1,52 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from sistema.archivo import analizar_tablas, cerrar_periodo
+from sistema.models import DetalleVenta, PeriodoCerrado, Venta
+
+
+class Command(BaseCommand):
+    help = (
+        "Cierra los meses anteriores a MES (AAAA-MM): mueve sus ventas y líneas a las tablas "
+        "de archivo y los deja de solo lectura. Sin MES se dejan abiertos el mes actual y el anterior."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("mes", nargs="?", help="Primer mes que queda abierto, AAAA-MM")
+        parser.add_argument("--simular", action="store_true", help="Solo cuenta lo que se archivaría")
+
+    def handle(self, *args, **options):
+        if options["mes"]:
+            try:
+                anio, mes = (int(parte) for parte in options["mes"].split("-"))
+                hasta = date(anio, mes, 1)
+            except ValueError:
+                raise CommandError("MES debe ser AAAA-MM.")
+        else:
+            hoy = timezone.localdate()
+            hasta = date(hoy.year - 1, 12, 1) if hoy.month == 1 else date(hoy.year, hoy.month - 1, 1)
+
+        corte = PeriodoCerrado.corte()
+        if corte is not None and hasta <= corte:
+            raise CommandError(f"Ya está cerrado hasta el {corte:%Y-%m-%d}.")
+
+        if options["simular"]:
+            ventas = Venta.objects.filter(fecha__lt=hasta)
+            lineas = DetalleVenta.objects.filter(venta__fecha__lt=hasta)
+            self.stdout.write(
+                f"Se archivarían {ventas.count()} ventas y {lineas.count()} líneas anteriores al {hasta:%Y-%m-%d}."
+            )
+            return
+
+        inicio = time.perf_counter()
+        periodo = cerrar_periodo(hasta)
+        analizar_tablas()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Cerrado hasta el {hasta:%Y-%m-%d}: {periodo.ventas} ventas y {periodo.lineas} líneas "
+                f"archivadas en {time.perf_counter() - inicio:.1f} s."
+            )
+        )
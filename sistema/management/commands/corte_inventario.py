@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from sistema.inventario import tomar_corte
+
+
+class Command(BaseCommand):
+    help = (
+        "Guarda una foto de existencias de todos los productos. Correrlo periódicamente "
+        "(ej. cada noche) para que la existencia actual solo sume los movimientos recientes."
+    )
+
+    def handle(self, *args, **options):
+        corte = tomar_corte()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{corte}: {corte.existencias.count()} productos, hasta movimiento {corte.hasta_movimiento}"
+            )
+        )
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from sistema.models import Remision, Venta
+
+
+class Command(BaseCommand):
+    help = "Crea (vacías) las ventas de todas las remisiones que todavía no tienen una."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--desde", help="Solo remisiones con fecha >= YYYY-MM-DD")
+        parser.add_argument("--hasta", help="Solo remisiones con fecha <= YYYY-MM-DD")
+
+    def handle(self, *args, **options):
+        remisiones = Remision.objects.all()
+        if options["desde"]:
+            remisiones = remisiones.filter(fecha__gte=options["desde"])
+        if options["hasta"]:
+            remisiones = remisiones.filter(fecha__lte=options["hasta"])
+
+        creadas, ya_tenian = Venta.objects.crear_para_remisiones(remisiones)
+        self.stdout.write(
+            self.style.SUCCESS(f"Ventas creadas: {creadas} | Ya tenían venta: {ya_tenian}")
+        )
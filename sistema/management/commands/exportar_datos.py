@@ -0,0 +1,107 @@
+import csv
+import json
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.migrations.recorder import MigrationRecorder
+from django.utils import timezone
+
+from sistema.respaldo import EXTENSIONES, MODELOS, NULO, VERSION_FORMATO, abrir_escritura, sha256_archivo
+
+
+class Command(BaseCommand):
+    help = (
+        "Exporta clientes, productos, remisiones y ventas (vivas y archivadas) a una carpeta "
+        "de CSV comprimidos por bloques + manifest.json (se restaura con restaurar_datos)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("destino", help="Carpeta de salida (nueva o vacía)")
+        parser.add_argument("--compresion", choices=sorted(EXTENSIONES), default="gzip")
+        parser.add_argument("--filas-por-archivo", type=int, default=250000)
+        parser.add_argument(
+            "--database",
+            default=settings.LECTURA_DB or DEFAULT_DB_ALIAS,
+            help="Alias de la BD a leer (por omisión la réplica de lectura si está configurada)",
+        )
+
+    def handle(self, *args, **options):
+        destino = options["destino"]
+        os.makedirs(destino, exist_ok=True)
+        if os.listdir(destino):
+            raise CommandError(f"La carpeta {destino} no está vacía.")
+
+        compresion = options["compresion"]
+        alias = options["database"]
+        connection = connections[alias]
+        ultima = (
+            MigrationRecorder(connection).migration_qs.filter(app="sistema").order_by("-id").values_list("name", flat=True).first()
+        )
+        manifest = {
+            "version": VERSION_FORMATO,
+            "compresion": compresion,
+            "creado": timezone.now().isoformat(),
+            "motor": connection.vendor,
+            "migracion": ultima,
+            "modelos": [],
+        }
+
+        inicio = time.perf_counter()
+        # Una sola transacción: todas las tablas del mismo momento
+        with transaction.atomic(using=alias):
+            if connection.vendor == "postgresql":
+                with connection.cursor() as cursor:
+                    cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY")
+            for modelo in MODELOS:
+                manifest["modelos"].append(
+                    self._exportar(modelo, alias, destino, compresion, options["filas_por_archivo"])
+                )
+
+        with open(os.path.join(destino, "manifest.json"), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+
+        total = sum(m["filas"] for m in manifest["modelos"])
+        self.stdout.write(self.style.SUCCESS(f"Exportadas {total} filas en {time.perf_counter() - inicio:.1f} s a {destino}"))
+
+    def _exportar(self, modelo, alias, destino, compresion, por_archivo):
+        tabla = modelo._meta.db_table
+        campos = modelo._meta.concrete_fields
+        filas = modelo.objects.using(alias).order_by("pk").values_list(*[c.attname for c in campos]).iterator(chunk_size=5000)
+
+        archivos = []
+        total = 0
+        salida = escritor = None
+        ruta = None
+        en_archivo = 0
+        inicio = time.perf_counter()
+
+        def cerrar():
+            salida.close()
+            archivos.append({"nombre": os.path.basename(ruta), "filas": en_archivo, "sha256": sha256_archivo(ruta)})
+
+        for fila in filas:
+            if salida is None or en_archivo >= por_archivo:
+                if salida is not None:
+                    cerrar()
+                ruta = os.path.join(destino, f"{tabla}.{len(archivos) + 1:04d}{EXTENSIONES[compresion]}")
+                salida = abrir_escritura(ruta, compresion)
+                escritor = csv.writer(salida, lineterminator="\n")
+                escritor.writerow([c.column for c in campos])
+                en_archivo = 0
+            escritor.writerow([NULO if v is None else v for v in fila])
+            en_archivo += 1
+            total += 1
+        if salida is not None:
+            cerrar()
+
+        self.stdout.write(f"{modelo._meta.label:<24} {total:>10} filas  {len(archivos)} archivo(s)  {time.perf_counter() - inicio:.1f} s")
+        return {
+            "modelo": modelo._meta.label,
+            "tabla": tabla,
+            "columnas": [c.column for c in campos],
+            "filas": total,
+            "archivos": archivos,
+        }
@@ -0,0 +1,152 @@
+import json
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from sistema.catalogo import invalidar_catalogo
+from sistema.models import Cliente, DetalleVenta, Producto, Remision, Venta
+from sistema.similitud import indexar_clientes
+
+PALABRAS = [
+    "COCA", "PAN", "LECHE", "AGUA", "JABON", "ARROZ", "FRIJOL", "ACEITE", "CAFE", "AZUCAR",
+    "GALLETA", "SOPA", "ATUN", "CHILE", "SAL", "HUEVO", "REFRESCO", "PAPEL", "CLORO", "TORTILLA",
+]
+PREFIJO_PRODUCTO = "CARGA-"
+PREFIJO_CLIENTE = "CG"
+LOTE = 2000
+
+
+def _precio(rng, minimo, maximo):
+    return Decimal(rng.randint(minimo * 100, maximo * 100)).scaleb(-2)
+
+
+class Command(BaseCommand):
+    help = (
+        "Genera un juego de datos sintético (productos, clientes, remisiones con venta y "
+        "líneas) para pruebas de carga. Usar sobre una BD vacía o de pruebas."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--productos", type=int, default=2000)
+        parser.add_argument("--clientes", type=int, default=500)
+        parser.add_argument("--remisiones", type=int, default=20000)
+        parser.add_argument("--lineas", type=int, default=5, help="Líneas promedio por venta")
+        parser.add_argument("--dias", type=int, default=365, help="Rango de fechas hacia atrás")
+        parser.add_argument("--semilla", type=int, default=1)
+        parser.add_argument("--resumen", help="Archivo JSON con ids/códigos generados (lo usa prueba_carga)")
+
+    def handle(self, *args, **options):
+        if Producto.objects.filter(codigo__startswith=PREFIJO_PRODUCTO).exists():
+            raise CommandError("La BD ya tiene datos generados; usa una BD nueva o vacíala con flush.")
+
+        rng = random.Random(options["semilla"])
+        hoy = timezone.localdate()
+
+        with transaction.atomic():
+            productos = []
+            for i in range(options["productos"]):
+                compra_pzs = _precio(rng, 5, 80)
+                compra_cjs = compra_pzs * 12
+                productos.append(Producto(
+                    codigo=f"{PREFIJO_PRODUCTO}{i:05d}",
+                    descripcion=f"{rng.choice(PALABRAS)} {rng.choice(PALABRAS)} {rng.randint(100, 999)}",
+                    compra_cjs=compra_cjs,
+                    compra_pzs=compra_pzs,
+                    venta_cjs=(compra_cjs * Decimal("1.25")).quantize(Decimal("0.01")),
+                    venta_pzs=(compra_pzs * Decimal("1.30")).quantize(Decimal("0.01")),
+                    piezas_por_paquete=12,
+                ))
+            Producto.objects.bulk_create(productos, batch_size=LOTE)
+            transaction.on_commit(invalidar_catalogo)
+            productos = list(Producto.objects.filter(codigo__startswith=PREFIJO_PRODUCTO).order_by("id"))
+
+            Cliente.objects.bulk_create(
+                [
+                    Cliente(
+                        numero=i,
+                        proveedor=f"{PREFIJO_CLIENTE}{i:05d}",
+                        comercio=f"TIENDA {rng.choice(PALABRAS)} {i}",
+                        contacto=f"Contacto {i}",
+                        direccion=f"Calle {rng.randint(1, 300)} #{rng.randint(1, 999)}",
+                        telefono=f"55{rng.randint(10000000, 99999999)}",
+                    )
+                    for i in range(options["clientes"])
+                ],
+                batch_size=LOTE,
+            )
+            indexar_clientes(Cliente.objects.filter(proveedor__startswith=PREFIJO_CLIENTE))
+            cliente_ids = list(
+                Cliente.objects.filter(proveedor__startswith=PREFIJO_CLIENTE).values_list("id", flat=True)
+            )
+
+            remisiones = [
+                Remision(
+                    folio=f"{PREFIJO_CLIENTE}-{i}",
+                    cliente_id=rng.choice(cliente_ids),
+                    fecha=hoy - timedelta(days=rng.randint(0, options["dias"])),
+                )
+                for i in range(options["remisiones"])
+            ]
+            Remision.objects.bulk_create(remisiones, batch_size=LOTE)
+            remisiones = list(
+                Remision.objects.filter(folio__startswith=f"{PREFIJO_CLIENTE}-").values_list("id", "cliente_id", "fecha")
+            )
+
+            # Ventas y líneas con los totales ya calculados (bulk_create no llama save())
+            ventas = []
+            lineas_por_venta = []
+            for remision_id, cliente_id, fecha in remisiones:
+                lineas = []
+                # (venta, producto, unidad) es único: productos distintos por venta
+                n_lineas = min(len(productos), rng.randint(1, max(1, 2 * options["lineas"] - 1)))
+                for producto in rng.sample(productos, n_lineas):
+                    unidad = rng.choice([DetalleVenta.UNIDAD_PAQUETES, DetalleVenta.UNIDAD_PIEZAS])
+                    precio = producto.venta_cjs if unidad == DetalleVenta.UNIDAD_PAQUETES else producto.venta_pzs
+                    cantidad = Decimal(rng.randint(1, 10))
+                    lineas.append(DetalleVenta(
+                        producto_id=producto.id,
+                        unidad=unidad,
+                        cantidad=cantidad,
+                        precio_unitario=precio,
+                        subtotal=cantidad * precio,
+                    ))
+                subtotal = sum((d.subtotal for d in lineas), Decimal("0.00"))
+                ventas.append(Venta(
+                    remision_id=remision_id,
+                    cliente_id=cliente_id,
+                    fecha=fecha,
+                    subtotal=subtotal,
+                    total=subtotal,
+                ))
+                lineas_por_venta.append(lineas)
+            Venta.objects.bulk_create(ventas, batch_size=LOTE)
+
+            venta_ids = dict(Venta.objects.values_list("remision_id", "id"))
+            detalles = []
+            for (remision_id, _, _), lineas in zip(remisiones, lineas_por_venta):
+                for d in lineas:
+                    d.venta_id = venta_ids[remision_id]
+                    detalles.append(d)
+            DetalleVenta.objects.bulk_create(detalles, batch_size=LOTE)
+
+        if options["resumen"]:
+            with open(options["resumen"], "w", encoding="utf-8") as f:
+                json.dump(
+                    {
+                        "ventas": sorted(venta_ids.values()),
+                        "clientes": cliente_ids,
+                        "productos": [p.id for p in productos],
+                        "proveedores": [f"{PREFIJO_CLIENTE}{i:05d}" for i in range(options["clientes"])],
+                        "terminos": [p.lower() for p in PALABRAS] + ["carga-00", "tienda", "cg001"],
+                    },
+                    f,
+                )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Productos: {len(productos)} | Clientes: {len(cliente_ids)} | "
+            f"Remisiones/ventas: {len(remisiones)} | Líneas: {len(detalles)}"
+        ))
@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from sistema.models import Cliente
+from sistema.similitud import reconstruir_indice
+
+
+class Command(BaseCommand):
+    help = (
+        "Regenera las claves de bloqueo de todos los clientes (búsqueda de parecidos). "
+        "Correrlo después de restaurar un respaldo o de cargar clientes por fuera de los importadores."
+    )
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        claves = reconstruir_indice()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{Cliente.objects.count()} clientes, {claves} claves en {time.perf_counter() - inicio:.1f} s"
+            )
+        )
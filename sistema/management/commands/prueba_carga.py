@@ -0,0 +1,522 @@
+import http.cookiejar
+import io
+import json
+import os
+import random
+import re
+import shlex
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from collections import defaultdict
+from html.parser import HTMLParser
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import Resolver404, resolve
+
+from sistema.excel import libro_nuevo
+
+from .bench_busqueda import _percentil
+
+MEZCLA_DEFAULT = "lectura=55,busqueda=25,edicion=15,importacion=5"
+# Errores de concurrencia de SQLite / PostgreSQL en el log del servidor
+PATRON_BLOQUEO = re.compile(
+    r"database is locked|database table is locked|deadlock detected|could not obtain lock"
+    r"|lock timeout|could not serialize access",
+    re.IGNORECASE,
+)
+PATRON_ERROR_500 = re.compile(r"^Internal Server Error: (\S+)", re.MULTILINE)
+LIBROS_IMPORTACION = 20
+# Filas de venta_edit (sistema/_venta_linea.html): id, producto, unidad y precio de cada línea
+PATRON_LINEA = re.compile(
+    r'data-linea="(\d+)"\s+data-producto="(\d+)"\s+data-codigo="[^"]*"\s+'
+    r'data-unidad="(\w+)"\s+data-cantidad="[^"]*"\s+data-precio="([^"]*)"'
+)
+# POSTs que responden JSON: 200 sí es éxito (los de formulario exitosos redirigen)
+POST_JSON = {"POST venta_linea"}
+# Búsquedas con debounce: un 204 es una búsqueda que no se contestó
+BUSQUEDA_CON_DEBOUNCE = {"GET busqueda_api"}
+TIPO_XLSX = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+class _Formulario(HTMLParser):
+    """Campos (nombre, valor) del primer <form method="post"> tal como los mandaría el navegador."""
+
+    def __init__(self):
+        super().__init__()
+        self.campos = []
+        self._en_form = False
+        self._visto = False
+        self._select = None
+        self._elegida = None
+        self._primera = None
+        self._textarea = None
+        self._texto = []
+
+    def handle_starttag(self, tag, attrs):
+        a = dict(attrs)
+        if tag == "form" and (a.get("method") or "").lower() == "post" and not self._visto:
+            self._en_form = self._visto = True
+            return
+        if not self._en_form:
+            return
+        if tag == "input":
+            tipo = (a.get("type") or "text").lower()
+            if not a.get("name") or tipo in ("submit", "button", "file", "image", "reset"):
+                return
+            if tipo in ("checkbox", "radio") and "checked" not in a:
+                return
+            self.campos.append((a["name"], a.get("value") or ("on" if tipo == "checkbox" else "")))
+        elif tag == "select":
+            self._select, self._elegida, self._primera = a.get("name"), None, None
+        elif tag == "option" and self._select:
+            valor = a.get("value") or ""
+            if self._primera is None:
+                self._primera = valor
+            if "selected" in a:
+                self._elegida = valor
+        elif tag == "textarea":
+            self._textarea, self._texto = a.get("name"), []
+
+    def handle_data(self, data):
+        if self._textarea:
+            self._texto.append(data)
+
+    def handle_endtag(self, tag):
+        if tag == "form":
+            self._en_form = False
+        elif tag == "select" and self._select:
+            valor = self._elegida if self._elegida is not None else (self._primera or "")
+            self.campos.append((self._select, valor))
+            self._select = None
+        elif tag == "textarea" and self._textarea:
+            self.campos.append((self._textarea, "".join(self._texto).strip("\n")))
+            self._textarea = None
+
+
+def _campos_formulario(cuerpo):
+    parser = _Formulario()
+    parser.feed(cuerpo.decode("utf-8", "replace"))
+    return parser.campos
+
+
+def _multipart(campos, archivos):
+    limite = uuid.uuid4().hex
+    partes = []
+    for nombre, valor in campos:
+        partes.append(
+            f'--{limite}\r\nContent-Disposition: form-data; name="{nombre}"\r\n\r\n{valor}\r\n'.encode()
+        )
+    for nombre, (archivo, datos, tipo) in archivos.items():
+        partes.append(
+            f'--{limite}\r\nContent-Disposition: form-data; name="{nombre}"; filename="{archivo}"\r\n'
+            f"Content-Type: {tipo}\r\n\r\n".encode()
+        )
+        partes.append(datos)
+        partes.append(b"\r\n")
+    partes.append(f"--{limite}--\r\n".encode())
+    return b"".join(partes), f"multipart/form-data; boundary={limite}"
+
+
+class _SinRedireccion(urllib.request.HTTPRedirectHandler):
+    """Mide el POST y no la página a la que redirige."""
+
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class _Usuario:
+    """Un cliente concurrente: su propia sesión (cookies/CSRF) y su propio random."""
+
+    def __init__(self, base, datos, libros, calientes, rng, resultados, desde):
+        self.base = base.rstrip("/")
+        self.datos = datos
+        self.libros = libros
+        self.calientes = calientes
+        self.rng = rng
+        self.resultados = resultados
+        self.desde = desde
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _SinRedireccion
+        )
+        self.seq = 0
+        # Como una pestaña del navegador: el debounce de búsqueda compara seq por página
+        self.pagina = uuid.uuid4().hex
+
+    def pedir(self, nombre, ruta, cuerpo=None, tipo=None):
+        request = urllib.request.Request(self.base + ruta, data=cuerpo)
+        if tipo:
+            request.add_header("Content-Type", tipo)
+        inicio = time.perf_counter()
+        try:
+            with self.opener.open(request, timeout=120) as resp:
+                status, contenido = resp.status, resp.read()
+        except urllib.error.HTTPError as e:
+            status, contenido = e.code, e.read()
+        except OSError:
+            status, contenido = 0, b""
+        fin = time.perf_counter()
+        if inicio >= self.desde:
+            self.resultados.append((nombre, fin - inicio, status))
+        return status, contenido
+
+    # ---- operaciones de la mezcla ----
+    def lectura(self):
+        d, rng = self.datos, self.rng
+        opcion = rng.randrange(6)
+        if opcion == 0:
+            self.pedir("GET ventas_lista", f"/ventas-filtro/?cliente={rng.choice(d['clientes'])}")
+        elif opcion == 1:
+            self.pedir("GET ventas_lista", f"/ventas-filtro/?producto={rng.choice(d['productos'])}")
+        elif opcion == 2:
+            self.pedir("GET remision_list", f"/remisiones/?page={rng.randint(1, 20)}")
+        elif opcion == 3:
+            self.pedir("GET venta_detail", f"/ventas/{rng.choice(d['ventas'])}/")
+        elif opcion == 4:
+            self.pedir("GET cliente_estado_cuenta", f"/clientes/{rng.choice(d['clientes'])}/estado-de-cuenta/")
+        else:
+            agrupar = rng.choice(["producto", "cliente", "mes"])
+            self.pedir("GET reporte_margen", f"/reportes/margen/?agrupar={agrupar}")
+
+    def busqueda(self):
+        termino = self.rng.choice(self.datos["terminos"])
+        opcion = self.rng.randrange(3)
+        if opcion == 0:
+            self.pedir("GET busqueda", "/buscar/?" + urllib.parse.urlencode({"q": termino}))
+        elif opcion == 1:
+            self.seq += 1
+            self.pedir("GET busqueda_api", "/api/buscar/?" + urllib.parse.urlencode({"q": termino, "seq": self.seq, "pagina": self.pagina}))
+        else:
+            self.pedir("GET producto_autocomplete", "/productos/autocomplete/?q=CARGA-0" + str(self.rng.randint(0, 19)))
+
+    def edicion(self):
+        # Pocas ventas "calientes" para que haya ediciones simultáneas de la misma venta.
+        # Como en el navegador: se carga la venta y se cambia la cantidad de una línea
+        # con la API por línea (venta_linea).
+        venta_id = self.rng.choice(self.datos["ventas"][: self.calientes])
+        status, cuerpo = self.pedir("GET venta_edit", f"/ventas/{venta_id}/editar/")
+        if status != 200:
+            return
+        lineas = PATRON_LINEA.findall(cuerpo.decode("utf-8", "replace"))
+        if not lineas:
+            return
+        campos = dict(_campos_formulario(cuerpo))
+        linea_id, producto_id, unidad, precio = self.rng.choice(lineas)
+        datos = {
+            "csrfmiddlewaretoken": campos.get("csrfmiddlewaretoken", ""),
+            "version": campos.get("version", ""),
+            "producto": producto_id,
+            "unidad": unidad,
+            "cantidad": str(self.rng.randint(1, 20)),
+            "precio_unitario": precio,
+        }
+        self.pedir(
+            "POST venta_linea",
+            f"/ventas/{venta_id}/lineas/{linea_id}/",
+            urllib.parse.urlencode(datos).encode(),
+            "application/x-www-form-urlencoded",
+        )
+
+    def importacion(self):
+        status, cuerpo = self.pedir("GET importar_clientes", "/importar/clientes/")
+        if status != 200:
+            return
+        campos = [(n, v) for n, v in _campos_formulario(cuerpo) if n == "csrfmiddlewaretoken"]
+        datos, tipo = _multipart(campos, {"excel_file": ("clientes.xlsx", self.rng.choice(self.libros), TIPO_XLSX)})
+        self.pedir("POST importar_clientes", "/importar/clientes/", datos, tipo)
+
+
+def _libros_clientes(datos, n, semilla):
+    """Variantes del Excel de clientes; cada una cambia el teléfono de algunos clientes."""
+    rng = random.Random(semilla)
+    libros = []
+    for _ in range(n):
+        wb = libro_nuevo()
+        ws = wb.active
+        ws.append(["CLIENTES"])
+        ws.append(["#", "PROVEEDOR", "COMERCIO", "CONTACTO", "DIRECCION", "TELEFONO", "REFERENCIA"])
+        cambiados = set(rng.sample(range(len(datos["proveedores"])), min(20, len(datos["proveedores"]))))
+        for i, proveedor in enumerate(datos["proveedores"]):
+            telefono = f"55{rng.randint(10000000, 99999999)}" if i in cambiados else ""
+            ws.append([i, proveedor, f"TIENDA {i}", f"Contacto {i}", "", telefono, ""])
+        salida = io.BytesIO()
+        wb.save(salida)
+        libros.append(salida.getvalue())
+    return libros
+
+
+def _parse_mezcla(texto):
+    mezcla = {}
+    for parte in texto.split(","):
+        nombre, _, peso = parte.partition("=")
+        nombre = nombre.strip()
+        if nombre not in ("lectura", "busqueda", "edicion", "importacion"):
+            raise CommandError(f"Operación desconocida en --mezcla: {nombre!r}")
+        mezcla[nombre] = float(peso or 1)
+    return mezcla
+
+
+class Command(BaseCommand):
+    help = (
+        "Prueba de carga local: por cada --database-url migra y VACÍA la BD, genera datos "
+        "(generar_datos), levanta el servidor (gunicorn si está instalado; si no, runserver) y "
+        "corre una mezcla de lecturas, búsquedas, ediciones e importaciones con N usuarios "
+        "concurrentes. Reporta req/s, latencias p50/p95/p99, errores, conflictos (409) y "
+        "bloqueos de BD por endpoint. Con --base se usa un servidor ya levantado."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--database-url",
+            action="append",
+            help="BD a probar (se vacía). Ej. sqlite:////tmp/carga.sqlite3, postgres://u:p@localhost/carga. "
+            "Default: un SQLite temporal.",
+        )
+        parser.add_argument("--vaciar", action="store_true", help="Confirma que las --database-url se pueden vaciar")
+        parser.add_argument("--base", help="Servidor ya levantado (no prepara BD ni datos); requiere --datos")
+        parser.add_argument("--datos", help="Resumen JSON de generar_datos (con --base)")
+        parser.add_argument("--log-servidor", help="Log del servidor para contar bloqueos (con --base)")
+        parser.add_argument("--servidor", help="Comando para levantar el servidor; acepta {puerto} y {workers}")
+        parser.add_argument("--asgi", action="store_true", help="gunicorn con worker uvicorn (carlos_roque.asgi)")
+        parser.add_argument("--workers", type=int, default=4)
+        parser.add_argument("--puerto", type=int, default=8765)
+        parser.add_argument("--usuarios", type=int, default=20)
+        parser.add_argument("--segundos", type=float, default=30)
+        parser.add_argument("--calentamiento", type=float, default=3, help="Segundos iniciales que no se miden")
+        parser.add_argument("--mezcla", default=MEZCLA_DEFAULT)
+        parser.add_argument("--calientes", type=int, default=50, help="Cuántas ventas reciben las ediciones")
+        parser.add_argument("--productos", type=int, default=2000)
+        parser.add_argument("--clientes", type=int, default=500)
+        parser.add_argument("--remisiones", type=int, default=20000)
+        parser.add_argument("--semilla", type=int, default=1)
+        parser.add_argument("--salida", help="Guarda los resultados en JSON")
+
+    def handle(self, *args, **options):
+        mezcla = _parse_mezcla(options["mezcla"])
+        reportes = []
+
+        if options["base"]:
+            if not options["datos"]:
+                raise CommandError("Con --base hay que pasar --datos (resumen JSON de generar_datos).")
+            with open(options["datos"], encoding="utf-8") as f:
+                datos = json.load(f)
+            log = ""
+            resultados, duracion = self._cargar(options["base"], datos, mezcla, options)
+            if options["log_servidor"]:
+                with open(options["log_servidor"], encoding="utf-8", errors="replace") as f:
+                    log = f.read()
+            reportes.append(self._reporte(options["base"], resultados, duracion, log))
+        else:
+            urls = options["database_url"]
+            temporal = None
+            if not urls:
+                temporal = tempfile.mkdtemp(prefix="carga-")
+                urls = [f"sqlite:///{os.path.join(temporal, 'carga.sqlite3')}"]
+            elif not options["vaciar"]:
+                raise CommandError("Las BD de --database-url se vacían (flush); confirma con --vaciar.")
+
+            try:
+                for url in urls:
+                    reportes.append(self._probar_bd(url, mezcla, options))
+            finally:
+                if temporal:
+                    shutil.rmtree(temporal, ignore_errors=True)
+
+        if options["salida"]:
+            with open(options["salida"], "w", encoding="utf-8") as f:
+                json.dump(reportes, f, indent=2)
+
+    # ---- preparación ----
+    def _probar_bd(self, url, mezcla, options):
+        etiqueta = urllib.parse.urlsplit(url).scheme or url
+        carpeta = tempfile.mkdtemp(prefix="carga-")
+        resumen = os.path.join(carpeta, "datos.json")
+        ruta_log = os.path.join(carpeta, "servidor.log")
+
+        env = os.environ.copy()
+        env.update(
+            DATABASE_URL=url,
+            DATABASE_SSL="0",
+            DEBUG="0",
+            ALLOWED_HOSTS="127.0.0.1,localhost",
+            PYTHONUNBUFFERED="1",
+        )
+        manage = [sys.executable, str(settings.BASE_DIR / "manage.py")]
+
+        self.stdout.write(f"[{etiqueta}] migrando y generando datos…")
+        self._correr(manage + ["migrate", "--noinput", "-v", "0"], env)
+        self._correr(manage + ["flush", "--noinput", "-v", "0"], env)
+        self._correr(
+            manage + [
+                "generar_datos",
+                "--productos", str(options["productos"]),
+                "--clientes", str(options["clientes"]),
+                "--remisiones", str(options["remisiones"]),
+                "--semilla", str(options["semilla"]),
+                "--resumen", resumen,
+            ],
+            env,
+        )
+        with open(resumen, encoding="utf-8") as f:
+            datos = json.load(f)
+
+        comando, nombre_servidor = self._comando_servidor(options, manage)
+        base = f"http://127.0.0.1:{options['puerto']}"
+        with open(ruta_log, "wb") as log:
+            servidor = subprocess.Popen(
+                comando, cwd=settings.BASE_DIR, env=env, stdout=log, stderr=subprocess.STDOUT
+            )
+            try:
+                self._esperar(base, servidor)
+                self.stdout.write(f"[{etiqueta}] {nombre_servidor} listo en {base}; corriendo carga…")
+                resultados, duracion = self._cargar(base, datos, mezcla, options)
+            finally:
+                servidor.terminate()
+                try:
+                    servidor.wait(timeout=15)
+                except subprocess.TimeoutExpired:
+                    servidor.kill()
+
+        with open(ruta_log, encoding="utf-8", errors="replace") as f:
+            texto_log = f.read()
+        shutil.rmtree(carpeta, ignore_errors=True)
+        return self._reporte(f"{etiqueta} ({nombre_servidor})", resultados, duracion, texto_log)
+
+    def _correr(self, comando, env):
+        proceso = subprocess.run(comando, cwd=settings.BASE_DIR, env=env, capture_output=True, text=True)
+        if proceso.returncode:
+            raise CommandError(f"Falló {' '.join(comando[1:3])}:\n{proceso.stderr or proceso.stdout}")
+
+    def _comando_servidor(self, options, manage):
+        puerto, workers = options["puerto"], options["workers"]
+        if options["servidor"]:
+            return shlex.split(options["servidor"].format(puerto=puerto, workers=workers)), "servidor propio"
+        if shutil.which("gunicorn"):
+            comando = ["gunicorn", "--workers", str(workers), "--bind", f"127.0.0.1:{puerto}", "--timeout", "120"]
+            if options["asgi"]:
+                return comando + ["-k", "uvicorn.workers.UvicornWorker", "carlos_roque.asgi:application"], "gunicorn ASGI"
+            return comando + ["carlos_roque.wsgi:application"], f"gunicorn x{workers}"
+        self.stdout.write(self.style.WARNING("gunicorn no está instalado: uso runserver (un proceso con hilos)."))
+        return manage + ["runserver", f"127.0.0.1:{puerto}", "--noreload"], "runserver"
+
+    def _esperar(self, base, servidor, limite=60):
+        fin = time.monotonic() + limite
+        while time.monotonic() < fin:
+            if servidor.poll() is not None:
+                raise CommandError("El servidor terminó al arrancar; revisa el comando/puerto.")
+            try:
+                with urllib.request.urlopen(base + "/", timeout=2):
+                    return
+            except urllib.error.HTTPError:
+                return
+            except OSError:
+                time.sleep(0.3)
+        raise CommandError(f"El servidor no respondió en {limite} s.")
+
+    # ---- carga ----
+    def _cargar(self, base, datos, mezcla, options):
+        libros = _libros_clientes(datos, LIBROS_IMPORTACION, options["semilla"]) if mezcla.get("importacion") else []
+        operaciones, pesos = zip(*mezcla.items())
+
+        inicio = time.perf_counter()
+        desde = inicio + options["calentamiento"]
+        fin = desde + options["segundos"]
+        por_usuario = [[] for _ in range(options["usuarios"])]
+
+        def correr(i):
+            rng = random.Random(options["semilla"] * 1000 + i)
+            usuario = _Usuario(base, datos, libros, options["calientes"], rng, por_usuario[i], desde)
+            while time.perf_counter() < fin:
+                operacion = rng.choices(operaciones, pesos)[0]
+                try:
+                    getattr(usuario, operacion)()
+                except Exception:
+                    # Falla del lado del cliente (HTML inesperado, etc.): cuenta como error
+                    if time.perf_counter() >= desde:
+                        por_usuario[i].append((operacion, 0.0, -1))
+
+        hilos = [threading.Thread(target=correr, args=(i,), daemon=True) for i in range(options["usuarios"])]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        duracion = max(time.perf_counter(), fin) - desde
+        return [r for resultados in por_usuario for r in resultados], duracion
+
+    # ---- reporte ----
+    def _reporte(self, titulo, resultados, duracion, log):
+        por_endpoint = defaultdict(list)
+        for nombre, segundos, status in resultados:
+            por_endpoint[nombre].append((segundos, status))
+
+        bloqueos = defaultdict(int)
+        # Cada "Internal Server Error: /ruta/" trae su traceback hasta el siguiente
+        errores_log = list(PATRON_ERROR_500.finditer(log))
+        for i, m in enumerate(errores_log):
+            bloque = log[m.end(): errores_log[i + 1].start() if i + 1 < len(errores_log) else len(log)]
+            if PATRON_BLOQUEO.search(bloque):
+                try:
+                    bloqueos[resolve(urllib.parse.urlsplit(m.group(1)).path).url_name] += 1
+                except Resolver404:
+                    bloqueos[m.group(1)] += 1
+
+        self.stdout.write("")
+        self.stdout.write(self.style.MIGRATE_HEADING(f"== {titulo}: {duracion:.1f} s medidos, {len(resultados)} peticiones =="))
+        self.stdout.write(
+            f"{'endpoint':<30} {'n':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+            f"{'errores':>8} {'% err':>6} {'409':>5}"
+        )
+        filas = []
+        for nombre in sorted(por_endpoint):
+            medidas = por_endpoint[nombre]
+            tiempos = [s for s, status in medidas if status > 0]
+            # Un POST que regresa 200 volvió a pintar el formulario: no se guardó
+            # y una búsqueda con 204 se descartó sin contestar
+            rechazo = 200 if nombre.startswith("POST ") and nombre not in POST_JSON else None
+            if nombre in BUSQUEDA_CON_DEBOUNCE:
+                rechazo = 204
+            errores = sum(
+                1 for _, status in medidas
+                if status <= 0 or status >= 400 and status != 409 or status == rechazo
+            )
+            conflictos = sum(1 for _, status in medidas if status == 409)
+            fila = {
+                "endpoint": nombre,
+                "n": len(medidas),
+                "req_s": round(len(medidas) / duracion, 2) if duracion else 0,
+                "p50_ms": round(_percentil(tiempos, 50) * 1000, 1),
+                "p95_ms": round(_percentil(tiempos, 95) * 1000, 1),
+                "p99_ms": round(_percentil(tiempos, 99) * 1000, 1),
+                "errores": errores,
+                "pct_errores": round(errores * 100 / len(medidas), 2),
+                "conflictos": conflictos,
+            }
+            filas.append(fila)
+            self.stdout.write(
+                f"{nombre:<30} {fila['n']:>6} {fila['req_s']:>8.1f} {fila['p50_ms']:>8.1f} {fila['p95_ms']:>8.1f} "
+                f"{fila['p99_ms']:>8.1f} {errores:>8} {fila['pct_errores']:>6.1f} {conflictos:>5}"
+            )
+
+        total = len(resultados)
+        self.stdout.write(f"{'TOTAL':<30} {total:>6} {total / duracion if duracion else 0:>8.1f}")
+        if log:
+            detalle = ", ".join(f"{k}: {v}" for k, v in sorted(bloqueos.items())) or "ninguno"
+            self.stdout.write(
+                f"Errores 500 en el log: {len(errores_log)} | bloqueos de BD: {sum(bloqueos.values())} ({detalle})"
+            )
+        return {
+            "titulo": titulo,
+            "segundos": round(duracion, 2),
+            "peticiones": total,
+            "endpoints": filas,
+            "errores_500_log": len(errores_log),
+            "bloqueos": dict(bloqueos),
+        }
@@ -0,0 +1,111 @@
+import csv
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.migrations.recorder import MigrationRecorder
+
+from sistema.catalogo import invalidar_catalogo
+from sistema.respaldo import (
+    MODELOS,
+    VERSION_FORMATO,
+    abrir_lectura,
+    columnas,
+    copiar_postgres,
+    insertar_lotes,
+    quitar_indices,
+    recrear_indices,
+    reiniciar_secuencias,
+    sha256_archivo,
+)
+from sistema.models import ClaveCliente, Cliente
+from sistema.similitud import reconstruir_indice
+
+
+class Command(BaseCommand):
+    help = (
+        "Restaura una carpeta de exportar_datos en la BD actual (tablas vacías). "
+        "PostgreSQL: COPY; SQLite: INSERT por lotes. Índices secundarios al final."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("origen", help="Carpeta generada por exportar_datos")
+        parser.add_argument("--sin-verificar", action="store_true", help="No revisar el sha256 de los archivos")
+
+    def handle(self, *args, **options):
+        origen = options["origen"]
+        try:
+            with open(os.path.join(origen, "manifest.json"), encoding="utf-8") as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            raise CommandError(f"No hay manifest.json en {origen}.")
+        if manifest.get("version") != VERSION_FORMATO:
+            raise CommandError(f"Versión de formato no soportada: {manifest.get('version')}.")
+
+        ultima = (
+            MigrationRecorder.Migration.objects.filter(app="sistema").order_by("-id").values_list("name", flat=True).first()
+        )
+        if manifest.get("migracion") != ultima:
+            self.stdout.write(self.style.WARNING(
+                f"El respaldo es de la migración {manifest.get('migracion')} y la BD está en {ultima}."
+            ))
+
+        por_label = {m._meta.label: m for m in MODELOS}
+        tablas = []
+        for info in manifest["modelos"]:
+            modelo = por_label.get(info["modelo"])
+            if modelo is None:
+                raise CommandError(f"Modelo desconocido en el respaldo: {info['modelo']}.")
+            faltan = set(columnas(modelo)) ^ set(info["columnas"])
+            if faltan:
+                raise CommandError(
+                    f"Las columnas de {info['modelo']} no coinciden ({', '.join(sorted(faltan))}); "
+                    "migra ambas BD a la misma versión."
+                )
+            if modelo.objects.exists():
+                raise CommandError(f"La tabla de {info['modelo']} no está vacía; restaura sobre una BD vacía (flush).")
+            if not options["sin_verificar"]:
+                for archivo in info["archivos"]:
+                    if sha256_archivo(os.path.join(origen, archivo["nombre"])) != archivo["sha256"]:
+                        raise CommandError(f"{archivo['nombre']} está dañado (sha256 distinto).")
+            tablas.append((modelo, info))
+
+        # Orden de dependencias, sin importar el orden del manifest
+        tablas.sort(key=lambda t: MODELOS.index(t[0]))
+
+        inicio = time.perf_counter()
+        with transaction.atomic():
+            indices = {modelo: quitar_indices(modelo._meta.db_table) for modelo, _ in tablas}
+
+            for modelo, info in tablas:
+                t = time.perf_counter()
+                for archivo in info["archivos"]:
+                    with abrir_lectura(os.path.join(origen, archivo["nombre"]), manifest["compresion"]) as f:
+                        if connection.vendor == "postgresql":
+                            copiar_postgres(info["tabla"], info["columnas"], f)
+                        else:
+                            lector = csv.reader(f)
+                            next(lector, None)
+                            insertar_lotes(modelo, info["columnas"], lector)
+                self.stdout.write(f"{info['modelo']:<24} {info['filas']:>10} filas  {time.perf_counter() - t:.1f} s")
+
+            t = time.perf_counter()
+            for modelo, sentencias in indices.items():
+                recrear_indices(sentencias)
+            reiniciar_secuencias([modelo for modelo, _ in tablas])
+            self.stdout.write(f"{'índices':<24} {sum(len(s) for s in indices.values()):>10}        {time.perf_counter() - t:.1f} s")
+
+        # Respaldos anteriores a las claves de bloqueo: se derivan de los clientes
+        restaurados = {modelo for modelo, _ in tablas}
+        if Cliente in restaurados and ClaveCliente not in restaurados:
+            t = time.perf_counter()
+            claves = reconstruir_indice()
+            self.stdout.write(f"{'claves de clientes':<24} {claves:>10}        {time.perf_counter() - t:.1f} s")
+
+        # Los workers que ya tenían snapshot del catálogo lo vuelven a armar
+        invalidar_catalogo()
+
+        total = sum(info["filas"] for _, info in tablas)
+        self.stdout.write(self.style.SUCCESS(f"Restauradas {total} filas en {time.perf_counter() - inicio:.1f} s"))
@@ -0,0 +1,151 @@
+"""
+Archivos subidos (escaneos de remisiones): almacenamiento por hash de contenido y
+vista para servirlos en producción.
+
+- HashStorage guarda cada archivo como <carpeta>/<hh>/<sha256>.<ext>: si se sube el
+  mismo escaneo dos veces (aunque sea al mismo tiempo), se reutiliza el archivo ya
+  guardado.
+- servir_media entrega MEDIA_ROOT con ETag/Last-Modified (304), rangos (206) y, para
+  nombres con hash, Cache-Control inmutable de un año. El archivo completo va con
+  FileResponse (gunicorn usa sendfile vía wsgi.file_wrapper); nunca se lee a memoria.
+"""
+import hashlib
+import mimetypes
+import os
+import posixpath
+import re
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import FileSystemStorage
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+
+NOMBRE_HASH = re.compile(r"/[0-9a-f]{2}/([0-9a-f]{64})\.[A-Za-z0-9]+$")
+UN_ANIO = 60 * 60 * 24 * 365
+CHUNK = 64 * 1024
+
+
+class HashStorage(FileSystemStorage):
+    """FileSystemStorage que nombra (y deduplica) los archivos por su sha256."""
+
+    def save(self, name, content, max_length=None):
+        h = hashlib.sha256()
+        if hasattr(content, "seek"):
+            content.seek(0)
+        for chunk in content.chunks():
+            h.update(chunk)
+        if hasattr(content, "seek"):
+            content.seek(0)
+        digest = h.hexdigest()
+
+        # De upload_to solo se conserva la carpeta raíz ("remisiones"): con las carpetas
+        # de año/mes el mismo escaneo subido en otro mes quedaría guardado dos veces
+        carpeta = (name or "").replace("\\", "/").split("/")[0] if "/" in (name or "") else ""
+        ext = os.path.splitext(name or "")[1].lower()
+        nombre = posixpath.join(carpeta, digest[:2], f"{digest}{ext}")
+
+        ruta = self.path(nombre)
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        # O_EXCL: crear y comprobar que no existía es una sola operación. Si otra petición
+        # ya lo guardó (o lo está guardando) es el mismo contenido: se usa el mismo nombre
+        try:
+            fd = os.open(ruta, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0), 0o666)
+        except FileExistsError:
+            return nombre
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in content.chunks():
+                    f.write(chunk)
+        except BaseException:
+            os.remove(ruta)
+            raise
+        if self.file_permissions_mode is not None:
+            os.chmod(ruta, self.file_permissions_mode)
+        return nombre
+
+
+def media_storage():
+    return HashStorage()
+
+
+def _rango(header, tamano):
+    """'bytes=a-b' -> (inicio, fin) inclusivo, o None si no aplica / es múltiple."""
+    m = re.fullmatch(r"bytes=(\d*)-(\d*)", header.strip())
+    if not m or (not m.group(1) and not m.group(2)):
+        return None
+    if m.group(1):
+        inicio = int(m.group(1))
+        fin = int(m.group(2)) if m.group(2) else tamano - 1
+    else:
+        # sufijo: últimos N bytes
+        inicio = max(0, tamano - int(m.group(2)))
+        fin = tamano - 1
+    fin = min(fin, tamano - 1)
+    if inicio > fin:
+        return False
+    return inicio, fin
+
+
+def _leer(ruta, inicio, largo):
+    with open(ruta, "rb") as f:
+        f.seek(inicio)
+        while largo > 0:
+            datos = f.read(min(CHUNK, largo))
+            if not datos:
+                break
+            largo -= len(datos)
+            yield datos
+
+
+@require_safe
+def servir_media(request, ruta):
+    try:
+        completa = safe_join(settings.MEDIA_ROOT, ruta)
+    except SuspiciousFileOperation:
+        raise Http404("Archivo no encontrado.")
+    if not os.path.isfile(completa):
+        raise Http404("Archivo no encontrado.")
+
+    st = os.stat(completa)
+    hashed = NOMBRE_HASH.search("/" + ruta.replace("\\", "/"))
+    etag = f'"{hashed.group(1)}"' if hashed else f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+
+    def encabezados(response):
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(st.st_mtime)
+        response["Accept-Ranges"] = "bytes"
+        if hashed:
+            response["Cache-Control"] = f"public, max-age={UN_ANIO}, immutable"
+        else:
+            response["Cache-Control"] = "public, max-age=3600"
+        return response
+
+    no_modificado = get_conditional_response(request, etag=etag, last_modified=int(st.st_mtime))
+    if no_modificado is not None:
+        return encabezados(no_modificado)
+
+    content_type = mimetypes.guess_type(completa)[0] or "application/octet-stream"
+    rango_header = request.headers.get("Range", "")
+    if_range = request.headers.get("If-Range", "")
+    if rango_header and (not if_range or if_range == etag):
+        rango = _rango(rango_header, st.st_size)
+        if rango is False:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{st.st_size}"
+            return encabezados(response)
+        if rango:
+            inicio, fin = rango
+            largo = fin - inicio + 1
+            response = StreamingHttpResponse(
+                _leer(completa, inicio, largo), status=206, content_type=content_type
+            )
+            response["Content-Length"] = str(largo)
+            response["Content-Range"] = f"bytes {inicio}-{fin}/{st.st_size}"
+            return encabezados(response)
+
+    response = FileResponse(open(completa, "rb"), content_type=content_type)
+    return encabezados(response)
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 05:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sistema', '0002_remision_venta_detalleventa_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='venta',
+            name='version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.8 on 2026-10-19 05:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sistema', '0003_venta_version'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='remision',
+            index=models.Index(fields=['-fecha', '-id'], name='remision_fecha_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='remision',
+            index=models.Index(fields=['cliente', '-fecha', '-id'], name='remision_cliente_fecha_idx'),
+        ),
+    ]
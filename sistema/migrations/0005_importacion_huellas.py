@@ -0,0 +1,46 @@
+# Generated by Django 5.2.8 on 2026-10-19 05:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sistema', '0004_remision_indices_listado'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Importacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('productos', 'Productos'), ('clientes', 'Clientes'), ('remisiones', 'Remisiones')], max_length=20)),
+                ('archivo', models.CharField(blank=True, default='', max_length=255)),
+                ('sha256', models.CharField(max_length=64)),
+                ('filas', models.PositiveIntegerField(default=0)),
+                ('nuevas', models.PositiveIntegerField(default=0)),
+                ('cambiadas', models.PositiveIntegerField(default=0)),
+                ('sin_cambios', models.PositiveIntegerField(default=0)),
+                ('cambios', models.JSONField(blank=True, default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-created_at', '-id'],
+                'indexes': [models.Index(fields=['tipo', 'sha256'], name='importacion_tipo_sha_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='HuellaFila',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('productos', 'Productos'), ('clientes', 'Clientes'), ('remisiones', 'Remisiones')], max_length=20)),
+                ('clave', models.CharField(max_length=255)),
+                ('huella', models.CharField(max_length=40)),
+                ('importacion', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='huellas', to='sistema.importacion')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('tipo', 'clave'), name='uniq_huella_por_tipo_clave')],
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.8 on 2026-10-19 05:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def copiar_cliente_de_remision(apps, schema_editor):
+    Venta = apps.get_model("sistema", "Venta")
+    Remision = apps.get_model("sistema", "Remision")
+    Venta.objects.update(
+        cliente_id=models.Subquery(
+            Remision.objects.filter(pk=models.OuterRef("remision_id")).values("cliente_id")[:1]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sistema', '0005_importacion_huellas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='venta',
+            name='cliente',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='ventas', to='sistema.cliente'),
+        ),
+        migrations.RunPython(copiar_cliente_de_remision, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='venta',
+            name='cliente',
+            field=models.ForeignKey(editable=False, on_delete=django.db.models.deletion.PROTECT, related_name='ventas', to='sistema.cliente'),
+        ),
+        migrations.AddIndex(
+            model_name='venta',
+            index=models.Index(fields=['cliente', 'fecha', 'id'], name='venta_cliente_fecha_idx'),
+        ),
+    ]
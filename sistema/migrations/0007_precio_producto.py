@@ -0,0 +1,55 @@
+# Generated by Django 5.2.8 on 2026-10-19 05:42
+
+import django.db.models.deletion
+from datetime import date
+
+from django.db import migrations, models
+
+
+def sembrar_precios_actuales(apps, schema_editor):
+    # Sin historial previo, los precios actuales se toman como vigentes "desde siempre"
+    Producto = apps.get_model("sistema", "Producto")
+    PrecioProducto = apps.get_model("sistema", "PrecioProducto")
+    PrecioProducto.objects.bulk_create(
+        [
+            PrecioProducto(
+                producto_id=p.pk,
+                vigente_desde=date(2000, 1, 1),
+                compra_cjs=p.compra_cjs,
+                compra_pzs=p.compra_pzs,
+                venta_cjs=p.venta_cjs,
+                venta_pzs=p.venta_pzs,
+            )
+            for p in Producto.objects.all().iterator()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sistema', '0006_venta_cliente'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PrecioProducto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('vigente_desde', models.DateField()),
+                ('compra_cjs', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('compra_pzs', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('venta_cjs', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('venta_pzs', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('importacion', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='precios', to='sistema.importacion')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='precios', to='sistema.producto')),
+            ],
+            options={
+                'ordering': ['producto', '-vigente_desde', '-id'],
+                'indexes': [models.Index(fields=['producto', '-vigente_desde', '-id'], name='precio_producto_vigente_idx')],
+            },
+        ),
+        migrations.RunPython(sembrar_precios_actuales, migrations.RunPython.noop),
+    ]
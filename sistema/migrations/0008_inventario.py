@@ -0,0 +1,58 @@
+# Generated by Django 5.2.8 on 2026-10-19 05:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sistema', '0007_precio_producto'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CorteInventario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hasta_movimiento', models.BigIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-id'],
+            },
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='piezas_por_paquete',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.CreateModel(
+            name='MovimientoInventario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('ENT', 'Entrada'), ('VTA', 'Venta'), ('AJU', 'Ajuste')], max_length=3)),
+                ('piezas', models.DecimalField(decimal_places=3, max_digits=14)),
+                ('fecha', models.DateField(db_index=True)),
+                ('referencia', models.CharField(blank=True, default='', max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='movimientos', to='sistema.producto')),
+                ('venta', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='movimientos_inventario', to='sistema.venta')),
+            ],
+            options={
+                'ordering': ['-id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ExistenciaCorte',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('piezas', models.DecimalField(decimal_places=3, max_digits=14)),
+                ('corte', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='existencias', to='sistema.corteinventario')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='existencias_corte', to='sistema.producto')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('corte', 'producto'), name='uniq_existencia_por_corte')],
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-19 05:45
+
+import sistema.media
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sistema', '0008_inventario'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='remision',
+            name='imagen',
+            field=models.ImageField(blank=True, help_text='Foto/escaneo de la remisión en papel.', null=True, storage=sistema.media.media_storage, upload_to='remisiones/%Y/%m/'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-19 05:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sistema', '0009_remision_imagen_hash_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importacion',
+            name='metricas',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='importacion',
+            name='perfil',
+            field=models.TextField(blank=True, default=''),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.8 on 2026-10-19 06:08
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sistema', '0010_importacion_metricas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PeriodoCerrado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hasta', models.DateField(unique=True)),
+                ('ventas', models.PositiveIntegerField(default=0)),
+                ('lineas', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-hasta'],
+            },
+        ),
+        migrations.CreateModel(
+            name='VentaArchivada',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('fecha', models.DateField(db_index=True)),
+                ('subtotal', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('descuento', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('iva', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('version', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('cliente', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='ventas_archivadas', to='sistema.cliente')),
+                ('remision', models.OneToOneField(on_delete=django.db.models.deletion.PROTECT, related_name='venta_archivada', to='sistema.remision')),
+            ],
+            options={
+                'ordering': ['-fecha', '-id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='DetalleVentaArchivada',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('unidad', models.CharField(choices=[('PAQ', 'Paquetes'), ('PZA', 'Piezas')], max_length=3)),
+                ('cantidad', models.DecimalField(decimal_places=3, max_digits=12)),
+                ('precio_unitario', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('subtotal', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('created_at', models.DateTimeField()),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='detalles_archivados', to='sistema.producto')),
+                ('venta', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='detalles', to='sistema.ventaarchivada')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='ventaarchivada',
+            index=models.Index(fields=['cliente', 'fecha', 'id'], name='ventaarch_cliente_fecha_idx'),
+        ),
+    ]
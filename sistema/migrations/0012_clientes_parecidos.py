@@ -0,0 +1,57 @@
+# Generated by Django 5.2.8 on 2026-10-19 06:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from sistema.similitud import claves_bloqueo
+
+
+def indexar_clientes(apps, schema_editor):
+    Cliente = apps.get_model("sistema", "Cliente")
+    ClaveCliente = apps.get_model("sistema", "ClaveCliente")
+    ClaveCliente.objects.bulk_create(
+        (
+            ClaveCliente(cliente_id=pk, clave=clave)
+            for pk, proveedor, comercio in Cliente.objects.values_list("pk", "proveedor", "comercio").iterator()
+            for clave in claves_bloqueo(proveedor, comercio)
+        ),
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sistema', '0011_periodos_cerrados'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClaveCliente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(max_length=64)),
+                ('alias', models.BooleanField(default=False)),
+                ('cliente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='claves', to='sistema.cliente')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['clave', 'cliente'], name='clavecliente_clave_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DuplicadoCliente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('similitud', models.DecimalField(decimal_places=3, max_digits=4)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('candidato', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='duplicados_de', to='sistema.cliente')),
+                ('cliente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='duplicados', to='sistema.cliente')),
+                ('importacion', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='duplicados', to='sistema.importacion')),
+            ],
+            options={
+                'ordering': ['-similitud', 'id'],
+                'constraints': [models.UniqueConstraint(fields=('cliente', 'candidato'), name='uniq_duplicado_cliente')],
+            },
+        ),
+        migrations.RunPython(indexar_clientes, migrations.RunPython.noop),
+    ]
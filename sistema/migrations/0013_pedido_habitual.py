@@ -0,0 +1,40 @@
+# Generated by Django 5.2.8 on 2026-10-19 06:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sistema', '0012_clientes_parecidos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PedidoHabitual',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ventas', models.PositiveIntegerField(default=0)),
+                ('vigente', models.BooleanField(default=True)),
+                ('calculado_en', models.DateTimeField(auto_now=True)),
+                ('cliente', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='pedido_habitual', to='sistema.cliente')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LineaHabitual',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('unidad', models.CharField(choices=[('PAQ', 'Paquetes'), ('PZA', 'Piezas')], max_length=3)),
+                ('cantidad', models.DecimalField(decimal_places=3, max_digits=12)),
+                ('veces', models.PositiveIntegerField()),
+                ('ultima_fecha', models.DateField()),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lineas_habituales', to='sistema.producto')),
+                ('pedido', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lineas', to='sistema.pedidohabitual')),
+            ],
+            options={
+                'ordering': ['-veces', '-ultima_fecha', 'id'],
+                'constraints': [models.UniqueConstraint(fields=('pedido', 'producto', 'unidad'), name='uniq_linea_habitual')],
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.8 on 2026-10-19 06:42
+
+from django.db import migrations, models
+
+
+def crear_version(apps, schema_editor):
+    apps.get_model("sistema", "VersionCatalogo").objects.get_or_create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sistema', '0013_pedido_habitual'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VersionCatalogo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(crear_version, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,12 @@
-from django.db import models
+import time
+
+from django.db import connections, models, router, transaction
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator
 from decimal import Decimal
 
+from .media import media_storage
+
 
 
 class Cliente(models.Model):
@@ -25,9 +30,90 @@ class Producto(models.Model):
     venta_cjs = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     venta_pzs = models.DecimalField(max_digits=10, decimal_places=2, default=0)
 
+    # Factor de conversión para inventario: cuántas piezas trae un paquete/caja
+    piezas_por_paquete = models.PositiveIntegerField(default=1)
+
     def __str__(self):
         return f"{self.codigo} - {self.descripcion}"
 
+    def a_piezas(self, cantidad, unidad):
+        """Convierte una cantidad en PAQ/PZA a piezas (unidad base del inventario)."""
+        if unidad == DetalleVenta.UNIDAD_PAQUETES:
+            return cantidad * self.piezas_por_paquete
+        return cantidad
+
+
+class VersionCatalogo(models.Model):
+    """
+    Un solo renglón (pk=1) con la versión del catálogo de productos. Vive en la BD para
+    que todos los workers vean el cambio (sistema.catalogo compara contra su snapshot).
+    """
+    version = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"Catálogo v{self.version}"
+
+    @classmethod
+    def actual(cls, using=None):
+        return cls.objects.using(using).filter(pk=1).values_list("version", flat=True).first() or 0
+
+    @classmethod
+    def subir(cls):
+        if not cls.objects.filter(pk=1).update(version=models.F("version") + 1):
+            # Sin renglón (p. ej. después de un flush): arranca en un valor que no repita
+            # una versión que un worker tenga en memoria
+            cls.objects.get_or_create(pk=1, defaults={"version": time.time_ns()})
+
+
+class PrecioProducto(models.Model):
+    """
+    Historial de precios (solo se agregan renglones). El precio vigente de un producto
+    a una fecha es el último con vigente_desde <= fecha (desempate por id).
+    """
+    CAMPOS_PRECIO = ("compra_cjs", "compra_pzs", "venta_cjs", "venta_pzs")
+
+    producto = models.ForeignKey(
+        Producto,
+        on_delete=models.CASCADE,
+        related_name="precios",
+    )
+    vigente_desde = models.DateField()
+    compra_cjs = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    compra_pzs = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    venta_cjs = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    venta_pzs = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+
+    importacion = models.ForeignKey(
+        "sistema.Importacion",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="precios",
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["producto", "-vigente_desde", "-id"]
+        indexes = [
+            models.Index(
+                fields=["producto", "-vigente_desde", "-id"],
+                name="precio_producto_vigente_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.producto.codigo} desde {self.vigente_desde}"
+
+    @classmethod
+    def desde_producto(cls, producto, vigente_desde, importacion=None):
+        """Renglón de historial con los precios actuales del producto."""
+        return cls(
+            producto_id=producto.pk,
+            vigente_desde=vigente_desde,
+            importacion=importacion,
+            **{campo: getattr(producto, campo) for campo in cls.CAMPOS_PRECIO},
+        )
+
 
 class Remision(models.Model):
     """
@@ -43,8 +129,10 @@ class Remision(models.Model):
     fecha = models.DateField(db_index=True)
 
     # Imagen (o PDF si luego quieres). Por ahora imagen.
+    # Se guarda por hash de contenido (ver sistema.media.HashStorage)
     imagen = models.ImageField(
         upload_to="remisiones/%Y/%m/",
+        storage=media_storage,
         null=True,
         blank=True,
         help_text="Foto/escaneo de la remisión en papel."
@@ -63,11 +151,82 @@ class Remision(models.Model):
                 name="uniq_remision_folio_por_cliente",
             )
         ]
+        indexes = [
+            # Listado general y navegación por mes: rango sobre fecha ya ordenado
+            models.Index(fields=["-fecha", "-id"], name="remision_fecha_id_idx"),
+            # Listado de un cliente (y su mes): rango sobre (cliente, fecha) sin sort
+            models.Index(fields=["cliente", "-fecha", "-id"], name="remision_cliente_fecha_idx"),
+        ]
         ordering = ["-fecha", "-id"]
 
     def __str__(self):
         return f"Remisión {self.folio} - {self.cliente} ({self.fecha})"
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Venta.cliente es copia de remision.cliente (para el índice cliente/fecha)
+        Venta.objects.filter(remision_id=self.pk).exclude(cliente_id=self.cliente_id).update(
+            cliente_id=self.cliente_id
+        )
+
+
+class VentaManager(models.Manager):
+    def vacias(self, remisiones):
+        """Ventas vacías (sin guardar) para [(remision_id, cliente_id, fecha), ...]."""
+        return [
+            self.model(
+                remision_id=remision_id,
+                cliente_id=cliente_id,
+                fecha=fecha,
+                subtotal=Decimal("0.00"),
+                total=Decimal("0.00"),
+                descuento=Decimal("0.00"),
+                iva=Decimal("0.00"),
+            )
+            for remision_id, cliente_id, fecha in remisiones
+        ]
+
+    def crear_para_remisiones(self, remisiones):
+        """
+        Crea (vacía) la venta de cada remisión del queryset que todavía no tenga una.
+        Las remisiones sin venta se buscan con un anti-join y las ventas se insertan
+        con un solo bulk_create. Regresa (creadas, ya_tenian_venta).
+        """
+        total = remisiones.count()
+        pendientes = remisiones.filter(venta__isnull=True, venta_archivada__isnull=True)
+        corte = PeriodoCerrado.corte()
+        if corte:
+            pendientes = pendientes.filter(fecha__gte=corte)
+        pendientes = pendientes.order_by().values_list("id", "cliente_id", "fecha")
+
+        alias = router.db_for_write(self.model)
+        with transaction.atomic(using=alias):
+            # En PostgreSQL (READ COMMITTED) otra transacción podría confirmar una venta
+            # entre el conteo de "antes" y el INSERT y contarse como creada aquí. SHARE ROW
+            # EXCLUSIVE choca con los INSERT/UPDATE de otros (y consigo mismo) hasta el
+            # commit. En SQLite las escrituras ya van de una en una.
+            conexion = connections[alias]
+            if conexion.vendor == "postgresql":
+                with conexion.cursor() as cursor:
+                    tabla = conexion.ops.quote_name(self.model._meta.db_table)
+                    cursor.execute(f"LOCK TABLE {tabla} IN SHARE ROW EXCLUSIVE MODE")
+            nuevas = self.vacias(pendientes)
+            ids = [venta.remision_id for venta in nuevas]
+            antes = self.filter(remision_id__in=ids).count() if ids else 0
+            # ignore_conflicts: si alguien creó la venta en paralelo, no revienta el lote;
+            # esas no cuentan como creadas (se saltaron), por eso se vuelve a contar
+            self.bulk_create(nuevas, ignore_conflicts=True)
+            creadas = self.filter(remision_id__in=ids).count() - antes if ids else 0
+
+        return creadas, total - creadas
+
+    def subir_version(self, ids):
+        """
+        Sube la versión de esas ventas para que un venta_edit abierto antes choque (409)
+        en vez de pisar lo que se guardó por otro lado (admin, acciones).
+        """
+        return self.filter(pk__in=ids).update(version=models.F("version") + 1)
+
 
 class Venta(models.Model):
     """
@@ -81,6 +240,15 @@ class Venta(models.Model):
         help_text="Una remisión tiene a lo más una venta asociada."
     )
 
+    # Copia de remision.cliente: permite recorrer las ventas de un cliente por fecha
+    # con un índice (cliente, fecha) sin pasar por Remision. Se llena en save().
+    cliente = models.ForeignKey(
+        "sistema.Cliente",
+        on_delete=models.PROTECT,
+        related_name="ventas",
+        editable=False,
+    )
+
     # si quieres separar fecha de venta vs fecha de remisión:
     fecha = models.DateField(db_index=True)
 
@@ -91,15 +259,38 @@ class Venta(models.Model):
     descuento = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal("0.00"))
     iva = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal("0.00"))
 
+    # Control de concurrencia optimista: se incrementa en cada guardado desde venta_edit
+    # (y desde el admin, con VentaManager.subir_version).
+    version = models.PositiveIntegerField(default=0, editable=False)
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = VentaManager()
+
     class Meta:
         ordering = ["-fecha", "-id"]
+        indexes = [
+            models.Index(fields=["cliente", "fecha", "id"], name="venta_cliente_fecha_idx"),
+        ]
 
     def __str__(self):
         return f"Venta #{self.id} ({self.fecha}) - {self.remision.folio}"
 
+    def clean(self):
+        super().clean()
+        if self.fecha and PeriodoCerrado.cerrado(self.fecha):
+            raise ValidationError({"fecha": f"El periodo está cerrado hasta el {PeriodoCerrado.corte():%d/%m/%Y}."})
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None or "cliente" in update_fields:
+            self.cliente_id = self.remision.cliente_id
+        # Los periodos cerrados son de solo lectura (ver PeriodoCerrado)
+        if (update_fields is None or "fecha" in update_fields) and PeriodoCerrado.cerrado(self.fecha):
+            raise ValidationError(f"No se puede guardar una venta del {self.fecha}: el periodo está cerrado.")
+        super().save(*args, **kwargs)
+
     def recalcular_totales(self, commit=True):
         """
         Recalcula subtotal/total sumando sus detalles.
@@ -174,3 +365,343 @@ class DetalleVenta(models.Model):
         self.subtotal = (self.cantidad * self.precio_unitario).quantize(Decimal("0.01"))
         super().save(*args, **kwargs)
 
+
+
+class PeriodoCerrado(models.Model):
+    """
+    Cierre de periodo: las ventas con fecha < hasta (y sus líneas) se movieron a
+    VentaArchivada / DetalleVentaArchivada y ya no se pueden modificar.
+    El corte vigente es el hasta más reciente (ver sistema.archivo).
+    """
+    hasta = models.DateField(unique=True)
+    ventas = models.PositiveIntegerField(default=0)
+    lineas = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-hasta"]
+
+    def __str__(self):
+        return f"Cerrado hasta {self.hasta:%Y-%m-%d}"
+
+    @classmethod
+    def corte(cls):
+        """Fecha a partir de la cual las ventas siguen vivas (None: nada cerrado)."""
+        return cls.objects.aggregate(hasta=models.Max("hasta"))["hasta"]
+
+    @classmethod
+    def cerrado(cls, fecha):
+        corte = cls.corte()
+        return corte is not None and fecha is not None and fecha < corte
+
+
+class VentaArchivada(models.Model):
+    """
+    Venta de un periodo cerrado. Mismas columnas (y mismo id) que Venta para que los
+    reportes y las plantillas la lean igual; solo se escribe al cerrar un periodo.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    remision = models.OneToOneField(
+        Remision,
+        on_delete=models.PROTECT,
+        related_name="venta_archivada",
+    )
+    cliente = models.ForeignKey(
+        "sistema.Cliente",
+        on_delete=models.PROTECT,
+        related_name="ventas_archivadas",
+    )
+    fecha = models.DateField(db_index=True)
+
+    subtotal = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal("0.00"))
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal("0.00"))
+    descuento = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal("0.00"))
+    iva = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal("0.00"))
+    version = models.PositiveIntegerField(default=0)
+
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ["-fecha", "-id"]
+        indexes = [
+            models.Index(fields=["cliente", "fecha", "id"], name="ventaarch_cliente_fecha_idx"),
+        ]
+
+    def __str__(self):
+        return f"Venta #{self.id} ({self.fecha}, archivada) - {self.remision.folio}"
+
+
+class DetalleVentaArchivada(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    venta = models.ForeignKey(
+        VentaArchivada,
+        on_delete=models.CASCADE,
+        related_name="detalles",
+    )
+    producto = models.ForeignKey(
+        "sistema.Producto",
+        on_delete=models.PROTECT,
+        related_name="detalles_archivados",
+    )
+    unidad = models.CharField(max_length=3, choices=DetalleVenta.UNIDAD_CHOICES)
+    cantidad = models.DecimalField(max_digits=12, decimal_places=3)
+    precio_unitario = models.DecimalField(max_digits=12, decimal_places=2)
+    subtotal = models.DecimalField(max_digits=12, decimal_places=2)
+    created_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.producto} x {self.cantidad} ({self.get_unidad_display()})"
+
+
+class Importacion(models.Model):
+    """
+    Bitácora de importaciones de Excel: hash del archivo y resumen de lo que cambió.
+    Sirve para no repetir el trabajo si se vuelve a subir el mismo archivo.
+    """
+    TIPO_PRODUCTOS = "productos"
+    TIPO_CLIENTES = "clientes"
+    TIPO_REMISIONES = "remisiones"
+    TIPO_CHOICES = [
+        (TIPO_PRODUCTOS, "Productos"),
+        (TIPO_CLIENTES, "Clientes"),
+        (TIPO_REMISIONES, "Remisiones"),
+    ]
+
+    tipo = models.CharField(max_length=20, choices=TIPO_CHOICES)
+    archivo = models.CharField(max_length=255, blank=True, default="")
+    sha256 = models.CharField(max_length=64)
+
+    filas = models.PositiveIntegerField(default=0)
+    nuevas = models.PositiveIntegerField(default=0)
+    cambiadas = models.PositiveIntegerField(default=0)
+    sin_cambios = models.PositiveIntegerField(default=0)
+
+    # {"nuevas": [claves...], "cambiadas": [claves...]} (recortado)
+    cambios = models.JSONField(default=dict, blank=True)
+
+    # Tiempo y queries por fase (ver sistema.perfilado) y, si se pidió, salida de cProfile
+    metricas = models.JSONField(default=dict, blank=True)
+    perfil = models.TextField(blank=True, default="")
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-created_at", "-id"]
+        indexes = [
+            models.Index(fields=["tipo", "sha256"], name="importacion_tipo_sha_idx"),
+        ]
+
+    def __str__(self):
+        return f"Importación {self.get_tipo_display()} {self.archivo} ({self.created_at:%Y-%m-%d %H:%M})"
+
+
+class HuellaFila(models.Model):
+    """
+    Última huella (hash de los valores) de cada fila importada, por clave natural:
+    codigo (productos), proveedor (clientes) o proveedor|folio (remisiones).
+    """
+    tipo = models.CharField(max_length=20, choices=Importacion.TIPO_CHOICES)
+    clave = models.CharField(max_length=255)
+    huella = models.CharField(max_length=40)
+    importacion = models.ForeignKey(
+        Importacion,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="huellas",
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["tipo", "clave"], name="uniq_huella_por_tipo_clave"),
+        ]
+
+    def __str__(self):
+        return f"{self.tipo}:{self.clave}"
+
+
+class MovimientoInventario(models.Model):
+    """
+    Bitácora de inventario (solo se agregan renglones; nunca se editan). Las cantidades
+    van en piezas: positivas entran, negativas salen. Las ediciones de una venta se
+    registran como movimientos de ajuste sobre la misma venta.
+    """
+    TIPO_ENTRADA = "ENT"
+    TIPO_VENTA = "VTA"
+    TIPO_AJUSTE = "AJU"
+    TIPO_CHOICES = [
+        (TIPO_ENTRADA, "Entrada"),
+        (TIPO_VENTA, "Venta"),
+        (TIPO_AJUSTE, "Ajuste"),
+    ]
+
+    producto = models.ForeignKey(
+        Producto,
+        on_delete=models.PROTECT,
+        related_name="movimientos",
+    )
+    tipo = models.CharField(max_length=3, choices=TIPO_CHOICES)
+    piezas = models.DecimalField(max_digits=14, decimal_places=3)
+    fecha = models.DateField(db_index=True)
+
+    venta = models.ForeignKey(
+        Venta,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="movimientos_inventario",
+    )
+    referencia = models.CharField(max_length=255, blank=True, default="")
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-id"]
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} {self.producto.codigo}: {self.piezas}"
+
+
+class CorteInventario(models.Model):
+    """
+    Foto periódica de existencias: incluye todos los movimientos con id <= hasta_movimiento.
+    Existencia actual = último corte + movimientos posteriores.
+    """
+    hasta_movimiento = models.BigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-id"]
+
+    def __str__(self):
+        return f"Corte #{self.id} ({self.created_at:%Y-%m-%d %H:%M})"
+
+
+class ExistenciaCorte(models.Model):
+    corte = models.ForeignKey(
+        CorteInventario,
+        on_delete=models.CASCADE,
+        related_name="existencias",
+    )
+    producto = models.ForeignKey(
+        Producto,
+        on_delete=models.CASCADE,
+        related_name="existencias_corte",
+    )
+    piezas = models.DecimalField(max_digits=14, decimal_places=3)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["corte", "producto"], name="uniq_existencia_por_corte"),
+        ]
+
+    def __str__(self):
+        return f"{self.producto.codigo}: {self.piezas} ({self.corte})"
+
+
+class ClaveCliente(models.Model):
+    """
+    Claves de bloqueo para encontrar clientes parecidos (ver sistema.similitud): dos
+    clientes solo se comparan si comparten alguna. Se regeneran al crear o editar el
+    cliente; las "c:" (clave normalizada) de un cliente fusionado pasan al destino.
+    """
+    cliente = models.ForeignKey(
+        Cliente,
+        on_delete=models.CASCADE,
+        related_name="claves",
+    )
+    clave = models.CharField(max_length=64)
+    # Clave "c:" heredada de un cliente fusionado; indexar_clientes no la regenera
+    alias = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["clave", "cliente"], name="clavecliente_clave_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.clave} -> {self.cliente_id}"
+
+
+class DuplicadoCliente(models.Model):
+    """
+    Posible duplicado detectado al importar: `cliente` (el nuevo) se parece a
+    `candidato` (el más antiguo). Se resuelve fusionando o descartando desde el admin.
+    """
+    cliente = models.ForeignKey(
+        Cliente,
+        on_delete=models.CASCADE,
+        related_name="duplicados",
+    )
+    candidato = models.ForeignKey(
+        Cliente,
+        on_delete=models.CASCADE,
+        related_name="duplicados_de",
+    )
+    similitud = models.DecimalField(max_digits=4, decimal_places=3)
+    importacion = models.ForeignKey(
+        Importacion,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="duplicados",
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-similitud", "id"]
+        constraints = [
+            models.UniqueConstraint(fields=["cliente", "candidato"], name="uniq_duplicado_cliente"),
+        ]
+
+    def __str__(self):
+        return f"{self.cliente} ≈ {self.candidato} ({self.similitud})"
+
+
+class PedidoHabitual(models.Model):
+    """
+    Lo que un cliente suele pedir, calculado de sus últimas ventas (ver
+    sistema.sugerencias). Guardar una venta solo lo marca como no vigente; se recalcula
+    la siguiente vez que se pide.
+    """
+    cliente = models.OneToOneField(
+        Cliente,
+        on_delete=models.CASCADE,
+        related_name="pedido_habitual",
+    )
+    # Ventas con líneas que entraron al cálculo
+    ventas = models.PositiveIntegerField(default=0)
+    vigente = models.BooleanField(default=True)
+    calculado_en = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Pedido habitual de {self.cliente}"
+
+
+class LineaHabitual(models.Model):
+    pedido = models.ForeignKey(
+        PedidoHabitual,
+        on_delete=models.CASCADE,
+        related_name="lineas",
+    )
+    producto = models.ForeignKey(
+        Producto,
+        on_delete=models.CASCADE,
+        related_name="lineas_habituales",
+    )
+    unidad = models.CharField(max_length=3, choices=DetalleVenta.UNIDAD_CHOICES)
+    # La cantidad más repetida (empate: la más reciente)
+    cantidad = models.DecimalField(max_digits=12, decimal_places=3)
+    # En cuántas de las `pedido.ventas` aparece
+    veces = models.PositiveIntegerField()
+    ultima_fecha = models.DateField()
+
+    class Meta:
+        ordering = ["-veces", "-ultima_fecha", "id"]
+        constraints = [
+            models.UniqueConstraint(fields=["pedido", "producto", "unidad"], name="uniq_linea_habitual"),
+        ]
+
+    def __str__(self):
+        return f"{self.producto} x {self.cantidad} ({self.get_unidad_display()})"
@@ -0,0 +1,161 @@
+"""
+Medición de importadores por fase.
+
+    perfil = PerfilImportacion(perfilar=True)
+    with perfil:
+        with perfil.fase("abrir"):
+            wb = abrir_libro(archivo)
+        for row in perfil.iterar(ws.iter_rows()):   # el next() cuenta como "leer"
+            with perfil.fase("normalizar"):
+                ...
+    perfil.guardar(importacion)
+
+Las fases son exclusivas: si una se abre dentro de otra, el tiempo y los queries van a
+la interior. Los queries se cuentan con un execute_wrapper (funciona con DEBUG=False).
+Con perfilar=True además se corre cProfile y se guarda el top por tiempo acumulado.
+"""
+import cProfile
+import io
+import logging
+import pstats
+from contextlib import contextmanager
+from time import perf_counter
+
+from django.db import connection
+
+from .models import Importacion
+
+logger = logging.getLogger(__name__)
+
+# Fases en el orden en que se muestran
+FASES = {
+    "abrir": "Abrir archivo",
+    "leer": "Leer filas",
+    "normalizar": "Normalizar valores",
+    "casar": "Casar contra la BD",
+    "escribir": "Escribir",
+    "confirmar": "Commit",
+    "otros": "Otros",
+}
+LINEAS_PERFIL = 40
+
+
+class PerfilImportacion:
+    def __init__(self, perfilar=False):
+        self.perfilar = perfilar
+        self.filas = 0
+        self.perfil = ""
+        # nombre -> [segundos, queries, segundos_bd]
+        self._fases = {}
+        self._pila = []
+        self._marca = None
+        self._inicio = None
+        self._total = 0.0
+        self._profiler = None
+        self._wrapper = None
+
+    def _dato(self, nombre):
+        dato = self._fases.get(nombre)
+        if dato is None:
+            dato = self._fases[nombre] = [0.0, 0, 0.0]
+        return dato
+
+    def _actual(self):
+        return self._pila[-1] if self._pila else "otros"
+
+    def _acumular(self):
+        ahora = perf_counter()
+        self._dato(self._actual())[0] += ahora - self._marca
+        self._marca = ahora
+
+    def _contar_query(self, execute, sql, params, many, context):
+        inicio = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            dato = self._dato(self._actual())
+            dato[1] += 1
+            dato[2] += perf_counter() - inicio
+
+    def __enter__(self):
+        self._wrapper = connection.execute_wrapper(self._contar_query)
+        self._wrapper.__enter__()
+        if self.perfilar:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        self._inicio = self._marca = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._acumular()
+        self._total = perf_counter() - self._inicio
+        if self._profiler is not None:
+            self._profiler.disable()
+            salida = io.StringIO()
+            pstats.Stats(self._profiler, stream=salida).sort_stats("cumulative").print_stats(LINEAS_PERFIL)
+            self.perfil = salida.getvalue()
+            self._profiler = None
+        self._wrapper.__exit__(*exc)
+        return False
+
+    @contextmanager
+    def fase(self, nombre):
+        self._acumular()
+        self._pila.append(nombre)
+        try:
+            yield
+        finally:
+            self._acumular()
+            self._pila.pop()
+
+    def iterar(self, filas, fase="leer"):
+        """Recorre `filas` cargando a `fase` el tiempo de obtener cada una."""
+        iterador = iter(filas)
+        while True:
+            with self.fase(fase):
+                try:
+                    fila = next(iterador)
+                except StopIteration:
+                    return
+            self.filas += 1
+            yield fila
+
+    def resumen(self):
+        total = self._total or sum(d[0] for d in self._fases.values())
+        fases = []
+        for nombre, etiqueta in FASES.items():
+            if nombre not in self._fases:
+                continue
+            segundos, queries, segundos_bd = self._fases[nombre]
+            fases.append({
+                "fase": nombre,
+                "etiqueta": etiqueta,
+                "segundos": round(segundos, 4),
+                "queries": queries,
+                "segundos_bd": round(segundos_bd, 4),
+                "pct": round(segundos * 100 / total, 1) if total else 0,
+            })
+        return {
+            "segundos": round(total, 4),
+            "filas": self.filas,
+            "filas_por_segundo": round(self.filas / total, 1) if total else None,
+            "queries": sum(d[1] for d in self._fases.values()),
+            "fases": fases,
+        }
+
+    def guardar(self, importacion):
+        """Guarda las métricas en la importación (después del commit)."""
+        importacion.metricas = self.resumen()
+        importacion.perfil = self.perfil
+        Importacion.objects.filter(pk=importacion.pk).update(
+            metricas=importacion.metricas, perfil=importacion.perfil
+        )
+        logger.info(
+            "Importación %s #%s: %s filas en %ss (%s filas/s, %s queries)",
+            importacion.tipo,
+            importacion.pk,
+            importacion.metricas["filas"],
+            importacion.metricas["segundos"],
+            importacion.metricas["filas_por_segundo"],
+            importacion.metricas["queries"],
+        )
@@ -0,0 +1,51 @@
+"""
+Consultas "precio a la fecha" sobre el historial PrecioProducto.
+
+Todas resuelven muchos productos/líneas en un solo query, apoyadas en el índice
+(producto, -vigente_desde, -id).
+"""
+from django.db.models import F, OuterRef, Subquery, Window
+from django.db.models.functions import RowNumber
+
+from .models import PrecioProducto
+
+
+def precio_vigente(campo, producto_ref="producto_id", fecha_ref="venta__fecha"):
+    """
+    Subquery correlacionado con el valor de `campo` vigente para el producto y la
+    fecha del renglón exterior (equivalente a un LATERAL ... LIMIT 1).
+
+        DetalleVenta.objects.annotate(costo=precio_vigente("compra_pzs"))
+    """
+    return Subquery(
+        PrecioProducto.objects.filter(
+            producto_id=OuterRef(producto_ref),
+            vigente_desde__lte=OuterRef(fecha_ref),
+        )
+        .order_by("-vigente_desde", "-id")
+        .values(campo)[:1]
+    )
+
+
+def con_precios_vigentes(detalles, campos=PrecioProducto.CAMPOS_PRECIO):
+    """Anota cada DetalleVenta con `<campo>_vigente` a la fecha de su venta."""
+    return detalles.annotate(**{f"{campo}_vigente": precio_vigente(campo) for campo in campos})
+
+
+def precios_a_fecha(producto_ids, fecha):
+    """
+    {producto_id: PrecioProducto} vigente a `fecha` para todos los productos dados,
+    con una función de ventana (ROW_NUMBER por producto) en un solo query.
+    """
+    qs = (
+        PrecioProducto.objects.filter(producto_id__in=producto_ids, vigente_desde__lte=fecha)
+        .annotate(
+            n=Window(
+                RowNumber(),
+                partition_by=[F("producto_id")],
+                order_by=[F("vigente_desde").desc(), F("id").desc()],
+            )
+        )
+        .filter(n=1)
+    )
+    return {precio.producto_id: precio for precio in qs}
@@ -0,0 +1,185 @@
+"""
+Lectura de las hojas de entregas (relación de remisiones por ruta/mes).
+
+Cada hoja tiene una fila de encabezado con una columna por día ("05/Ene/25" o una
+fecha de Excel); debajo, una fila por cliente (clave, comercio, contacto) y en la
+columna de cada día la celda "Remision 1234" si hubo entrega.
+
+La fila de encabezado se detecta sola (la de más fechas entre las primeras filas).
+Las hojas se leen en paralelo con un pool de procesos: este módulo no importa
+Django para que los procesos hijos arranquen rápido y sin settings.
+"""
+import os
+import re
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import date, datetime
+from multiprocessing import get_all_start_methods, get_context
+from time import perf_counter
+
+from .excel import abrir_libro
+
+MESES = {
+    "ene": 1, "feb": 2, "mar": 3, "abr": 4, "may": 5, "jun": 6,
+    "jul": 7, "ago": 8, "sep": 9, "oct": 10, "nov": 11, "dic": 12,
+    "jan": 1, "apr": 4, "aug": 8, "dec": 12,
+}
+_FECHA = re.compile(r"(\d{1,2})/([A-Za-z]{3})/(\d{2}|\d{4})\b")
+
+# Columnas fijas del formato (base 0): C clave, D comercio, E contacto
+COL_CLAVE, COL_COMERCIO, COL_CONTACTO = 2, 3, 4
+
+# Hasta qué fila buscar el encabezado de fechas
+FILAS_ENCABEZADO = 30
+
+
+def _texto(valor):
+    return str(valor).strip() if valor is not None else ""
+
+
+def fecha_encabezado(valor):
+    """Fecha de una celda del encabezado, o None si no es una columna de día."""
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    if isinstance(valor, str):
+        m = _FECHA.search(valor)
+        if m:
+            dd, mon, yy = m.groups()
+            mes = MESES.get(mon.lower())
+            if mes:
+                try:
+                    return date(int(yy) + (2000 if len(yy) == 2 else 0), mes, int(dd))
+                except ValueError:
+                    return None
+    return None
+
+
+def detectar_encabezado(filas):
+    """
+    Busca entre las primeras FILAS_ENCABEZADO filas la que tiene más columnas con fecha.
+    Regresa (número de fila base 1, {columna base 0: fecha}) o (None, {}).
+    """
+    mejor, columnas = None, {}
+    for numero, fila in enumerate(filas, start=1):
+        if numero > FILAS_ENCABEZADO:
+            break
+        fechas = {}
+        for col, valor in enumerate(fila):
+            fecha = fecha_encabezado(valor)
+            if fecha:
+                fechas[col] = fecha
+        if len(fechas) > len(columnas):
+            mejor, columnas = numero, fechas
+    return mejor, columnas
+
+
+def _folio(valor):
+    if isinstance(valor, str) and "remision" in valor.lower():
+        return valor.replace("Remision", "").replace("remision", "").strip()
+    return ""
+
+
+def leer_hoja(ruta, hoja):
+    """
+    Lee una hoja (corre en un proceso del pool). Regresa un dict con el resumen y
+    `filas`: [(clave, comercio, contacto, [(folio, fecha), ...]), ...].
+    """
+    inicio = perf_counter()
+    wb = abrir_libro(ruta, read_only=True)
+    try:
+        ws = wb[hoja]
+        encabezado, columnas = detectar_encabezado(ws.iter_rows(max_row=FILAS_ENCABEZADO, values_only=True))
+        filas = []
+        if columnas:
+            for fila in ws.iter_rows(min_row=encabezado + 1, values_only=True):
+                clave = _texto(fila[COL_CLAVE]) if len(fila) > COL_CLAVE else ""
+                if not clave:
+                    continue
+                folios = []
+                for col, fecha in columnas.items():
+                    folio = _folio(fila[col]) if col < len(fila) else ""
+                    if folio:
+                        folios.append((folio, fecha))
+                filas.append((
+                    clave,
+                    _texto(fila[COL_COMERCIO]) if len(fila) > COL_COMERCIO else "",
+                    _texto(fila[COL_CONTACTO]) if len(fila) > COL_CONTACTO else "",
+                    folios,
+                ))
+    finally:
+        wb.close()
+    return {
+        "hoja": hoja,
+        "encabezado": encabezado,
+        "dias": len(columnas),
+        "filas": filas,
+        "segundos": round(perf_counter() - inicio, 3),
+    }
+
+
+def hojas_de(ruta):
+    wb = abrir_libro(ruta, read_only=True)
+    try:
+        return list(wb.sheetnames)
+    finally:
+        wb.close()
+
+
+_contexto = None
+
+
+def _contexto_pool():
+    """
+    forkserver con openpyxl precargado: el servidor se levanta una vez por worker web y
+    cada pool después arranca con un fork barato. No se usa fork directo para no heredar
+    conexiones a la BD ni hilos del servidor. Donde no hay forkserver, spawn.
+    """
+    global _contexto
+    if _contexto is None:
+        if "forkserver" in get_all_start_methods():
+            _contexto = get_context("forkserver")
+            _contexto.set_forkserver_preload(["openpyxl", __name__])
+        else:
+            _contexto = get_context("spawn")
+    return _contexto
+
+
+def leer_hojas(tareas, procesos=None):
+    """
+    Lee [(ruta, hoja), ...] y regresa los resultados en el mismo orden.
+    Con más de una hoja usa un pool de procesos; con una sola, o procesos=1, lee en
+    este mismo proceso.
+    """
+    procesos = min(procesos or os.cpu_count() or 1, len(tareas))
+    if procesos <= 1:
+        return [leer_hoja(ruta, hoja) for ruta, hoja in tareas]
+    with ProcessPoolExecutor(max_workers=procesos, mp_context=_contexto_pool()) as pool:
+        return list(pool.map(leer_hoja, *zip(*tareas)))
+
+
+@contextmanager
+def rutas_en_disco(archivos):
+    """
+    Rutas de los archivos subidos para pasarlas a otros procesos. Los que Django ya
+    dejó en disco (TemporaryUploadedFile) se usan tal cual; los que están en memoria
+    se escriben a un temporal que se borra al salir.
+    """
+    rutas, temporales = [], []
+    try:
+        for archivo in archivos:
+            if hasattr(archivo, "temporary_file_path"):
+                rutas.append(archivo.temporary_file_path())
+                continue
+            with tempfile.NamedTemporaryFile(suffix=".xlsx", delete=False) as tmp:
+                archivo.seek(0)
+                for chunk in archivo.chunks():
+                    tmp.write(chunk)
+            temporales.append(tmp.name)
+            rutas.append(tmp.name)
+        yield rutas
+    finally:
+        for ruta in temporales:
+            os.unlink(ruta)
@@ -0,0 +1,308 @@
+"""
+Consultas de reportes. Todo el cálculo (acumulados, subtotales, rankings) se hace en
+SQL; aquí solo se arman los querysets y se paginan.
+"""
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import (
+    Case,
+    Count,
+    DecimalField,
+    ExpressionWrapper,
+    F,
+    Max,
+    Prefetch,
+    Q,
+    Sum,
+    When,
+    Window,
+)
+from django.db.models.functions import Coalesce, TruncMonth
+
+from .archivo import fuentes
+from .models import DetalleVenta, PeriodoCerrado, Venta, VersionCatalogo
+from .precios import precio_vigente
+
+CERO = Decimal("0.00")
+
+
+def _centavos(valor):
+    """Normaliza sumas de la BD (SQLite regresa Decimal sin escala) a 2 decimales."""
+    return (valor or CERO).quantize(CERO)
+
+
+def _ventas_cliente(cliente_id, desde=None, hasta=None, modelo=Venta):
+    """Ventas del cliente en el rango: rango sobre el índice (cliente, fecha, id)."""
+    qs = modelo.objects.filter(cliente_id=cliente_id)
+    if desde:
+        qs = qs.filter(fecha__gte=desde)
+    if hasta:
+        qs = qs.filter(fecha__lte=hasta)
+    return qs
+
+
+def _sumar(filas, clave, campos):
+    """Junta filas de varias tablas con la misma `clave`, sumando `campos`."""
+    juntas = {}
+    for fila in filas:
+        previa = juntas.get(fila[clave])
+        if previa is None:
+            juntas[fila[clave]] = dict(fila)
+        else:
+            for campo in campos:
+                previa[campo] = (previa[campo] or 0) + (fila[campo] or 0)
+    return list(juntas.values())
+
+
+def estado_de_cuenta(cliente_id, desde=None, hasta=None, cursor=None, limite=50):
+    """
+    Estado de cuenta de un cliente, paginado por cursor (fecha, id) ascendente.
+
+    Cada venta trae `acumulado`: saldo antes de `desde` + suma corrida de total
+    (función de ventana). Para que siga siendo correcto en páginas siguientes, la
+    ventana solo corre sobre la página y se le suma lo acumulado antes del cursor
+    (una suma sobre el índice cliente/fecha), así el costo no crece con el historial.
+
+    Los periodos cerrados se leen de las tablas de archivo (sistema.archivo): la página
+    se llena primero con ventas archivadas y luego con las vivas.
+
+    El resumen del periodo (saldo_inicial, meses, top_productos) solo se calcula en la
+    primera página (cursor=None); en las demás viene como None.
+    """
+    tablas = fuentes(desde, hasta)
+
+    saldo_inicial = CERO
+    if desde:
+        for modelo, _ in fuentes(hasta=desde):
+            saldo_inicial += modelo.objects.filter(cliente_id=cliente_id, fecha__lt=desde).aggregate(
+                s=Coalesce(Sum("total"), CERO)
+            )["s"]
+    saldo_inicial = _centavos(saldo_inicial)
+
+    previo = saldo_inicial
+    orden = [F("fecha").asc(), F("id").asc()]
+    ventas = []
+    for modelo, detalle in tablas:
+        if len(ventas) > limite:
+            break
+        rango = _ventas_cliente(cliente_id, desde, hasta, modelo)
+        pagina = rango
+        if cursor:
+            fecha_cursor, id_cursor = cursor
+            despues = Q(fecha__gt=fecha_cursor) | Q(fecha=fecha_cursor, id__gt=id_cursor)
+            pagina = rango.filter(despues)
+            previo += rango.exclude(despues).aggregate(s=Coalesce(Sum("total"), CERO))["s"]
+
+        filas = list(
+            pagina.select_related("remision")
+            .prefetch_related(
+                Prefetch(
+                    "detalles",
+                    queryset=detalle.objects.select_related("producto").order_by("id"),
+                )
+            )
+            .annotate(acumulado_pagina=Window(Sum("total"), order_by=orden))
+            .order_by(*orden)[: limite + 1 - len(ventas)]
+        )
+        for v in filas:
+            v.acumulado = _centavos(previo + v.acumulado_pagina)
+        if filas:
+            previo += filas[-1].acumulado_pagina
+        ventas.extend(filas)
+
+    siguiente = None
+    if len(ventas) > limite:
+        ventas = ventas[:limite]
+        siguiente = (ventas[-1].fecha, ventas[-1].id)
+
+    resultado = {
+        "ventas": ventas,
+        "siguiente": siguiente,
+        "saldo_inicial": None,
+        "total_periodo": None,
+        "meses": None,
+        "top_productos": None,
+    }
+    if cursor:
+        return resultado
+
+    meses = []
+    top_productos = []
+    for modelo, detalle in tablas:
+        rango = _ventas_cliente(cliente_id, desde, hasta, modelo)
+        meses += (
+            rango.annotate(mes=TruncMonth("fecha"))
+            .values("mes")
+            .annotate(ventas=Count("id"), total=Sum("total"))
+            .order_by("mes")
+        )
+        productos = (
+            detalle.objects.filter(venta__in=rango.values("id"))
+            .values("producto_id", "producto__codigo", "producto__descripcion")
+            .annotate(cantidad=Sum("cantidad"), importe=Sum("subtotal"), lineas=Count("id"))
+            .order_by("-importe")
+        )
+        # Con una sola tabla el top sale directo de la BD; con dos hay que juntar antes
+        top_productos += productos[:10] if len(tablas) == 1 else productos
+
+    if len(tablas) > 1:
+        meses = _sumar(meses, "mes", ["ventas", "total"])
+        top_productos = sorted(
+            _sumar(top_productos, "producto_id", ["cantidad", "importe", "lineas"]),
+            key=lambda p: p["importe"] or CERO,
+            reverse=True,
+        )[:10]
+
+    acumulado = saldo_inicial
+    for m in meses:
+        m["total"] = _centavos(m["total"])
+        acumulado += m["total"]
+        m["acumulado"] = acumulado
+
+    for p in top_productos:
+        p["importe"] = _centavos(p["importe"])
+
+    resultado.update(
+        saldo_inicial=saldo_inicial,
+        total_periodo=acumulado - saldo_inicial,
+        meses=meses,
+        top_productos=top_productos,
+    )
+    return resultado
+
+
+# -----------------------------
+# MARGEN BRUTO
+# -----------------------------
+# Dimensiones del reporte de margen: nombre -> campos del GROUP BY
+DIMENSIONES_MARGEN = {
+    "producto": ["producto_id", "producto__codigo", "producto__descripcion"],
+    "cliente": ["venta__cliente_id", "venta__cliente__comercio", "venta__cliente__proveedor"],
+    "venta": ["venta_id", "venta__fecha", "venta__remision__folio", "venta__cliente__comercio"],
+    "mes": ["mes"],
+    "linea": [
+        "id",
+        "venta_id",
+        "venta__fecha",
+        "producto__codigo",
+        "producto__descripcion",
+        "unidad",
+        "cantidad",
+        "precio_unitario",
+    ],
+}
+
+_DINERO = DecimalField(max_digits=18, decimal_places=2)
+
+
+def lineas_con_costo(desde=None, hasta=None, modelo=DetalleVenta):
+    """
+    DetalleVenta (o DetalleVentaArchivada) anotado con costo y margen por línea. El
+    costo unitario es compra_cjs para PAQ y compra_pzs para PZA.
+    """
+    qs = modelo.objects.all()
+    if desde:
+        qs = qs.filter(venta__fecha__gte=desde)
+    if hasta:
+        qs = qs.filter(venta__fecha__lte=hasta)
+
+    # Costo vigente a la fecha de la venta según el historial; si no hay historial para
+    # esa fecha, el precio actual del producto
+    costo_unitario = Case(
+        When(
+            unidad=DetalleVenta.UNIDAD_PAQUETES,
+            then=Coalesce(precio_vigente("compra_cjs"), F("producto__compra_cjs")),
+        ),
+        default=Coalesce(precio_vigente("compra_pzs"), F("producto__compra_pzs")),
+        output_field=_DINERO,
+    )
+    return qs.annotate(
+        costo_linea=ExpressionWrapper(F("cantidad") * costo_unitario, output_field=_DINERO),
+    )
+
+
+def margen(agrupar="producto", desde=None, hasta=None):
+    """
+    Ventas, costo y margen agrupados por `agrupar` (ver DIMENSIONES_MARGEN), todo
+    agregado en la BD. Ordenado por margen descendente (mes: cronológico).
+    Si el rango toca periodos cerrados, se agrega también el archivo y se juntan.
+    """
+    campos = DIMENSIONES_MARGEN[agrupar]
+    tablas = fuentes(desde, hasta)
+    filas = []
+    for _, detalle in tablas:
+        qs = lineas_con_costo(desde, hasta, detalle)
+        if agrupar == "mes":
+            qs = qs.annotate(mes=TruncMonth("venta__fecha"))
+
+        filas += (
+            qs.values(*campos)
+            .annotate(
+                lineas=Count("id"),
+                venta_total=Sum("subtotal"),
+                costo=Sum("costo_linea"),
+            )
+            .annotate(margen=ExpressionWrapper(F("venta_total") - F("costo"), output_field=_DINERO))
+            .order_by("mes" if agrupar == "mes" else "-margen")
+        )
+
+    if len(tablas) > 1:
+        filas = _sumar(
+            [{**fila, "_clave": tuple(fila[c] for c in campos)} for fila in filas],
+            "_clave",
+            ["lineas", "venta_total", "costo"],
+        )
+        for fila in filas:
+            del fila["_clave"]
+
+    for fila in filas:
+        fila["venta_total"] = _centavos(fila["venta_total"])
+        fila["costo"] = _centavos(fila["costo"])
+        fila["margen"] = fila["venta_total"] - fila["costo"]
+        fila["margen_pct"] = (
+            (fila["margen"] * 100 / fila["venta_total"]).quantize(Decimal("0.1"))
+            if fila["venta_total"]
+            else None
+        )
+    if len(tablas) > 1:
+        if agrupar == "mes":
+            filas.sort(key=lambda fila: fila["mes"])
+        else:
+            filas.sort(key=lambda fila: fila["margen"], reverse=True)
+    return filas
+
+
+def _marca_ventas(desde=None, hasta=None):
+    """Cambia cada vez que se agrega, borra o guarda una venta viva del rango."""
+    qs = Venta.objects.all()
+    if desde:
+        qs = qs.filter(fecha__gte=desde)
+    if hasta:
+        qs = qs.filter(fecha__lte=hasta)
+    marca = qs.aggregate(n=Count("id"), ultima=Max("updated_at"))
+    return f"{marca['n']}:{marca['ultima'].timestamp() if marca['ultima'] else ''}"
+
+
+def margen_cacheado(agrupar="producto", desde=None, hasta=None):
+    """
+    margen() con cache por periodo. Un rango que termina antes del corte de periodos
+    cerrados ya no cambia y se guarda un día. Si toca ventas vivas, la llave lleva la
+    marca de esas ventas y la versión del catálogo (costos): guardar una venta o cambiar
+    precios da otra llave; y dura unos minutos nada más, porque una línea editada desde
+    el admin no toca su venta. "linea" no se guarda: es una fila por línea vendida.
+    """
+    if agrupar == "linea":
+        return margen(agrupar, desde, hasta)
+
+    clave = f"margen:{agrupar}:{desde or ''}:{hasta or ''}"
+    corte = PeriodoCerrado.corte()
+    cerrado = hasta is not None and corte is not None and hasta < corte
+    if not cerrado:
+        clave += f":{_marca_ventas(desde, hasta)}:{VersionCatalogo.actual()}"
+
+    filas = cache.get(clave)
+    if filas is None:
+        filas = margen(agrupar, desde, hasta)
+        cache.set(clave, filas, timeout=60 * 60 * 24 if cerrado else 60 * 5)
+    return filas
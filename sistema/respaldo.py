@@ -0,0 +1,225 @@
+"""
+Respaldo / migración de datos de ventas en CSV comprimido por bloques.
+
+Formato (una carpeta):
+    manifest.json                    columnas, filas y sha256 de cada bloque
+    sistema_cliente.0001.csv.gz      encabezado + filas; NULL se escribe como \\N
+    ...
+
+- Exportar lee con iterator() (cursor del lado del servidor en PostgreSQL) y escribe
+  bloques de N filas: la memoria no depende del tamaño de las tablas.
+- Restaurar carga en orden de dependencias dentro de una transacción, con los índices
+  secundarios borrados y recreados al final; en PostgreSQL usa COPY, en SQLite
+  executemany por lotes.
+
+gzip viene con Python; zstd se usa si está instalado el paquete `zstandard`.
+"""
+import gzip
+import hashlib
+import io
+
+from django.core.management.color import no_style
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+
+from .models import (
+    ClaveCliente,
+    Cliente,
+    DetalleVenta,
+    DetalleVentaArchivada,
+    PeriodoCerrado,
+    Producto,
+    Remision,
+    Venta,
+    VentaArchivada,
+)
+
+# En orden de dependencias (restaurar en este orden, vaciar al revés)
+MODELOS = [
+    Cliente, ClaveCliente, Producto, Remision, Venta, DetalleVenta,
+    PeriodoCerrado, VentaArchivada, DetalleVentaArchivada,
+]
+NULO = "\\N"
+VERSION_FORMATO = 1
+EXTENSIONES = {"gzip": ".csv.gz", "zstd": ".csv.zst"}
+
+
+def columnas(modelo):
+    return [campo.column for campo in modelo._meta.concrete_fields]
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError("Para zstd instala el paquete 'zstandard' (pip install zstandard).")
+    return zstandard
+
+
+def abrir_escritura(ruta, compresion):
+    """Archivo de texto comprimido para csv.writer."""
+    if compresion == "gzip":
+        return gzip.open(ruta, "wt", encoding="utf-8", newline="", compresslevel=6)
+    binario = _zstandard().ZstdCompressor(level=3).stream_writer(open(ruta, "wb"), closefd=True)
+    return io.TextIOWrapper(binario, encoding="utf-8", newline="")
+
+
+def abrir_lectura(ruta, compresion):
+    if compresion == "gzip":
+        return gzip.open(ruta, "rt", encoding="utf-8", newline="")
+    binario = _zstandard().ZstdDecompressor().stream_reader(open(ruta, "rb"), closefd=True)
+    return io.TextIOWrapper(binario, encoding="utf-8", newline="")
+
+
+def sha256_archivo(ruta):
+    h = hashlib.sha256()
+    with open(ruta, "rb") as f:
+        for bloque in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+# -----------------------------
+# ÍNDICES DIFERIDOS
+# -----------------------------
+def quitar_indices(tabla):
+    """
+    Borra los índices secundarios de la tabla y regresa el SQL para recrearlos.
+    No toca la llave primaria ni los índices que respaldan constraints.
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute(
+                """
+                SELECT indexname, indexdef FROM pg_indexes
+                WHERE schemaname = current_schema() AND tablename = %s
+                  AND indexname NOT IN (
+                      SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass
+                  )
+                """,
+                [tabla, tabla],
+            )
+        elif connection.vendor == "sqlite":
+            # sql IS NULL: índices automáticos de PRIMARY KEY / UNIQUE en línea
+            cursor.execute(
+                "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = %s AND sql IS NOT NULL",
+                [tabla],
+            )
+        else:
+            return []
+        indices = cursor.fetchall()
+        for nombre, _ in indices:
+            cursor.execute(f"DROP INDEX {connection.ops.quote_name(nombre)}")
+    return [sql for _, sql in indices]
+
+
+def recrear_indices(sentencias):
+    with connection.cursor() as cursor:
+        for sql in sentencias:
+            cursor.execute(sql)
+
+
+# Tablas de archivo con el mismo id que su tabla viva: la secuencia de la viva tiene que
+# quedar arriba de las dos (una venta archivada puede tener un id mayor que todas las
+# vivas, p. ej. la de una remisión vieja capturada tarde)
+ARCHIVO_DE = {Venta: VentaArchivada, DetalleVenta: DetalleVentaArchivada}
+
+
+def reiniciar_secuencias(modelos):
+    """Después de insertar ids explícitos (PostgreSQL: setval; SQLite: sqlite_sequence)."""
+    sentencias = connection.ops.sequence_reset_sql(no_style(), modelos)
+    q = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        for sql in sentencias:
+            cursor.execute(sql)
+
+        for viva, archivo in ARCHIVO_DE.items():
+            if viva not in modelos and archivo not in modelos:
+                continue
+            tabla, columna = viva._meta.db_table, viva._meta.pk.column
+            cursor.execute(
+                f"SELECT MAX(m) FROM (SELECT MAX({q(columna)}) AS m FROM {q(tabla)} "
+                f"UNION ALL SELECT MAX({q(archivo._meta.pk.column)}) FROM {q(archivo._meta.db_table)}) t"
+            )
+            maximo = cursor.fetchone()[0]
+            if maximo is None:
+                continue
+            if connection.vendor == "postgresql":
+                cursor.execute("SELECT setval(pg_get_serial_sequence(%s, %s), %s)", [q(tabla), columna, maximo])
+            elif connection.vendor == "sqlite":
+                cursor.execute("UPDATE sqlite_sequence SET seq = MAX(seq, %s) WHERE name = %s", [maximo, tabla])
+                if not cursor.rowcount:
+                    cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)", [tabla, maximo])
+
+
+# -----------------------------
+# CARGA
+# -----------------------------
+def copiar_postgres(tabla, cols, archivo):
+    """COPY ... FROM STDIN del CSV (psycopg2 o psycopg 3)."""
+    q = connection.ops.quote_name
+    sql = (
+        f"COPY {q(tabla)} ({', '.join(q(c) for c in cols)}) "
+        f"FROM STDIN WITH (FORMAT csv, HEADER true, NULL '{NULO}')"
+    )
+    with connection.cursor() as cursor:
+        crudo = cursor.cursor
+        if hasattr(crudo, "copy_expert"):
+            crudo.copy_expert(sql, archivo, size=1024 * 1024)
+        else:
+            with crudo.copy(sql) as copia:
+                for bloque in iter(lambda: archivo.read(1024 * 1024), ""):
+                    copia.write(bloque)
+
+
+_ENTEROS = {
+    "AutoField", "BigAutoField", "SmallAutoField", "IntegerField", "BigIntegerField",
+    "SmallIntegerField", "PositiveIntegerField", "PositiveBigIntegerField", "PositiveSmallIntegerField",
+}
+_TEXTO = {"CharField", "TextField", "FileField", "SlugField", "EmailField"}
+
+
+def _sin_nulo(funcion):
+    def convertir(valor):
+        return None if valor == NULO else funcion(valor)
+    return convertir
+
+
+def convertidores(modelo, cols):
+    """Texto del CSV -> valor listo para la BD, por columna."""
+    # El wrapper real, no el proxy `connection` (que resuelve el hilo en cada acceso)
+    conexion = connections[DEFAULT_DB_ALIAS]
+    por_columna = {campo.column: campo for campo in modelo._meta.concrete_fields}
+    funciones = []
+    for col in cols:
+        campo = por_columna[col]
+        tipo = campo.target_field.get_internal_type() if campo.is_relation else campo.get_internal_type()
+        if tipo in _ENTEROS:
+            funciones.append(_sin_nulo(int))
+        elif tipo in _TEXTO:
+            funciones.append(_sin_nulo(str))
+        else:
+            funciones.append(_sin_nulo(lambda valor, campo=campo: campo.get_db_prep_save(campo.to_python(valor), conexion)))
+    return funciones
+
+
+def insertar_lotes(modelo, cols, filas, lote=5000):
+    """INSERT con executemany por lotes (SQLite y otros backends sin COPY)."""
+    q = connection.ops.quote_name
+    sql = (
+        f"INSERT INTO {q(modelo._meta.db_table)} ({', '.join(q(c) for c in cols)}) "
+        f"VALUES ({', '.join(['%s'] * len(cols))})"
+    )
+    funciones = convertidores(modelo, cols)
+    total = 0
+    with connection.cursor() as cursor:
+        pendientes = []
+        for fila in filas:
+            pendientes.append([f(v) for f, v in zip(funciones, fila)])
+            if len(pendientes) >= lote:
+                cursor.executemany(sql, pendientes)
+                total += len(pendientes)
+                pendientes = []
+        if pendientes:
+            cursor.executemany(sql, pendientes)
+            total += len(pendientes)
+    return total
@@ -0,0 +1,297 @@
+"""
+Clientes parecidos: índice de claves de bloqueo + similitud por trigramas.
+
+La hoja de remisiones crea un Cliente por cada clave que no coincide exacta con
+`proveedor`, así que un typo o un espacio de más deja un duplicado. Comparar cada
+fila contra todos los clientes es N × M; en lugar de eso:
+
+- normalizar(): minúsculas, sin acentos ni puntuación, espacios colapsados.
+- Claves de bloqueo (tabla ClaveCliente, con índice):
+      c:<clave>       el proveedor normalizado y sin espacios ("C-101 " -> "c:c101")
+      p:<abcd>.<efgh> primeras 4 letras de cada par de palabras seguidas del comercio
+      s:<abcd>.<efgh> últimas 4 de cada par (un typo al inicio no saca al par del bloque)
+  Van por pares porque los nombres se arman con palabras comunes ("abarrotes",
+  "la esperanza", apellidos): una palabra sola junta a miles de clientes, un par ya
+  no. Un comercio de una sola palabra usa esa palabra.
+  Solo se comparan una fila y un cliente que comparten alguna clave. Las claves de
+  más de MAX_BLOQUE clientes no separan nada y se ignoran (las "c:" siempre cuentan).
+- similitud(): |A ∩ B| / |A ∪ B| de los trigramas del nombre normalizado. El contacto
+  no entra a las claves (nombres y apellidos se repiten demasiado), solo al puntaje.
+
+Las claves se regeneran al crear o editar clientes (indexar_clientes); después de
+restaurar un respaldo, `manage.py indexar_clientes`.
+"""
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count
+
+from .models import ClaveCliente, Cliente, DuplicadoCliente, PedidoHabitual, Remision, Venta, VentaArchivada
+
+# Similitud mínima para marcar un posible duplicado y cuántos candidatos por cliente
+UMBRAL = 0.6
+LIMITE = 3
+
+# Una clave de bloqueo compartida por más clientes que esto no se usa para buscar
+MAX_BLOQUE = 200
+
+# Palabras de 3+ letras que no distinguen a un cliente de otro
+VACIAS = {"del", "las", "los", "con", "por", "para"}
+
+_NO_ALFANUMERICO = re.compile(r"[^0-9a-z]+")
+
+
+def en_bloques(valores, tamano=500):
+    """Listas de a lo más `tamano` valores, para no armar un IN (...) enorme."""
+    valores = list(valores)
+    for i in range(0, len(valores), tamano):
+        yield valores[i:i + tamano]
+
+
+def normalizar(texto):
+    """'Abarrotes  "La Güera"' -> 'abarrotes la guera'."""
+    if not texto:
+        return ""
+    ascii_ = unicodedata.normalize("NFKD", texto.casefold()).encode("ascii", "ignore").decode("ascii")
+    return " ".join(_NO_ALFANUMERICO.sub(" ", ascii_).split())
+
+
+def normalizar_clave(proveedor):
+    """Clave de cliente sin espacios ni puntuación: 'C-10 1' -> 'c101'."""
+    return normalizar(proveedor).replace(" ", "")
+
+
+def palabras(texto):
+    return [p for p in normalizar(texto).split() if len(p) >= 3 and p not in VACIAS]
+
+
+def _clave_c(proveedor):
+    clave = normalizar_clave(proveedor)
+    return f"c:{clave}"[:64] if clave else None
+
+
+def pares_bloqueo(comercio):
+    """[(clave p:, clave s:), ...] por cada par de palabras seguidas del comercio."""
+    lista = palabras(comercio)
+    pares = zip(lista, lista[1:]) if len(lista) > 1 else [(p, "") for p in lista]
+    return [(f"p:{a[:4]}.{b[:4]}", f"s:{a[-4:]}.{b[-4:]}") for a, b in pares]
+
+
+def claves_bloqueo(proveedor, comercio):
+    claves = {clave for par in pares_bloqueo(comercio) for clave in par}
+    clave = _clave_c(proveedor)
+    if clave:
+        claves.add(clave)
+    return claves
+
+
+def trigramas(texto):
+    texto = normalizar(texto)
+    if not texto:
+        return frozenset()
+    relleno = f"  {texto} "
+    return frozenset({relleno[i:i + 3] for i in range(len(relleno) - 2)})
+
+
+def similitud(a, b):
+    """Entre dos conjuntos de trigramas (0 si alguno está vacío)."""
+    if not a or not b:
+        return 0.0
+    comunes = len(a & b)
+    return comunes / (len(a) + len(b) - comunes)
+
+
+# -----------------------------
+# ÍNDICE
+# -----------------------------
+def _claves_de(clientes):
+    return [
+        ClaveCliente(cliente_id=pk, clave=clave)
+        for pk, proveedor, comercio in clientes
+        for clave in claves_bloqueo(proveedor, comercio)
+    ]
+
+
+def indexar_clientes(clientes):
+    """Regenera las claves de los clientes dados (ya guardados). Conserva los alias."""
+    clientes = [(c.pk, c.proveedor, c.comercio) for c in clientes]
+    for bloque in en_bloques(clientes):
+        ClaveCliente.objects.filter(cliente_id__in=[c[0] for c in bloque], alias=False).delete()
+        ClaveCliente.objects.bulk_create(_claves_de(bloque), batch_size=1000)
+
+
+def reconstruir_indice(lote=2000):
+    """Claves de todos los clientes desde cero (los alias de fusiones se quedan)."""
+    with transaction.atomic():
+        ClaveCliente.objects.filter(alias=False).delete()
+        filas = Cliente.objects.order_by().values_list("pk", "proveedor", "comercio")
+        pendientes = []
+        for fila in filas.iterator(chunk_size=lote):
+            pendientes.append(fila)
+            if len(pendientes) >= lote:
+                ClaveCliente.objects.bulk_create(_claves_de(pendientes), batch_size=lote)
+                pendientes = []
+        ClaveCliente.objects.bulk_create(_claves_de(pendientes), batch_size=lote)
+    return ClaveCliente.objects.count()
+
+
+def resolver_claves(claves):
+    """
+    {clave: cliente_id} para claves de la hoja que no coinciden exacto con ningún
+    proveedor pero sí normalizadas ("C 101" = "C101") o por alias de una fusión.
+    Si varias apuntan a clientes distintos gana el más antiguo.
+    """
+    por_normalizada = defaultdict(list)
+    for clave in claves:
+        normalizada = normalizar_clave(clave)
+        if normalizada:
+            por_normalizada[f"c:{normalizada}"[:64]].append(clave)
+
+    salida = {}
+    for bloque in en_bloques(por_normalizada):
+        filas = ClaveCliente.objects.filter(clave__in=bloque).order_by("cliente_id").values_list("clave", "cliente_id")
+        for normalizada, cliente_id in filas:
+            for clave in por_normalizada[normalizada]:
+                salida.setdefault(clave, cliente_id)
+    return salida
+
+
+# -----------------------------
+# BÚSQUEDA
+# -----------------------------
+def buscar_parecidos(filas, umbral=UMBRAL, limite=LIMITE):
+    """
+    filas: [(id o None, proveedor, comercio, contacto), ...]. Regresa, alineado con
+    filas, [(cliente_id, similitud), ...] de mayor a menor (sin el propio id).
+    Queries por bloques de claves, no por fila.
+
+    Un candidato tiene que compartir con la fila al menos dos pares de palabras (uno si
+    la fila solo tiene uno en el índice): un typo rompe a lo más los dos pares de su
+    palabra y deja los demás. La similitud se calcula solo para esos candidatos; el
+    puntaje pesa 2 a 1 el comercio sobre el contacto, si ambos lo tienen.
+    """
+    filas = list(filas)
+    claves_c = [_clave_c(proveedor) for _, proveedor, _, _ in filas]
+    pares_fila = [pares_bloqueo(comercio) for _, _, comercio, _ in filas]
+    todas = {clave for clave in claves_c if clave}
+    todas.update(clave for pares in pares_fila for par in pares for clave in par)
+
+    utiles = set()
+    for bloque in en_bloques(todas):
+        conteos = (
+            ClaveCliente.objects.filter(clave__in=bloque)
+            .order_by()
+            .values_list("clave")
+            .annotate(n=Count("id"))
+        )
+        utiles.update(clave for clave, n in conteos if n <= MAX_BLOQUE or clave.startswith("c:"))
+
+    por_clave = defaultdict(set)
+    for bloque in en_bloques(utiles):
+        for clave, cliente_id in ClaveCliente.objects.filter(clave__in=bloque).values_list("clave", "cliente_id"):
+            por_clave[clave].add(cliente_id)
+
+    vacio = frozenset()
+    seleccion = []
+    for (pk, *_), clave_c, pares in zip(filas, claves_c, pares_fila):
+        # Misma clave escrita distinto: duplicado aunque cambie el nombre
+        iguales = por_clave.get(clave_c, vacio) - {pk}
+        disponibles = [(p, s) for p, s in pares if p in utiles or s in utiles]
+        compartidos = Counter()
+        for p, s in disponibles:
+            compartidos.update(por_clave.get(p, vacio) | por_clave.get(s, vacio))
+        minimo = min(2, len(disponibles))
+        candidatos = {cliente_id for cliente_id, n in compartidos.items() if n >= minimo} - iguales - {pk}
+        seleccion.append((iguales, candidatos))
+
+    textos = {}
+    for bloque in en_bloques(set().union(*(candidatos for _, candidatos in seleccion))):
+        for pk, comercio, contacto in Cliente.objects.filter(pk__in=bloque).values_list("pk", "comercio", "contacto"):
+            textos[pk] = (comercio, contacto)
+
+    # Trigramas de cada candidato una sola vez; los del contacto solo si hacen falta
+    comercios, contactos = {}, {}
+    resultado = []
+    for (_, _, comercio, contacto), (iguales, candidatos) in zip(filas, seleccion):
+        puntajes = dict.fromkeys(iguales, 1.0)
+        comercio, contacto = trigramas(comercio), trigramas(contacto)
+        for cliente_id in candidatos:
+            if cliente_id not in comercios:
+                comercios[cliente_id] = trigramas(textos[cliente_id][0])
+            puntaje = similitud(comercio, comercios[cliente_id])
+            if contacto and textos[cliente_id][1] and (2 * puntaje + 1) / 3 >= umbral:
+                if cliente_id not in contactos:
+                    contactos[cliente_id] = trigramas(textos[cliente_id][1])
+                if contactos[cliente_id]:
+                    puntaje = (2 * puntaje + similitud(contacto, contactos[cliente_id])) / 3
+            if puntaje >= umbral:
+                puntajes[cliente_id] = puntaje
+        mejores = sorted(puntajes.items(), key=lambda par: (-par[1], par[0]))
+        resultado.append([(cliente_id, round(p, 3)) for cliente_id, p in mejores[:limite]])
+    return resultado
+
+
+def marcar_duplicados(clientes, importacion=None):
+    """
+    Guarda DuplicadoCliente para los clientes recién creados que se parecen a otro más
+    antiguo (id menor: así un par nuevo-nuevo se marca una sola vez).
+    """
+    clientes = list(clientes)
+    if not clientes:
+        return []
+    parecidos = buscar_parecidos((c.pk, c.proveedor, c.comercio, c.contacto) for c in clientes)
+    duplicados = [
+        DuplicadoCliente(
+            cliente=cliente,
+            candidato_id=candidato_id,
+            similitud=Decimal(f"{puntaje:.3f}"),
+            importacion=importacion,
+        )
+        for cliente, candidatos in zip(clientes, parecidos)
+        for candidato_id, puntaje in candidatos
+        if candidato_id < cliente.pk
+    ]
+    DuplicadoCliente.objects.bulk_create(duplicados, batch_size=1000, ignore_conflicts=True)
+    return duplicados
+
+
+# -----------------------------
+# FUSIÓN
+# -----------------------------
+@transaction.atomic
+def fusionar_clientes(destino, origenes):
+    """
+    Pasa remisiones y ventas (vivas y archivadas) de `origenes` a `destino` con un
+    UPDATE por tabla y borra los orígenes. Sus claves "c:" quedan como alias del
+    destino para que la siguiente hoja con la clave vieja caiga en él.
+    Lanza ValueError si un folio existe en más de uno (la remisión está repetida).
+    Regresa cuántas remisiones se movieron.
+    """
+    ids = [c.pk for c in origenes if c.pk != destino.pk]
+    if not ids:
+        return 0
+
+    repetidos = [
+        fila["folio"]
+        for fila in Remision.objects.filter(cliente_id__in=[destino.pk, *ids])
+        .order_by()
+        .values("folio")
+        .annotate(n=Count("id"))
+        .filter(n__gt=1)[:10]
+    ]
+    if repetidos:
+        raise ValueError(
+            f"No se pueden fusionar en {destino}: folios en más de un cliente ({', '.join(repetidos)})."
+        )
+
+    remisiones = Remision.objects.filter(cliente_id__in=ids).update(cliente_id=destino.pk)
+    Venta.objects.filter(cliente_id__in=ids).update(cliente_id=destino.pk)
+    VentaArchivada.objects.filter(cliente_id__in=ids).update(cliente_id=destino.pk)
+    ClaveCliente.objects.filter(cliente_id__in=ids, clave__startswith="c:").update(cliente_id=destino.pk, alias=True)
+    # El pedido habitual del destino ahora incluye las ventas de los fusionados
+    PedidoHabitual.objects.filter(cliente_id=destino.pk).update(vigente=False)
+    Cliente.objects.filter(pk__in=ids).delete()
+    return remisiones
@@ -0,0 +1,135 @@
+"""
+Pedido habitual por cliente: los productos que pide casi siempre, con su cantidad y
+unidad típicas, para llenar una venta nueva con un clic en lugar de capturar línea
+por línea.
+
+- Se calcula de las últimas VENTANA ventas del cliente que tienen líneas. Entra cada
+  (producto, unidad) que aparece en al menos MIN_VECES de ellas (todas, si el cliente
+  tiene una sola venta); la cantidad es la más repetida (empate: la más reciente).
+- Guardar líneas de una venta solo marca el pedido de su cliente como no vigente (un
+  UPDATE de un renglón); se recalcula, para ese cliente nada más, la siguiente vez que
+  se pide. `manage.py calcular_pedidos_habituales` los calcula todos por bloques.
+- Solo mira ventas vivas: las de periodos cerrados ya quedaron fuera de la ventana.
+"""
+from collections import Counter, defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, F, OuterRef, Window
+from django.db.models.functions import RowNumber
+
+from .models import Cliente, DetalleVenta, LineaHabitual, PedidoHabitual, Producto, Venta
+
+VENTANA = 8
+MIN_VECES = 2
+
+
+def _cantidad_tipica(apariciones):
+    """apariciones: [(fecha, venta_id, cantidad), ...]"""
+    conteo = Counter(cantidad for _, _, cantidad in apariciones)
+    ultima = {}
+    for fecha, venta_id, cantidad in apariciones:
+        ultima[cantidad] = max(ultima.get(cantidad, (fecha, venta_id)), (fecha, venta_id))
+    return max(conteo, key=lambda cantidad: (conteo[cantidad], ultima[cantidad]))
+
+
+def actualizar_pedidos(cliente_ids):
+    """
+    Recalcula el pedido habitual de los clientes dados (de una vez: dos lecturas y tres
+    escrituras sin importar cuántos sean). Regresa cuántas líneas quedaron.
+    """
+    cliente_ids = list(cliente_ids)
+    ventas = (
+        Venta.objects.filter(cliente_id__in=cliente_ids)
+        .filter(Exists(DetalleVenta.objects.filter(venta_id=OuterRef("pk"))))
+        .annotate(
+            n=Window(
+                RowNumber(),
+                partition_by=[F("cliente_id")],
+                order_by=[F("fecha").desc(), F("id").desc()],
+            )
+        )
+        .filter(n__lte=VENTANA)
+        .values_list("id", "cliente_id", "fecha")
+    )
+    venta_de = {venta_id: (cliente_id, fecha) for venta_id, cliente_id, fecha in ventas}
+    ventas_por_cliente = Counter(cliente_id for cliente_id, _ in venta_de.values())
+
+    apariciones = defaultdict(lambda: defaultdict(list))
+    for venta_id, producto_id, unidad, cantidad in DetalleVenta.objects.filter(venta_id__in=venta_de).values_list(
+        "venta_id", "producto_id", "unidad", "cantidad"
+    ):
+        cliente_id, fecha = venta_de[venta_id]
+        apariciones[cliente_id][(producto_id, unidad)].append((fecha, venta_id, cantidad))
+
+    with transaction.atomic():
+        # Dos recálculos del mismo cliente a la vez: el segundo espera aquí al primero y
+        # luego borra lo que éste escribió (sin el candado chocaría con el OneToOne)
+        list(Cliente.objects.select_for_update().filter(pk__in=cliente_ids).order_by("pk").values_list("pk"))
+        PedidoHabitual.objects.filter(cliente_id__in=cliente_ids).delete()
+        pedidos = PedidoHabitual.objects.bulk_create(
+            [PedidoHabitual(cliente_id=cliente_id, ventas=ventas_por_cliente[cliente_id]) for cliente_id in cliente_ids]
+        )
+        lineas = []
+        for pedido in pedidos:
+            minimo = min(MIN_VECES, pedido.ventas)
+            for (producto_id, unidad), vistas in apariciones[pedido.cliente_id].items():
+                if len(vistas) < minimo:
+                    continue
+                lineas.append(LineaHabitual(
+                    pedido=pedido,
+                    producto_id=producto_id,
+                    unidad=unidad,
+                    cantidad=_cantidad_tipica(vistas),
+                    veces=len(vistas),
+                    ultima_fecha=max(fecha for fecha, _, _ in vistas),
+                ))
+        LineaHabitual.objects.bulk_create(lineas, batch_size=1000)
+    return len(lineas)
+
+
+def marcar_desactualizados(cliente_ids):
+    """Después de guardar líneas de ventas de estos clientes."""
+    PedidoHabitual.objects.filter(cliente_id__in=list(cliente_ids), vigente=True).update(vigente=False)
+
+
+def pedido_habitual(cliente_id):
+    """(PedidoHabitual, [LineaHabitual con producto]) vigente; lo recalcula si hace falta."""
+    pedido = PedidoHabitual.objects.filter(cliente_id=cliente_id).first()
+    if pedido is None or not pedido.vigente:
+        try:
+            actualizar_pedidos([cliente_id])
+        except IntegrityError:
+            # Otra petición lo acaba de recalcular (backends sin SELECT ... FOR UPDATE)
+            pass
+        pedido = PedidoHabitual.objects.get(cliente_id=cliente_id)
+    return pedido, list(pedido.lineas.select_related("producto"))
+
+
+def detalles_para_venta(venta, elegidas):
+    """
+    DetalleVenta sin guardar (listos para un bulk_create) con las líneas elegidas del
+    pedido habitual, al precio de lista del producto según la unidad. elegidas:
+    {(producto_id, unidad): cantidad}, tal como vienen del formulario, para no depender de
+    los ids de LineaHabitual (cambian cada vez que se recalcula). Se saltan los
+    (producto, unidad) que la venta ya tiene.
+    """
+    unidades = {valor for valor, _ in DetalleVenta.UNIDAD_CHOICES}
+    ya_tiene = set(DetalleVenta.objects.filter(venta_id=venta.pk).values_list("producto_id", "unidad"))
+    productos = Producto.objects.in_bulk({producto_id for producto_id, _ in elegidas})
+    detalles = []
+    for (producto_id, unidad), cantidad in elegidas.items():
+        producto = productos.get(producto_id)
+        if producto is None or unidad not in unidades or (producto_id, unidad) in ya_tiene:
+            continue
+        precio = producto.venta_cjs if unidad == DetalleVenta.UNIDAD_PAQUETES else producto.venta_pzs
+        detalles.append(DetalleVenta(
+            venta=venta,
+            producto=producto,
+            unidad=unidad,
+            cantidad=cantidad,
+            precio_unitario=precio,
+            # bulk_create no llama save(): el subtotal se calcula aquí igual que ahí
+            subtotal=(cantidad * precio).quantize(Decimal("0.01")),
+        ))
+    return detalles
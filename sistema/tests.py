@@ -1,3 +1,942 @@
-from django.test import TestCase
+import asyncio
+import functools
+import io
+import itertools
+import os
+import tempfile
+from datetime import date, datetime
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection, router
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from . import catalogo
+from .archivo import cerrar_periodo
+from .excel import libro_nuevo
+from .inventario import (
+    existencias_actuales,
+    registrar_cambio_linea,
+    registrar_entrada,
+    registrar_salidas_venta,
+    tomar_corte,
+)
+from .catalogo import obtener_catalogo
+from .lectura import (
+    COOKIE_PRIMARIA,
+    LecturaPegajosaMiddleware,
+    RouterLectura,
+    solo_lectura,
+    vista_de_lectura,
+)
+from .precios import con_precios_vigentes, precios_a_fecha
+from .reportes import estado_de_cuenta, margen_cacheado
+from .media import HashStorage
+from .perfilado import PerfilImportacion
+from .remisiones_excel import detectar_encabezado, fecha_encabezado, leer_hojas
+from .respaldo import MODELOS, reiniciar_secuencias
+from .similitud import buscar_parecidos, fusionar_clientes, indexar_clientes, marcar_duplicados, resolver_claves
+from .sugerencias import marcar_desactualizados, pedido_habitual
+from .models import (
+    ClaveCliente,
+    Cliente,
+    CorteInventario,
+    DuplicadoCliente,
+    Importacion,
+    DetalleVenta,
+    PrecioProducto,
+    Producto,
+    Remision,
+    Venta,
+    VentaArchivada,
+    VersionCatalogo,
+)
+
+
+def _venta(folio="R-1", cliente=None, fecha=date(2026, 1, 5)):
+    cliente = cliente or Cliente.objects.create(numero=1, proveedor="P1", comercio="Tienda 1")
+    remision = Remision.objects.create(folio=folio, cliente=cliente, fecha=fecha)
+    return Venta.objects.create(remision=remision, fecha=fecha)
+
+
+def _libro(nombre="libro.xlsx", **hojas):
+    """Libro de Excel subido con una hoja por argumento: hoja=[fila, ...]."""
+    wb = libro_nuevo()
+    wb.remove(wb.active)
+    for hoja, filas in hojas.items():
+        ws = wb.create_sheet(hoja)
+        for fila in filas:
+            ws.append(fila)
+    contenido = io.BytesIO()
+    wb.save(contenido)
+    return SimpleUploadedFile(nombre, contenido.getvalue())
+
+
+def _base_de_lectura():
+    return Venta.objects.all().db
+
+
+@vista_de_lectura
+def _vista(request):
+    return HttpResponse(_base_de_lectura())
+
+
+@vista_de_lectura
+def _vista_que_escribe(request):
+    antes = _base_de_lectura()
+    router.db_for_write(Venta)
+    return HttpResponse(f"{antes},{_base_de_lectura()}")
+
+
+@vista_de_lectura
+def _vista_streaming(request):
+    return StreamingHttpResponse(_base_de_lectura() for _ in range(2))
+
+
+@vista_de_lectura
+async def _vista_async(request):
+    return HttpResponse(await sync_to_async(_base_de_lectura)())
+
+
+@override_settings(LECTURA_DB="lectura", LECTURA_PEGAJOSA=10)
+class RouterLecturaTests(SimpleTestCase):
+    def test_solo_lee_de_la_replica_dentro_de_solo_lectura(self):
+        self.assertEqual(_base_de_lectura(), "default")
+        with solo_lectura():
+            self.assertEqual(_base_de_lectura(), "lectura")
+            self.assertEqual(Venta.objects.select_for_update().db, "default")
+        self.assertEqual(_base_de_lectura(), "default")
+
+    def test_escrituras_siempre_a_default(self):
+        with solo_lectura():
+            self.assertEqual(router.db_for_write(Venta), "default")
+
+    def test_despues_de_escribir_lee_de_default(self):
+        with solo_lectura():
+            router.db_for_write(Venta)
+            self.assertEqual(_base_de_lectura(), "default")
+        # Un bloque nuevo (fuera de una petición) empieza limpio
+        with solo_lectura():
+            self.assertEqual(_base_de_lectura(), "lectura")
+
+    def test_no_migra_la_replica(self):
+        self.assertIs(RouterLectura().allow_migrate("lectura", "sistema"), False)
+        self.assertIsNone(RouterLectura().allow_migrate("default", "sistema"))
+
+    @override_settings(LECTURA_DB=None)
+    def test_sin_replica_todo_va_a_default(self):
+        with solo_lectura():
+            self.assertEqual(_base_de_lectura(), "default")
+
+
+@override_settings(LECTURA_DB="lectura", LECTURA_PEGAJOSA=10)
+class LecturaPegajosaTests(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def _pedir(self, vista, request):
+        return LecturaPegajosaMiddleware(vista)(request)
+
+    def test_get_lee_de_la_replica_y_no_deja_cookie(self):
+        response = self._pedir(_vista, self.factory.get("/"))
+        self.assertEqual(response.content, b"lectura")
+        self.assertNotIn(COOKIE_PRIMARIA, response.cookies)
+
+    def test_post_lee_de_default_y_deja_cookie(self):
+        response = self._pedir(_vista, self.factory.post("/"))
+        self.assertEqual(response.content, b"default")
+        self.assertEqual(response.cookies[COOKIE_PRIMARIA]["max-age"], 10)
+
+    def test_con_cookie_lee_de_default(self):
+        request = self.factory.get("/")
+        request.COOKIES[COOKIE_PRIMARIA] = "1"
+        self.assertEqual(self._pedir(_vista, request).content, b"default")
+
+    def test_get_que_escribe_se_queda_en_default(self):
+        response = self._pedir(_vista_que_escribe, self.factory.get("/"))
+        self.assertEqual(response.content, b"lectura,default")
+        self.assertIn(COOKIE_PRIMARIA, response.cookies)
+
+    def test_streaming_se_genera_en_la_replica(self):
+        response = self._pedir(_vista_streaming, self.factory.get("/"))
+        self.assertEqual(b"".join(response.streaming_content), b"lecturalectura")
+
+    async def test_vista_async(self):
+        response = await _vista_async(self.factory.get("/"))
+        self.assertEqual(response.content, b"lectura")
+
+    @override_settings(LECTURA_DB=None)
+    def test_sin_replica_no_hace_nada(self):
+        response = self._pedir(_vista, self.factory.post("/"))
+        self.assertEqual(response.content, b"default")
+        self.assertNotIn(COOKIE_PRIMARIA, response.cookies)
+
+
+class VistasDeLecturaTests(TestCase):
+    """Las vistas decoradas siguen funcionando igual sin réplica configurada."""
+
+    @override_settings(LECTURA_DB="lectura")
+    def test_en_transaccion_lee_de_default(self):
+        # TestCase corre cada prueba dentro de una transacción
+        with solo_lectura():
+            self.assertEqual(_base_de_lectura(), "default")
+
+    def test_listados_y_reportes(self):
+        for nombre in ("sistema:ventas_lista", "sistema:venta_list", "sistema:remision_list", "sistema:inventario"):
+            self.assertEqual(self.client.get(reverse(nombre)).status_code, 200, nombre)
+        response = self.client.get(reverse("sistema:reporte_margen"), {"formato": "csv"})
+        self.assertTrue(b"".join(response.streaming_content).startswith(b"producto"))
+        self.assertEqual(self.client.get(reverse("sistema:busqueda_api"), {"q": "x"}).status_code, 200)
+
+    def test_changelist_admin(self):
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "x"))
+        self.assertEqual(self.client.get(reverse("admin:sistema_venta_changelist")).status_code, 200)
+
+
+class BusquedaDebounceTests(TestCase):
+    def test_seq_se_compara_solo_dentro_de_la_pagina(self):
+        url = reverse("sistema:busqueda_api")
+        self.assertEqual(self.client.get(url, {"q": "x", "seq": 7, "pagina": "a"}).status_code, 200)
+        # Otra pestaña (o la misma recargada) empieza otra vez en 1
+        self.assertEqual(self.client.get(url, {"q": "x", "seq": 1, "pagina": "b"}).status_code, 200)
+        self.assertEqual(self.client.get(url, {"q": "x", "seq": 1, "pagina": "a"}).status_code, 200)
+
+    def test_con_wsgi_no_espera(self):
+        with mock.patch("sistema.views.asyncio.sleep") as sleep:
+            self.client.get(reverse("sistema:busqueda_api"), {"q": "x", "seq": 1, "pagina": "a"})
+        sleep.assert_not_called()
+
+    async def test_con_asgi_espera_y_descarta_la_superada(self):
+        url = reverse("sistema:producto_autocomplete")
+        vieja = self.async_client.get(url, {"q": "x", "seq": 1, "pagina": "a"})
+        nueva = self.async_client.get(url, {"q": "x", "seq": 2, "pagina": "a"})
+        vieja, nueva = await asyncio.gather(vieja, nueva)
+        self.assertEqual((vieja.status_code, nueva.status_code), (204, 200))
+
+
+class CatalogoTests(TestCase):
+    def setUp(self):
+        # El snapshot es global del proceso; que no venga de otra prueba
+        catalogo._snapshot = None
+
+    def test_la_version_en_la_bd_la_ven_todos_los_workers(self):
+        self.assertIsNone(obtener_catalogo().por_codigo("NUEVO-1"))
+        # Otro worker importó: su invalidar_catalogo() solo sube la versión en la BD
+        Producto.objects.create(codigo="NUEVO-1", descripcion="Nuevo")
+        self.assertIsNone(obtener_catalogo().por_codigo("NUEVO-1"))
+        VersionCatalogo.subir()
+        self.assertIsNotNone(obtener_catalogo().por_codigo("NUEVO-1"))
+
+
+class VentaEditTests(TestCase):
+    def setUp(self):
+        self.venta = _venta()
+        self.url = reverse("sistema:venta_edit", args=[self.venta.pk])
+
+    def _post(self, version, **datos):
+        return self.client.post(self.url, {
+            "version": version, "fecha": "2026-01-05", "descuento": "0", "iva": "0",
+            "detalles-TOTAL_FORMS": "0", "detalles-INITIAL_FORMS": "0", **datos,
+        })
+
+    def test_post_invalido_regresa_la_version_que_vio_el_usuario(self):
+        Venta.objects.filter(pk=self.venta.pk).update(version=5)
+        response = self._post(3, descuento="x")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["version"], 3)
+        self.assertEqual(self._post(3).status_code, 409)
+
+    def test_el_formset_consulta_la_version_del_catalogo_una_vez(self):
+        for i in range(10):
+            producto = Producto.objects.create(codigo=f"P-{i}", descripcion=f"Producto {i}")
+            DetalleVenta.objects.create(
+                venta=self.venta, producto=producto, cantidad=Decimal("1"), precio_unitario=Decimal("1")
+            )
+        catalogo._snapshot = None
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(self.client.get(self.url, {"completo": "1"}).status_code, 200)
+        tabla = VersionCatalogo._meta.db_table
+        self.assertEqual(sum(tabla in q["sql"] for q in consultas.captured_queries), 1)
+
+    def test_un_guardado_del_admin_hace_chocar_el_form_viejo(self):
+        producto = Producto.objects.create(codigo="P-1", descripcion="Uno")
+        linea = DetalleVenta.objects.create(
+            venta=self.venta, producto=producto, cantidad=Decimal("1"), precio_unitario=Decimal("10")
+        )
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "x"))
+        response = self.client.post(reverse("admin:sistema_detalleventa_change", args=[linea.pk]), {
+            "venta": self.venta.pk, "producto": producto.pk, "unidad": DetalleVenta.UNIDAD_PIEZAS,
+            "cantidad": "3", "precio_unitario": "10", "subtotal": "30",
+        })
+        self.assertEqual(response.status_code, 302)
+        # El form de venta_edit se abrió con la versión 0, antes del cambio del admin
+        self.assertEqual(self._post(0).status_code, 409)
+        response = self.client.post(reverse("sistema:venta_linea", args=[self.venta.pk, linea.pk]), {
+            "version": 0, "producto": producto.pk, "unidad": DetalleVenta.UNIDAD_PIEZAS, "cantidad": "1",
+        })
+        self.assertEqual(response.status_code, 409)
+
+        version = Venta.objects.get(pk=self.venta.pk).version
+        self.client.post(reverse("admin:sistema_venta_changelist"), {
+            "action": "recalcular_totales", "_selected_action": [self.venta.pk],
+        })
+        self.assertEqual(Venta.objects.get(pk=self.venta.pk).version, version + 1)
+
+    def test_conflicto_muestra_las_lineas_actuales(self):
+        producto = Producto.objects.create(codigo="P-1", descripcion="Uno", venta_pzs=Decimal("10"))
+        linea = DetalleVenta.objects.create(
+            venta=self.venta, producto=producto, unidad=DetalleVenta.UNIDAD_PIEZAS, cantidad=Decimal("2"),
+            precio_unitario=Decimal("10"),
+        )
+        Venta.objects.filter(pk=self.venta.pk).update(version=1)
+        response = self._post(0)
+        self.assertEqual(response.status_code, 409)
+        self.assertTrue(response.context["conflicto"])
+        self.assertEqual(response.context["lineas"], [linea])
+        self.assertContains(response, 'id="linea-form"', status_code=409)
+
+
+class PedidoHabitualTests(TestCase):
+    def setUp(self):
+        self.cliente = Cliente.objects.create(numero=1, proveedor="P1", comercio="Tienda 1")
+        self.producto = Producto.objects.create(codigo="P-1", descripcion="Uno", venta_pzs=Decimal("10"))
+        for i in range(2):
+            DetalleVenta.objects.create(
+                venta=_venta(f"V-{i}", self.cliente), producto=self.producto, unidad=DetalleVenta.UNIDAD_PIEZAS,
+                cantidad=Decimal("3"), precio_unitario=Decimal("10"),
+            )
+
+    def test_las_lineas_elegidas_sobreviven_a_un_recalculo(self):
+        venta = _venta("V-2", self.cliente)
+        habituales = self.client.get(reverse("sistema:venta_edit", args=[venta.pk])).context["habituales"]
+        self.assertEqual(len(habituales), 1)
+        # Mientras tanto se llena otra venta del cliente: el pedido deja de estar vigente
+        marcar_desactualizados([self.cliente.pk])
+        pedido_habitual(self.cliente.pk)
+
+        elegida = f"{self.producto.pk}-{DetalleVenta.UNIDAD_PIEZAS}"
+        self.client.post(
+            reverse("sistema:venta_pedido_habitual", args=[venta.pk]),
+            {"version": venta.version, "linea": elegida, f"cantidad_{elegida}": "4"},
+        )
+        linea = venta.detalles.get()
+        self.assertEqual((linea.producto_id, linea.cantidad), (self.producto.pk, Decimal("4")))
+        venta.refresh_from_db()
+        self.assertEqual(venta.total, Decimal("40.00"))
+
+
+@override_settings(LECTURA_DB="lectura")
+class CatalogoEnLecturaTests(TransactionTestCase):
+    def setUp(self):
+        # El snapshot es global del proceso; que no venga de otra prueba
+        catalogo._snapshot = None
+
+    def test_el_snapshot_se_arma_de_default(self):
+        Producto.objects.create(codigo="NUEVO-2", descripcion="Nuevo")
+        VersionCatalogo.subir()
+        # El alias "lectura" no existe aquí: si el snapshot leyera de él, fallaría
+        with solo_lectura():
+            self.assertEqual(_base_de_lectura(), "lectura")
+            self.assertIsNotNone(obtener_catalogo().por_codigo("NUEVO-2"))
+
+
+class MargenCacheadoTests(TestCase):
+    def test_guardar_una_venta_del_rango_cambia_la_llave(self):
+        venta = _venta(fecha=date(2020, 1, 5))
+        producto = Producto.objects.create(codigo="P-1", descripcion="Uno")
+        DetalleVenta.objects.create(
+            venta=venta, producto=producto, cantidad=Decimal("1"), precio_unitario=Decimal("10")
+        )
+        venta.recalcular_totales(commit=True)
+        hasta = date(2020, 12, 31)
+        self.assertEqual(margen_cacheado("producto", None, hasta)[0]["venta_total"], Decimal("10.00"))
+
+        DetalleVenta.objects.filter(venta=venta).update(precio_unitario=Decimal("20"), subtotal=Decimal("20"))
+        venta.recalcular_totales(commit=True)
+        self.assertEqual(margen_cacheado("producto", None, hasta)[0]["venta_total"], Decimal("20.00"))
+
+
+class RespaldoTests(TestCase):
+    def _datos(self):
+        return {modelo: list(modelo.objects.order_by("pk").values_list()) for modelo in MODELOS}
+
+    def test_exportar_y_restaurar_deja_las_mismas_filas(self):
+        cliente = Cliente.objects.create(numero=1, proveedor="P1", comercio="Tienda 1")
+        indexar_clientes([cliente])
+        producto = Producto.objects.create(
+            codigo="P-1", descripcion='Uno, con "comillas"', venta_pzs=Decimal("9.5")
+        )
+        for i in range(3):
+            venta = _venta(f"R-{i}", cliente)
+            DetalleVenta.objects.create(
+                venta=venta, producto=producto, cantidad=Decimal("1.250"), precio_unitario=Decimal("9.5")
+            )
+        antes = self._datos()
+
+        with tempfile.TemporaryDirectory() as carpeta:
+            call_command(
+                "exportar_datos", carpeta, "--filas-por-archivo", "2", "--database", "default", stdout=io.StringIO()
+            )
+            # Vacía las tablas al revés del orden de dependencias y restaura
+            for modelo in reversed(MODELOS):
+                modelo.objects.all().delete()
+            call_command("restaurar_datos", carpeta, stdout=io.StringIO())
+            self.assertEqual(self._datos(), antes)
+
+            # Un bloque alterado no se restaura
+            for modelo in reversed(MODELOS):
+                modelo.objects.all().delete()
+            with open(os.path.join(carpeta, "sistema_remision.0001.csv.gz"), "ab") as f:
+                f.write(b"x")
+            with self.assertRaises(CommandError):
+                call_command("restaurar_datos", carpeta, stdout=io.StringIO())
+
+    def test_la_secuencia_de_venta_queda_arriba_del_archivo(self):
+        viva = _venta()
+        archivada = _venta("R-2", viva.cliente, date(2020, 1, 5))
+        id_archivada = archivada.pk + 100
+        VentaArchivada.objects.create(
+            id=id_archivada, remision=archivada.remision, cliente=viva.cliente, fecha=archivada.fecha,
+            created_at=archivada.created_at, updated_at=archivada.updated_at,
+        )
+        archivada.delete()
+        reiniciar_secuencias([Venta, VentaArchivada])
+        nueva = _venta("R-3", viva.cliente)
+        self.assertGreater(nueva.pk, id_archivada)
+
+
+class CrearVentasTests(TestCase):
+    def test_cuenta_solo_las_ventas_insertadas(self):
+        cliente = Cliente.objects.create(numero=1, proveedor="P1", comercio="Tienda 1")
+        for folio in ("R-1", "R-2"):
+            Remision.objects.create(folio=folio, cliente=cliente, fecha=date(2026, 1, 5))
+        remisiones = Remision.objects.all()
+        self.assertEqual(Venta.objects.crear_para_remisiones(remisiones), (2, 0))
+        self.assertEqual(Venta.objects.crear_para_remisiones(remisiones), (0, 2))
+
+    def test_no_cuenta_las_que_se_crearon_en_paralelo(self):
+        cliente = Cliente.objects.create(numero=1, proveedor="P1", comercio="Tienda 1")
+        r1 = Remision.objects.create(folio="R-1", cliente=cliente, fecha=date(2026, 1, 5))
+        Remision.objects.create(folio="R-2", cliente=cliente, fecha=date(2026, 1, 5))
+        vacias = Venta.objects.vacias
+
+        def con_otra_peticion(remisiones):
+            nuevas = vacias(remisiones)
+            # Otra petición crea la venta de R-1 entre el anti-join y el INSERT
+            Venta.objects.create(remision=r1, fecha=r1.fecha)
+            return nuevas
+
+        with mock.patch.object(Venta.objects, "vacias", con_otra_peticion):
+            self.assertEqual(Venta.objects.crear_para_remisiones(Remision.objects.all()), (1, 1))
+
+
+class InventarioTests(TestCase):
+    def setUp(self):
+        self.producto = Producto.objects.create(codigo="P-1", descripcion="Uno", piezas_por_paquete=12)
+        self.venta = _venta()
+
+    def _vender(self, cantidad, unidad=DetalleVenta.UNIDAD_PIEZAS):
+        DetalleVenta.objects.update_or_create(
+            venta=self.venta, producto=self.producto, unidad=unidad,
+            defaults={"cantidad": Decimal(cantidad), "precio_unitario": Decimal("1")},
+        )
+        return registrar_salidas_venta(self.venta)
+
+    def test_entradas_salidas_y_ajustes(self):
+        registrar_entrada(self.producto, Decimal("2"), DetalleVenta.UNIDAD_PAQUETES)
+        self.assertEqual(existencias_actuales(), {self.producto.pk: Decimal("24")})
+
+        (salida,) = self._vender("5")
+        self.assertEqual((salida.tipo, salida.piezas), ("VTA", Decimal("-5")))
+        # Editar la venta agrega solo la diferencia como ajuste
+        (ajuste,) = self._vender("3")
+        self.assertEqual((ajuste.tipo, ajuste.piezas), ("AJU", Decimal("2")))
+        self.assertEqual(self._vender("3"), [])
+
+        registrar_cambio_linea(self.venta, antes=(self.producto, Decimal("3"), DetalleVenta.UNIDAD_PIEZAS))
+        self.assertEqual(existencias_actuales(), {self.producto.pk: Decimal("24")})
+
+    def test_corte_y_movimientos_posteriores(self):
+        registrar_entrada(self.producto, Decimal("10"), DetalleVenta.UNIDAD_PIEZAS)
+        self._vender("4")
+        corte = tomar_corte()
+        self.assertEqual(
+            list(corte.existencias.values_list("producto_id", "piezas")), [(self.producto.pk, Decimal("6"))]
+        )
+
+        registrar_entrada(self.producto, Decimal("1"), DetalleVenta.UNIDAD_PAQUETES)
+        self.assertEqual(existencias_actuales(), {self.producto.pk: Decimal("18")})
+        # Con el corte ya no se suman los movimientos que cubre
+        with self.assertNumQueries(3):
+            existencias_actuales()
+        self.assertEqual(tomar_corte().hasta_movimiento, corte.hasta_movimiento + 1)
+        self.assertEqual(existencias_actuales(), {self.producto.pk: Decimal("18")})
+
+    def test_el_corte_es_atomico(self):
+        registrar_entrada(self.producto, Decimal("10"), DetalleVenta.UNIDAD_PIEZAS)
+        with mock.patch("sistema.inventario.ExistenciaCorte.objects.bulk_create", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                tomar_corte()
+        self.assertFalse(CorteInventario.objects.exists())
+
+
+class PreciosTests(TestCase):
+    def setUp(self):
+        self.uno = Producto.objects.create(codigo="P-1", descripcion="Uno")
+        self.dos = Producto.objects.create(codigo="P-2", descripcion="Dos")
+        for producto, desde, precio in (
+            (self.uno, date(2026, 1, 1), "10"),
+            (self.uno, date(2026, 2, 1), "12"),
+            (self.uno, date(2026, 2, 1), "13"),  # mismo día: gana el último
+            (self.dos, date(2026, 1, 15), "5"),
+            (self.dos, date(2026, 3, 1), "6"),
+        ):
+            PrecioProducto.objects.create(producto=producto, vigente_desde=desde, venta_pzs=Decimal(precio))
+
+    def _vigentes(self, fecha):
+        with self.assertNumQueries(1):
+            precios = precios_a_fecha([self.uno.pk, self.dos.pk], fecha)
+        return {producto_id: precio.venta_pzs for producto_id, precio in precios.items()}
+
+    def test_precios_a_fecha_en_un_query(self):
+        self.assertEqual(self._vigentes(date(2025, 12, 31)), {})
+        self.assertEqual(self._vigentes(date(2026, 1, 20)), {self.uno.pk: Decimal("10"), self.dos.pk: Decimal("5")})
+        self.assertEqual(self._vigentes(date(2026, 2, 1)), {self.uno.pk: Decimal("13"), self.dos.pk: Decimal("5")})
+        self.assertEqual(self._vigentes(date(2026, 3, 1)), {self.uno.pk: Decimal("13"), self.dos.pk: Decimal("6")})
+
+    def test_cada_linea_con_el_precio_de_la_fecha_de_su_venta(self):
+        for folio, fecha in (("R-1", date(2026, 1, 20)), ("R-2", date(2026, 3, 5))):
+            venta = _venta(folio, Cliente.objects.first(), fecha)
+            for producto in (self.uno, self.dos):
+                DetalleVenta.objects.create(
+                    venta=venta, producto=producto, cantidad=Decimal("1"), precio_unitario=Decimal("1")
+                )
+        lineas = con_precios_vigentes(DetalleVenta.objects.order_by("venta__fecha", "producto__codigo"))
+        with self.assertNumQueries(1):
+            vigentes = [linea.venta_pzs_vigente for linea in lineas]
+        self.assertEqual(vigentes, [Decimal("10"), Decimal("5"), Decimal("13"), Decimal("6")])
+
+
+class SimilitudTests(TestCase):
+    def setUp(self):
+        self.guera = Cliente.objects.create(
+            numero=1, proveedor="C-101", comercio="Abarrotes La Güera Feliz", contacto="Juan Pérez"
+        )
+        self.otro = Cliente.objects.create(numero=2, proveedor="C-200", comercio="Papelería El Sol Naciente")
+        indexar_clientes([self.guera, self.otro])
+
+    def test_encuentra_parecidos_por_nombre_y_por_clave(self):
+        typo = Cliente.objects.create(
+            numero=3, proveedor="C-300", comercio="Abarrotes La Guera Felis", contacto="Juan Perez"
+        )
+        clave = Cliente.objects.create(numero=4, proveedor="c 101", comercio="Otro nombre")
+        indexar_clientes([typo, clave])
+        parecidos = buscar_parecidos([(typo.pk, typo.proveedor, typo.comercio, typo.contacto)])
+        self.assertEqual([cliente_id for cliente_id, _ in parecidos[0]], [self.guera.pk])
+
+        self.assertEqual(len(marcar_duplicados([typo, clave])), 2)
+        self.assertEqual(
+            set(DuplicadoCliente.objects.values_list("cliente_id", "candidato_id")),
+            {(typo.pk, self.guera.pk), (clave.pk, self.guera.pk)},
+        )
+        self.assertEqual(resolver_claves(["C101", "X-1"]), {"C101": self.guera.pk})
+
+    def test_fusionar_mueve_remisiones_y_ventas_al_que_se_queda(self):
+        duplicado = Cliente.objects.create(numero=3, proveedor="C-999", comercio="Abarrotes La Guera")
+        indexar_clientes([duplicado])
+        venta = _venta("R-1", duplicado)
+        Remision.objects.create(folio="R-2", cliente=duplicado, fecha=date(2026, 1, 6))
+
+        self.assertEqual(fusionar_clientes(self.guera, [self.guera, duplicado]), 2)
+        self.assertFalse(Cliente.objects.filter(pk=duplicado.pk).exists())
+        self.assertEqual(Remision.objects.filter(cliente=self.guera).count(), 2)
+        self.assertEqual(Venta.objects.get(pk=venta.pk).cliente_id, self.guera.pk)
+        # La clave vieja ahora cae en el que se quedó
+        self.assertTrue(ClaveCliente.objects.filter(cliente=self.guera, clave="c:c999", alias=True).exists())
+        self.assertEqual(resolver_claves(["C-999"]), {"C-999": self.guera.pk})
+
+    def test_no_fusiona_folios_repetidos(self):
+        _venta("R-1", self.guera)
+        _venta("R-1", self.otro)
+        with self.assertRaises(ValueError):
+            fusionar_clientes(self.guera, [self.otro])
+        self.assertTrue(Cliente.objects.filter(pk=self.otro.pk).exists())
+
+
+def _hoja_entregas(*clientes, dias=("05/Ene/26", "06/Ene/26")):
+    """Hoja de entregas: título, encabezado de días y (clave, comercio, contacto, {día: folio})."""
+    filas = [["RELACIÓN DE REMISIONES"], [], [None, None, "CLAVE", "COMERCIO", "CONTACTO", *dias]]
+    for clave, comercio, contacto, folios in clientes:
+        filas.append([None, None, clave, comercio, contacto, *(
+            f"Remision {folios[dia]}" if dia in folios else None for dia in range(len(dias))
+        )])
+    return filas
+
+
+class RemisionesExcelTests(TestCase):
+    def test_detecta_la_fila_de_fechas(self):
+        self.assertEqual(fecha_encabezado("Lun 05/Ene/26"), date(2026, 1, 5))
+        self.assertEqual(fecha_encabezado(datetime(2026, 2, 1, 0, 0)), date(2026, 2, 1))
+        self.assertIsNone(fecha_encabezado("31/Feb/26"))
+        self.assertIsNone(fecha_encabezado("CLAVE"))
+        filas = [["Enero 05/Ene/26"], [], ["CLAVE", "05/Ene/26", "06/Ene/26", datetime(2026, 1, 7)]]
+        self.assertEqual(
+            detectar_encabezado(filas),
+            (3, {1: date(2026, 1, 5), 2: date(2026, 1, 6), 3: date(2026, 1, 7)}),
+        )
+        self.assertEqual(detectar_encabezado([["sin fechas"]]), (None, {}))
+
+    def test_lee_las_hojas_en_el_pool_en_orden(self):
+        archivo = _libro(
+            Norte=_hoja_entregas(("C-1", "Tienda 1", "", {0: "10"})),
+            Sur=_hoja_entregas(("C-2", "Tienda 2", "", {1: "20"})),
+        )
+        with tempfile.NamedTemporaryFile(suffix=".xlsx") as tmp:
+            tmp.write(archivo.read())
+            tmp.flush()
+            leidas = leer_hojas([(tmp.name, "Sur"), (tmp.name, "Norte")], procesos=2)
+        self.assertEqual([leida["hoja"] for leida in leidas], ["Sur", "Norte"])
+        self.assertEqual(leidas[0]["filas"], [("C-2", "Tienda 2", "", [("20", date(2026, 1, 6))])])
+
+    @override_settings(IMPORTACION_PROCESOS=1)
+    def test_junta_varios_libros_y_hojas(self):
+        existente = Cliente.objects.create(numero=1, proveedor="C-1", comercio="Tienda 1")
+        Remision.objects.create(folio="10", cliente=existente, fecha=date(2026, 1, 5))
+        uno = _libro(
+            "uno.xlsx",
+            Norte=_hoja_entregas(("C-1", "Tienda 1", "", {0: "10", 1: "11"}), ("C-2", "", "", {0: "20"})),
+            Sur=_hoja_entregas(("C-2", "Tienda 2", "Ana", {0: "20", 1: "21"})),
+        )
+        dos = _libro(
+            "dos.xlsx", Hoja=_hoja_entregas(("C-3", "Tienda 3", "", {1: "30"}), dias=("07/Ene/26", "08/Ene/26"))
+        )
+        response = self.client.post(reverse("sistema:importar_remisiones_excel"), {"excel_file": [uno, dos]})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context["ok"])
+        # El folio 20 viene en las dos hojas: cuenta una vez y gana la primera
+        self.assertEqual(response.context["duplicadas"], 1)
+        self.assertEqual(response.context["creadas"], 4)
+        self.assertEqual(response.context["clientes_creados"], 2)
+        self.assertEqual(len(response.context["hojas"]), 3)
+        self.assertEqual(
+            set(Remision.objects.values_list("cliente__proveedor", "folio", "fecha")),
+            {
+                ("C-1", "10", date(2026, 1, 5)), ("C-1", "11", date(2026, 1, 6)),
+                ("C-2", "20", date(2026, 1, 5)), ("C-2", "21", date(2026, 1, 6)),
+                ("C-3", "30", date(2026, 1, 8)),
+            },
+        )
+        # El comercio vacío de la primera hoja se completa con el de la segunda
+        self.assertEqual(Cliente.objects.get(proveedor="C-2").comercio, "Tienda 2")
+        self.assertEqual(Venta.objects.count(), 4)
+
+
+class MediaTests(SimpleTestCase):
+    def setUp(self):
+        carpeta = tempfile.TemporaryDirectory()
+        self.addCleanup(carpeta.cleanup)
+        ajuste = override_settings(MEDIA_ROOT=carpeta.name)
+        ajuste.enable()
+        self.addCleanup(ajuste.disable)
+        self.storage = HashStorage()
+        self.nombre = self.storage.save("remisiones/2026/01/escaneo.JPG", ContentFile(b"0123456789"))
+        self.url = f"/media/{self.nombre}"
+
+    def test_mismo_contenido_mismo_archivo(self):
+        self.assertRegex(self.nombre, r"^remisiones/[0-9a-f]{2}/[0-9a-f]{64}\.jpg$")
+        self.assertEqual(self.storage.save("remisiones/2026/02/otro.jpg", ContentFile(b"0123456789")), self.nombre)
+        self.assertEqual(self.storage.listdir(os.path.dirname(self.nombre))[1], [os.path.basename(self.nombre)])
+
+    def test_subida_simultanea_no_deja_copia_con_sufijo(self):
+        # La otra petición guardó el archivo justo después de que esta revisó si existía
+        carrera = itertools.chain([False, True], itertools.repeat(False))
+        with mock.patch.object(HashStorage, "exists", side_effect=carrera):
+            self.assertEqual(self.storage.save("remisiones/otro.jpg", ContentFile(b"0123456789")), self.nombre)
+        self.assertEqual(len(self.storage.listdir(os.path.dirname(self.nombre))[1]), 1)
+
+    def test_completo_con_cache_inmutable(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), b"0123456789")
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+
+    def test_304_con_etag(self):
+        etag = self.client.get(self.url)["ETag"]
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+
+    def test_206_con_rango(self):
+        response = self.client.get(self.url, HTTP_RANGE="bytes=2-5")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b"".join(response.streaming_content), b"2345")
+        self.assertEqual(response["Content-Range"], "bytes 2-5/10")
+        response = self.client.get(self.url, HTTP_RANGE="bytes=-3")
+        self.assertEqual(b"".join(response.streaming_content), b"789")
+        # If-Range con otro ETag: el archivo cambió, va completo
+        response = self.client.get(self.url, HTTP_RANGE="bytes=2-5", HTTP_IF_RANGE='"otro"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_416_fuera_de_rango(self):
+        response = self.client.get(self.url, HTTP_RANGE="bytes=20-30")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], "bytes */10")
+
+    def test_no_sale_de_media_root(self):
+        self.assertEqual(self.client.get("/media/../manage.py").status_code, 404)
+
+
+def _libro_productos(*productos):
+    """Hoja de productos: título, encabezado y (código, descripción, compra cja/pz, venta cja/pz)."""
+    encabezado = ["#", "CLAVE", "DESCRIPCION", "COMPRA CJA", "COMPRA PZ", "PRECIO CJA", "PRECIO PZ"]
+    filas = [["LISTA DE PRECIOS"], encabezado]
+    filas += [[i, *producto] for i, producto in enumerate(productos, start=1)]
+    return _libro("productos.xlsx", Productos=filas)
+
+
+class ImportacionIdempotenteTests(TestCase):
+    def setUp(self):
+        catalogo._snapshot = None
+        self.url = reverse("sistema:importar_productos")
+
+    def _importar(self, archivo, **datos):
+        return self.client.post(self.url, {"excel_file": archivo, **datos})
+
+    def test_mismo_archivo_se_salta_y_solo_se_escribe_lo_que_cambio(self):
+        uno = ("P-1", "Uno", 1, 1, 10, 1)
+        self._importar(_libro_productos(uno, ("P-2", "Dos", 2, 2, 20, 2)))
+        primera = Importacion.objects.get()
+        self.assertEqual((primera.nuevas, primera.cambiadas, primera.sin_cambios), (2, 0, 0))
+        self.assertEqual(PrecioProducto.objects.count(), 2)
+
+        # El mismo archivo otra vez: no se hace nada
+        response = self._importar(_libro_productos(uno, ("P-2", "Dos", 2, 2, 20, 2)))
+        self.assertRedirects(response, reverse("sistema:importacion_detail", args=[primera.pk]))
+        self.assertEqual(Importacion.objects.count(), 1)
+
+        update_or_create = Producto.objects.update_or_create
+        with mock.patch.object(Producto.objects, "update_or_create", wraps=update_or_create) as crear:
+            self._importar(_libro_productos(uno, ("P-2", "Dos", 2, 2, 25, 2), ("P-3", "Tres", 3, 3, 30, 3)))
+        segunda = Importacion.objects.latest("pk")
+        self.assertEqual((segunda.nuevas, segunda.cambiadas, segunda.sin_cambios), (1, 1, 1))
+        self.assertEqual(segunda.cambios, {"nuevas": ["P-3"], "cambiadas": ["P-2"]})
+        self.assertEqual(crear.call_count, 1)
+        self.assertEqual(Producto.objects.get(codigo="P-2").venta_cjs, Decimal("25"))
+        # Historial solo para el producto nuevo y el que cambió de precio
+        self.assertEqual(
+            sorted(PrecioProducto.objects.filter(importacion=segunda).values_list("producto__codigo", flat=True)),
+            ["P-2", "P-3"],
+        )
+
+    def test_forzar_reimporta_el_mismo_archivo(self):
+        uno = ("P-1", "Uno", 1, 1, 10, 1)
+        self._importar(_libro_productos(uno))
+        self._importar(_libro_productos(uno), forzar="1")
+        forzada = Importacion.objects.latest("pk")
+        self.assertEqual(Importacion.objects.count(), 2)
+        self.assertEqual((forzada.nuevas, forzada.sin_cambios), (0, 1))
+
+
+class PerfiladoTests(TestCase):
+    def test_tiempo_y_queries_por_fase(self):
+        perfil = PerfilImportacion()
+        with perfil:
+            with perfil.fase("abrir"):
+                Producto.objects.count()
+            for _ in perfil.iterar(range(3)):
+                with perfil.fase("casar"):
+                    Producto.objects.exists()
+                    # Una fase dentro de otra se lleva sus propios queries
+                    with perfil.fase("escribir"):
+                        Producto.objects.create(codigo=f"P-{Producto.objects.count()}", descripcion="x")
+        resumen = perfil.resumen()
+        queries = {fase["fase"]: fase["queries"] for fase in resumen["fases"]}
+        self.assertEqual(queries, {"abrir": 1, "leer": 0, "casar": 3, "escribir": 6, "otros": 0})
+        self.assertEqual((resumen["filas"], resumen["queries"]), (3, 10))
+        self.assertAlmostEqual(sum(fase["pct"] for fase in resumen["fases"]), 100, delta=1)
+        self.assertEqual(perfil.perfil, "")
+
+    def test_la_importacion_guarda_sus_metricas(self):
+        catalogo._snapshot = None
+        self.client.post(reverse("sistema:importar_productos"), {
+            "excel_file": _libro_productos(("P-1", "Uno", 1, 1, 10, 1)), "perfilar": "1",
+        })
+        importacion = Importacion.objects.get()
+        fases = {fase["fase"] for fase in importacion.metricas["fases"]}
+        self.assertLessEqual({"abrir", "leer", "casar", "escribir", "confirmar"}, fases)
+        self.assertEqual(importacion.metricas["filas"], 3)
+        self.assertGreater(importacion.metricas["queries"], 0)
+        self.assertIn("cumulative", importacion.perfil)
+
+
+class EstadoDeCuentaTests(TestCase):
+    def setUp(self):
+        self.cliente = Cliente.objects.create(numero=1, proveedor="P1", comercio="Tienda 1")
+        otro = Cliente.objects.create(numero=2, proveedor="P2", comercio="Tienda 2")
+        fechas = [
+            date(2026, 1, 10), date(2026, 1, 10), date(2026, 1, 20), date(2026, 2, 3), date(2026, 2, 3), date(2026, 3, 1),
+        ]
+        for i, fecha in enumerate(fechas, start=1):
+            venta = _venta(f"R-{i}", self.cliente, fecha)
+            Venta.objects.filter(pk=venta.pk).update(total=Decimal(10 * i))
+        Venta.objects.filter(pk=_venta("X-1", otro, date(2026, 1, 15)).pk).update(total=Decimal("999"))
+        # Enero queda en las tablas de archivo
+        cerrar_periodo(date(2026, 2, 1))
+
+    def _todas(self, limite, **filtros):
+        filas, cursor = [], None
+        while True:
+            estado = estado_de_cuenta(self.cliente.pk, cursor=cursor, limite=limite, **filtros)
+            filas += [(v.remision.folio, v.acumulado) for v in estado["ventas"]]
+            cursor = estado["siguiente"]
+            if cursor is None:
+                return filas
+
+    def test_saldo_corrido_entre_paginas_y_tablas(self):
+        esperado = [(f"R-{i}", Decimal(5 * i * (i + 1))) for i in range(1, 7)]
+        self.assertEqual(VentaArchivada.objects.filter(cliente=self.cliente).count(), 3)
+        for limite in (1, 2, 4, 50):
+            self.assertEqual(self._todas(limite), esperado, limite)
+
+    def test_api_sigue_el_cursor(self):
+        url = reverse("sistema:cliente_estado_cuenta_api", args=[self.cliente.pk])
+        with mock.patch("sistema.views.estado_de_cuenta", functools.partial(estado_de_cuenta, limite=4)):
+            primera = self.client.get(url).json()
+            segunda = self.client.get(url, {"despues": primera["siguiente"]}).json()
+        self.assertEqual([v["acumulado"] for v in primera["ventas"]], ["10.00", "30.00", "60.00", "100.00"])
+        self.assertEqual([v["acumulado"] for v in segunda["ventas"]], ["150.00", "210.00"])
+        self.assertIsNone(segunda["siguiente"])
+
+    def test_desde_arranca_con_el_saldo_anterior(self):
+        estado = estado_de_cuenta(self.cliente.pk, desde=date(2026, 1, 15), hasta=date(2026, 2, 28))
+        self.assertEqual(estado["saldo_inicial"], Decimal("30.00"))
+        self.assertEqual(
+            [v.acumulado for v in estado["ventas"]], [Decimal("60.00"), Decimal("100.00"), Decimal("150.00")]
+        )
+        self.assertEqual(estado["total_periodo"], Decimal("120.00"))
+        self.assertEqual(
+            [(m["mes"].month, m["ventas"], m["acumulado"]) for m in estado["meses"]],
+            [(1, 1, Decimal("60.00")), (2, 2, Decimal("150.00"))],
+        )
+        self.assertEqual(
+            self._todas(1, desde=date(2026, 1, 15), hasta=date(2026, 2, 28)),
+            [("R-3", Decimal("60.00")), ("R-4", Decimal("100.00")), ("R-5", Decimal("150.00"))],
+        )
+
+
+class RemisionListTests(TestCase):
+    def setUp(self):
+        self.uno = Cliente.objects.create(numero=1, proveedor="P1", comercio="Tienda 1")
+        self.dos = Cliente.objects.create(numero=2, proveedor="P2", comercio="Tienda 2")
+        for folio, cliente, fecha, imagen in (
+            ("A-1", self.uno, date(2025, 11, 3), ""),
+            ("A-2", self.uno, date(2026, 1, 5), "remisiones/ab/x.jpg"),
+            ("B-1", self.dos, date(2026, 1, 20), ""),
+            ("A-3", self.uno, date(2026, 2, 1), ""),
+        ):
+            Remision.objects.create(folio=folio, cliente=cliente, fecha=fecha, imagen=imagen)
+        Venta.objects.create(remision=Remision.objects.get(folio="A-2"), fecha=date(2026, 1, 5))
+        Venta.objects.create(remision=Remision.objects.get(folio="A-1"), fecha=date(2025, 11, 3))
+        # A-1 queda con venta archivada
+        cerrar_periodo(date(2025, 12, 1))
+
+    def _folios(self, **filtros):
+        response = self.client.get(reverse("sistema:remision_list"), filtros)
+        return [r.folio for r in response.context["remisiones"]]
+
+    def test_cada_filtro(self):
+        self.assertEqual(self._folios(), ["A-3", "B-1", "A-2", "A-1"])
+        self.assertEqual(self._folios(cliente=self.uno.pk), ["A-3", "A-2", "A-1"])
+        self.assertEqual(self._folios(mes="2026-01"), ["B-1", "A-2"])
+        self.assertEqual(self._folios(mes="2026-13"), ["A-3", "B-1", "A-2", "A-1"])
+        self.assertEqual(self._folios(desde="2026-01-05", hasta="2026-01-31"), ["B-1", "A-2"])
+        self.assertEqual(self._folios(folio="A-"), ["A-3", "A-2", "A-1"])
+        self.assertEqual(self._folios(imagen="1"), ["A-2"])
+        self.assertEqual(self._folios(imagen="0"), ["A-3", "B-1", "A-1"])
+        self.assertEqual(self._folios(venta="1"), ["A-2", "A-1"])
+        self.assertEqual(self._folios(venta="0"), ["A-3", "B-1"])
+        self.assertEqual(self._folios(cliente=self.uno.pk, mes="2026-01", venta="1", imagen="1"), ["A-2"])
+
+    def test_meses_y_cliente_sin_recorrer_todo(self):
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(reverse("sistema:remision_list"), {"cliente": self.uno.pk})
+        self.assertEqual(
+            [m.isoformat() for m in response.context["meses"]],
+            ["2026-02-01", "2026-01-01", "2025-12-01", "2025-11-01"],
+        )
+        self.assertEqual(response.context["cliente"], self.uno)
+        self.assertNotIn("DISTINCT", " ".join(q["sql"] for q in consultas.captured_queries))
+        self.assertContains(response, "Tienda 1 (P1)")
+        self.assertNotContains(response, "Tienda 2")
+        self.assertEqual(self.client.get(reverse("sistema:remision_list")).context["cliente"], None)
+
+
+class VentaLineaTests(TestCase):
+    def setUp(self):
+        self.venta = _venta()
+        self.uno = Producto.objects.create(
+            codigo="P-1", descripcion="Uno", venta_pzs=Decimal("10"), venta_cjs=Decimal("100")
+        )
+        self.dos = Producto.objects.create(codigo="P-2", descripcion="Dos", venta_pzs=Decimal("5"))
+
+    def _post(self, linea_id=None, **datos):
+        if linea_id is None:
+            url = reverse("sistema:venta_linea_nueva", args=[self.venta.pk])
+        else:
+            url = reverse("sistema:venta_linea", args=[self.venta.pk, linea_id])
+        datos.setdefault("version", Venta.objects.get(pk=self.venta.pk).version)
+        return self.client.post(url, datos)
+
+    def _totales(self):
+        venta = Venta.objects.get(pk=self.venta.pk)
+        return venta.subtotal, venta.total
+
+    def test_alta_cambio_y_baja_actualizan_los_totales(self):
+        # Sin precio se usa el de lista según la unidad
+        alta = self._post(producto=self.uno.pk, unidad=DetalleVenta.UNIDAD_PAQUETES, cantidad="2")
+        self.assertEqual(alta.status_code, 200)
+        self.assertEqual(alta.json()["venta"]["total"], "200.00")
+        uno = alta.json()["linea"]
+        self._post(producto=self.dos.pk, unidad=DetalleVenta.UNIDAD_PIEZAS, cantidad="3", precio_unitario="4")
+        self.assertEqual(self._totales(), (Decimal("212.00"), Decimal("212.00")))
+
+        cambio = self._post(uno, producto=self.uno.pk, unidad=DetalleVenta.UNIDAD_PIEZAS, cantidad="1")
+        self.assertEqual(cambio.json()["venta"]["subtotal"], "22.00")
+        self.assertIn('data-linea="%s"' % uno, cambio.json()["html"])
+
+        baja = self._post(uno, borrar="1")
+        self.assertEqual((baja.json()["linea"], baja.json()["html"]), (None, ""))
+        self.assertEqual(self._totales(), (Decimal("12.00"), Decimal("12.00")))
+        self.assertEqual(list(self.venta.detalles.values_list("producto_id", flat=True)), [self.dos.pk])
+        # Cada guardado sube la versión una vez y deja su movimiento de inventario
+        self.assertEqual(Venta.objects.get(pk=self.venta.pk).version, 4)
+        self.assertEqual(existencias_actuales(), {self.uno.pk: Decimal("0"), self.dos.pk: Decimal("-3")})
+
+    def test_linea_invalida_o_repetida_no_cambia_nada(self):
+        self._post(producto=self.uno.pk, unidad=DetalleVenta.UNIDAD_PIEZAS, cantidad="1")
+        cero = self._post(producto=self.uno.pk, unidad=DetalleVenta.UNIDAD_PIEZAS, cantidad="0")
+        self.assertEqual(cero.status_code, 400)
+        repetida = self._post(producto=self.uno.pk, unidad=DetalleVenta.UNIDAD_PIEZAS, cantidad="2")
+        self.assertEqual(repetida.status_code, 400)
+        self.assertIn("producto", repetida.json()["errores"])
+        self.assertEqual(self._post(borrar="1").status_code, 400)
+        self.assertEqual(self._totales(), (Decimal("10.00"), Decimal("10.00")))
+
+    def test_version_vieja_es_409_y_no_guarda(self):
+        self._post(producto=self.uno.pk, unidad=DetalleVenta.UNIDAD_PIEZAS, cantidad="1")
+        response = self._post(producto=self.dos.pk, unidad=DetalleVenta.UNIDAD_PIEZAS, cantidad="1", version=0)
+        self.assertEqual(response.status_code, 409)
+        self.assertTrue(response.json()["conflicto"])
+        self.assertEqual(response.json()["venta"]["version"], 1)
+        self.assertEqual(self.venta.detalles.count(), 1)
+        self.assertEqual(self._totales(), (Decimal("10.00"), Decimal("10.00")))
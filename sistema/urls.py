@@ -14,6 +14,13 @@ urlpatterns = [
     # -----------------------------
     path("productos/", views.lista_productos, name="lista_productos"),
     path("clientes/", views.lista_clientes, name="lista_clientes"),
+    path("clientes/<int:pk>/estado-de-cuenta/", views.cliente_estado_cuenta, name="cliente_estado_cuenta"),
+    path(
+        "api/clientes/<int:pk>/estado-de-cuenta/",
+        views.cliente_estado_cuenta_api,
+        name="cliente_estado_cuenta_api",
+    ),
+    path("productos/autocomplete/", views.producto_autocomplete, name="producto_autocomplete"),
 
     # -----------------------------
     # IMPORTADORES
@@ -21,11 +28,14 @@ urlpatterns = [
     path("importar/productos/", views.importar_productos, name="importar_productos"),
     path("importar/clientes/", views.importar_clientes, name="importar_clientes"),
     path("importar/remisiones/", views.importar_remisiones_excel, name="importar_remisiones_excel"),
+    path("importaciones/", views.importacion_list, name="importacion_list"),
+    path("importaciones/<int:pk>/", views.importacion_detail, name="importacion_detail"),
 
     # -----------------------------
     # BÚSQUEDA GLOBAL
     # -----------------------------
     path("buscar/", views.busqueda_global, name="busqueda"),
+    path("api/buscar/", views.busqueda_api, name="busqueda_api"),
 
     # -----------------------------
     # REMISIONES
@@ -41,6 +51,19 @@ urlpatterns = [
     path("ventas/nueva/<int:remision_id>/", views.venta_create_from_remision, name="venta_create_from_remision"),
     path("ventas/<int:pk>/", views.venta_detail, name="venta_detail"),
     path("ventas/<int:pk>/editar/", views.venta_edit, name="venta_edit"),
+    path("ventas/<int:pk>/lineas/", views.venta_linea, name="venta_linea_nueva"),
+    path("ventas/<int:pk>/lineas/<int:linea_id>/", views.venta_linea, name="venta_linea"),
+    path("ventas/<int:pk>/pedido-habitual/", views.venta_pedido_habitual, name="venta_pedido_habitual"),
+
+    # -----------------------------
+    # INVENTARIO
+    # -----------------------------
+    path("inventario/", views.inventario, name="inventario"),
+
+    # -----------------------------
+    # REPORTES
+    # -----------------------------
+    path("reportes/margen/", views.reporte_margen, name="reporte_margen"),
 
     # -----------------------------
     # VENTAS (FILTROS CLIENTE / PRODUCTO)
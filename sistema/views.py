@@ -1,17 +1,48 @@
+import asyncio
+import csv
+import itertools
 import logging
 import re
 from datetime import date
 from decimal import Decimal
 
-from openpyxl import load_workbook
+from asgiref.sync import sync_to_async
 
+from django.conf import settings
 from django.contrib import messages
-from django.db import transaction
-from django.db.models import Q, Prefetch
+from django.core.handlers.asgi import ASGIRequest
+from django.core.paginator import Paginator
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q, Prefetch
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
-
-from .models import Cliente, Producto, Remision, Venta, DetalleVenta
-from .forms import RemisionForm, VentaForm, DetalleVentaFormSet
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.views.decorators.http import require_POST
+
+from .catalogo import CatalogoSnapshot, invalidar_catalogo, obtener_catalogo
+from .excel import abrir_libro
+from .importacion import RegistroImportacion, huella
+from .inventario import existencias_actuales, registrar_cambio_linea, registrar_entrada, registrar_salidas_venta
+from .lectura import vista_de_lectura
+from .perfilado import PerfilImportacion
+from .remisiones_excel import hojas_de, leer_hojas, rutas_en_disco
+from .reportes import DIMENSIONES_MARGEN, estado_de_cuenta, margen_cacheado
+from .similitud import en_bloques, indexar_clientes, marcar_duplicados, resolver_claves
+from .sugerencias import detalles_para_venta, marcar_desactualizados, pedido_habitual
+from .models import (
+    Cliente,
+    DetalleVenta,
+    Importacion,
+    PeriodoCerrado,
+    PrecioProducto,
+    Producto,
+    Remision,
+    Venta,
+    VentaArchivada,
+)
+from .forms import RemisionForm, VentaForm, DetalleVentaForm, DetalleVentaFormSet, EntradaInventarioForm
 
 logger = logging.getLogger(__name__)
 
@@ -75,51 +106,95 @@ def importar_productos(request):
                 messages.error(request, "No se recibió ningún archivo. Revisa que el input se llame excel_file.")
                 return redirect("sistema:importar_productos")
 
-            wb = load_workbook(archivo, data_only=True)
-            ws = wb.active
-
-            primera_fila = True
-            segunda_fila = True
-
-            with transaction.atomic():
-                for row in ws.iter_rows(values_only=True):
-                    if primera_fila:
-                        primera_fila = False
-                        continue
-                    if segunda_fila:
-                        segunda_fila = False
-                        continue
-
-                    if not row or all(col is None for col in row):
-                        continue
-
-                    # Evita IndexError si faltan columnas
-                    if len(row) < 7:
-                        continue
-
-                    codigo = row[1]
-                    descripcion = row[2]
-                    compra_cjs = safe_decimal(row[3])
-                    compra_pzs = safe_decimal(row[4])
-                    venta_cjs = safe_decimal(row[5])
-                    venta_pzs = safe_decimal(row[6])
-
-                    if not codigo:
-                        continue
-
-                    Producto.objects.update_or_create(
-                        codigo=safe_str(codigo),
-                        defaults={
-                            "descripcion": safe_str(descripcion),
-                            "compra_cjs": compra_cjs,
-                            "compra_pzs": compra_pzs,
-                            "venta_cjs": venta_cjs,
-                            "venta_pzs": venta_pzs,
-                        },
+            perfil = PerfilImportacion(perfilar=bool(request.POST.get("perfilar")))
+            with perfil:
+                with perfil.fase("abrir"):
+                    registro = RegistroImportacion(
+                        Importacion.TIPO_PRODUCTOS, archivo, forzar=bool(request.POST.get("forzar"))
                     )
+                    previa = registro.ya_importado()
+                if previa:
+                    messages.info(request, f"Este archivo ya se importó el {previa.created_at:%d/%m/%Y %H:%M}; no hubo cambios.")
+                    return redirect("sistema:importacion_detail", pk=previa.pk)
+
+                with perfil.fase("abrir"):
+                    wb = abrir_libro(archivo)
+                    ws = wb.active
+
+                primera_fila = True
+                segunda_fila = True
+
+                # Un solo SELECT para casar códigos; luego UPDATE solo de lo que cambió
+                with perfil.fase("casar"):
+                    catalogo = CatalogoSnapshot.desde_bd()
+                cambios_precio = []
+
+                with perfil.fase("confirmar"), transaction.atomic():
+                    for row in perfil.iterar(ws.iter_rows(values_only=True)):
+                        if primera_fila:
+                            primera_fila = False
+                            continue
+                        if segunda_fila:
+                            segunda_fila = False
+                            continue
+
+                        if not row or all(col is None for col in row):
+                            continue
+
+                        # Evita IndexError si faltan columnas
+                        if len(row) < 7:
+                            continue
+
+                        codigo = row[1]
+                        if not codigo:
+                            continue
+
+                        with perfil.fase("normalizar"):
+                            codigo = safe_str(codigo)
+                            valores = {
+                                "descripcion": safe_str(row[2]),
+                                "compra_cjs": safe_decimal(row[3]),
+                                "compra_pzs": safe_decimal(row[4]),
+                                "venta_cjs": safe_decimal(row[5]),
+                                "venta_pzs": safe_decimal(row[6]),
+                            }
+                            valor_huella = huella(*valores.values())
+
+                        with perfil.fase("casar"):
+                            if not registro.cambio(codigo, valor_huella):
+                                continue
+                            precios = {campo: valores[campo] for campo in PrecioProducto.CAMPOS_PRECIO}
+                            actual = catalogo.por_codigo(codigo)
+
+                        with perfil.fase("escribir"):
+                            if actual is None:
+                                producto, _ = Producto.objects.update_or_create(codigo=codigo, defaults=valores)
+                                cambios_precio.append((producto.pk, precios))
+                            elif any(getattr(actual, campo) != valor for campo, valor in valores.items()):
+                                Producto.objects.filter(pk=actual.id).update(**valores)
+                                if any(getattr(actual, campo) != valor for campo, valor in precios.items()):
+                                    cambios_precio.append((actual.id, precios))
+
+                    with perfil.fase("escribir"):
+                        importacion = registro.guardar()
+
+                        # Historial de precios: solo los productos nuevos o con precio distinto
+                        hoy = timezone.localdate()
+                        PrecioProducto.objects.bulk_create(
+                            [
+                                PrecioProducto(producto_id=producto_id, vigente_desde=hoy, importacion=importacion, **precios)
+                                for producto_id, precios in cambios_precio
+                            ]
+                        )
+                        transaction.on_commit(invalidar_catalogo)
+            perfil.guardar(importacion)
 
-            messages.success(request, "Productos importados correctamente.")
-            return redirect("sistema:lista_productos")
+            messages.success(
+                request,
+                f"Productos importados correctamente. Nuevos: {importacion.nuevas} | "
+                f"Cambiados: {importacion.cambiadas} | Sin cambios: {importacion.sin_cambios}",
+            )
+            return redirect("sistema:importacion_detail", pk=importacion.pk)
 
         except Exception:
             logger.exception("ERROR EN IMPORTAR PRODUCTOS")
@@ -143,64 +218,96 @@ def importar_clientes(request):
             return redirect("sistema:importar_clientes")
 
         try:
-            wb = load_workbook(archivo, data_only=True)
-            ws = wb.active
-
-            primera_fila = True
-            segunda_fila = True
-            creados = 0
-            actualizados = 0
-
-            with transaction.atomic():
-                for row in ws.iter_rows(values_only=True):
-                    if primera_fila:
-                        primera_fila = False
-                        continue
-                    if segunda_fila:
-                        segunda_fila = False
-                        continue
-
-                    if not row or all(col is None for col in row):
-                        continue
-
-                    # Asegura columnas 0..6
-                    row = list(row) + [None] * (7 - len(row))
-
-                    numero_raw = row[0]
-                    proveedor = safe_str(row[1])
-                    comercio = safe_str(row[2])
-                    contacto = safe_str(row[3])
-                    direccion = safe_str(row[4])
-                    telefono = safe_str(row[5])
-                    referencia = safe_str(row[6])
-
-                    if not proveedor:
-                        continue
-
-                    numero = safe_int(numero_raw, default=0)
-
-                    _, created = Cliente.objects.update_or_create(
-                        proveedor=proveedor,
-                        defaults={
-                            "numero": numero,
-                            "comercio": comercio,
-                            "contacto": contacto,
-                            "direccion": direccion,
-                            "telefono": telefono,
-                            "referencia": referencia,
-                        },
+            perfil = PerfilImportacion(perfilar=bool(request.POST.get("perfilar")))
+            with perfil:
+                with perfil.fase("abrir"):
+                    registro = RegistroImportacion(
+                        Importacion.TIPO_CLIENTES, archivo, forzar=bool(request.POST.get("forzar"))
                     )
+                    previa = registro.ya_importado()
+                if previa:
+                    messages.info(request, f"Este archivo ya se importó el {previa.created_at:%d/%m/%Y %H:%M}; no hubo cambios.")
+                    return redirect("sistema:importacion_detail", pk=previa.pk)
+
+                with perfil.fase("abrir"):
+                    wb = abrir_libro(archivo)
+                    ws = wb.active
+
+                primera_fila = True
+                segunda_fila = True
+                creados = 0
+                actualizados = 0
+                # Para el índice de parecidos: todos los escritos; duplicados, solo los nuevos
+                escritos = []
+                nuevos = []
+
+                with perfil.fase("confirmar"), transaction.atomic():
+                    for row in perfil.iterar(ws.iter_rows(values_only=True)):
+                        if primera_fila:
+                            primera_fila = False
+                            continue
+                        if segunda_fila:
+                            segunda_fila = False
+                            continue
+
+                        if not row or all(col is None for col in row):
+                            continue
+
+                        with perfil.fase("normalizar"):
+                            # Asegura columnas 0..6
+                            row = list(row) + [None] * (7 - len(row))
+
+                            numero_raw = row[0]
+                            proveedor = safe_str(row[1])
+                            comercio = safe_str(row[2])
+                            contacto = safe_str(row[3])
+                            direccion = safe_str(row[4])
+                            telefono = safe_str(row[5])
+                            referencia = safe_str(row[6])
+
+                            if not proveedor:
+                                continue
+
+                            numero = safe_int(numero_raw, default=0)
+                            valor_huella = huella(numero, comercio, contacto, direccion, telefono, referencia)
+
+                        with perfil.fase("casar"):
+                            if not registro.cambio(proveedor, valor_huella):
+                                continue
+
+                        with perfil.fase("escribir"):
+                            cliente, created = Cliente.objects.update_or_create(
+                                proveedor=proveedor,
+                                defaults={
+                                    "numero": numero,
+                                    "comercio": comercio,
+                                    "contacto": contacto,
+                                    "direccion": direccion,
+                                    "telefono": telefono,
+                                    "referencia": referencia,
+                                },
+                            )
+
+                        escritos.append(cliente)
+                        if created:
+                            creados += 1
+                            nuevos.append(cliente)
+                        else:
+                            actualizados += 1
 
-                    if created:
-                        creados += 1
-                    else:
-                        actualizados += 1
+                    with perfil.fase("escribir"):
+                        indexar_clientes(escritos)
+                        importacion = registro.guardar()
+                    with perfil.fase("casar"):
+                        duplicados = marcar_duplicados(nuevos, importacion)
+            perfil.guardar(importacion)
 
             messages.success(
                 request,
-                f"Clientes importados correctamente. Nuevos: {creados} | Actualizados: {actualizados}",
+                f"Clientes importados correctamente. Nuevos: {creados} | Actualizados: {actualizados} "
+                f"| Sin cambios: {importacion.sin_cambios} | Posibles duplicados: {len(duplicados)}",
             )
-            return redirect("sistema:lista_clientes")
+            return redirect("sistema:importacion_detail", pk=importacion.pk)
 
         except Exception as e:
             logger.exception("ERROR EN IMPORTAR CLIENTES")
@@ -210,22 +317,230 @@ def importar_clientes(request):
     return render(request, "sistema/importar_clientes.html")
 
 
+# -----------------------------
+# BITÁCORA DE IMPORTACIONES
+# -----------------------------
+@vista_de_lectura
+def importacion_list(request):
+    importaciones = Importacion.objects.all()[:200]
+    return render(request, "sistema/importaciones_list.html", {"importaciones": importaciones})
+
+
+def importacion_detail(request, pk):
+    importacion = get_object_or_404(Importacion, pk=pk)
+    anterior = (
+        Importacion.objects.filter(tipo=importacion.tipo, created_at__lt=importacion.created_at)
+        .order_by("-created_at")
+        .first()
+    )
+    duplicados = importacion.duplicados.select_related("cliente", "candidato")[:200]
+    return render(
+        request,
+        "sistema/importacion_detail.html",
+        {"importacion": importacion, "anterior": anterior, "duplicados": duplicados},
+    )
+
+
 # -----------------------------
 # LISTADOS
 # -----------------------------
+@vista_de_lectura
 def lista_productos(request):
     productos = Producto.objects.all().order_by("codigo")
     return render(request, "sistema/lista_productos.html", {"productos": productos})
 
 
+@vista_de_lectura
 def lista_clientes(request):
     clientes = Cliente.objects.all().order_by("comercio")
     return render(request, "sistema/lista_clientes.html", {"clientes": clientes})
 
 
+@vista_de_lectura
+async def producto_autocomplete(request):
+    """JSON para autocompletar productos por prefijo de código (desde el snapshot)."""
+    q = request.GET.get("q", "").strip()
+    if not q:
+        return JsonResponse({"productos": []})
+
+    if await _busqueda_superada(request):
+        return HttpResponse(status=204)
+
+    catalogo = await sync_to_async(obtener_catalogo)()
+    return JsonResponse(
+        {
+            "productos": [
+                {
+                    "id": p.id,
+                    "codigo": p.codigo,
+                    "descripcion": p.descripcion,
+                    "venta_cjs": str(p.venta_cjs),
+                    "venta_pzs": str(p.venta_pzs),
+                }
+                for p in catalogo.con_prefijo(q, limite=20)
+            ]
+        }
+    )
+
+
+# -----------------------------
+# ESTADO DE CUENTA POR CLIENTE
+# -----------------------------
+def _estado_cuenta_params(request, pk):
+    """Lee desde/hasta/despues (cursor 'YYYY-MM-DD_id') y arma el estado de cuenta."""
+    cursor = None
+    m = re.fullmatch(r"(\d{4}-\d{2}-\d{2})_(\d+)", request.GET.get("despues", ""))
+    if m:
+        try:
+            cursor = (date.fromisoformat(m.group(1)), int(m.group(2)))
+        except ValueError:
+            cursor = None
+
+    desde = _fecha_param(request, "desde")
+    hasta = _fecha_param(request, "hasta")
+    estado = estado_de_cuenta(pk, desde=desde, hasta=hasta, cursor=cursor)
+
+    siguiente = estado["siguiente"]
+    estado["siguiente"] = f"{siguiente[0].isoformat()}_{siguiente[1]}" if siguiente else ""
+    return estado
+
+
+@vista_de_lectura
+def cliente_estado_cuenta(request, pk):
+    cliente = get_object_or_404(Cliente, pk=pk)
+    estado = _estado_cuenta_params(request, pk)
+
+    params = request.GET.copy()
+    params.pop("despues", None)
+
+    context = {
+        "cliente": cliente,
+        "desde": request.GET.get("desde", ""),
+        "hasta": request.GET.get("hasta", ""),
+        "querystring": params.urlencode(),
+        "es_primera_pagina": not request.GET.get("despues"),
+        **estado,
+    }
+    return render(request, "sistema/estado_cuenta.html", context)
+
+
+@vista_de_lectura
+def cliente_estado_cuenta_api(request, pk):
+    get_object_or_404(Cliente, pk=pk)
+    estado = _estado_cuenta_params(request, pk)
+
+    def dinero(valor):
+        return str(valor) if valor is not None else None
+
+    data = {
+        "siguiente": estado["siguiente"] or None,
+        "ventas": [
+            {
+                "id": v.id,
+                "fecha": v.fecha.isoformat(),
+                "folio": v.remision.folio,
+                "total": dinero(v.total),
+                "acumulado": dinero(v.acumulado),
+                "detalles": [
+                    {
+                        "producto": d.producto.codigo,
+                        "unidad": d.unidad,
+                        "cantidad": str(d.cantidad),
+                        "precio_unitario": dinero(d.precio_unitario),
+                        "subtotal": dinero(d.subtotal),
+                    }
+                    for d in v.detalles.all()
+                ],
+            }
+            for v in estado["ventas"]
+        ],
+    }
+    if estado["meses"] is not None:
+        data.update(
+            saldo_inicial=dinero(estado["saldo_inicial"]),
+            total_periodo=dinero(estado["total_periodo"]),
+            meses=[
+                {
+                    "mes": m["mes"].strftime("%Y-%m"),
+                    "ventas": m["ventas"],
+                    "total": dinero(m["total"]),
+                    "acumulado": dinero(m["acumulado"]),
+                }
+                for m in estado["meses"]
+            ],
+            top_productos=[
+                {
+                    "producto": p["producto__codigo"],
+                    "descripcion": p["producto__descripcion"],
+                    "cantidad": str(p["cantidad"]),
+                    "importe": dinero(p["importe"]),
+                    "lineas": p["lineas"],
+                }
+                for p in estado["top_productos"]
+            ],
+        )
+    return JsonResponse(data)
+
+
+# -----------------------------
+# REPORTE DE MARGEN BRUTO
+# -----------------------------
+class _Eco:
+    """Pseudo-archivo para csv.writer: regresa la línea en vez de escribirla."""
+
+    def write(self, value):
+        return value
+
+
+@vista_de_lectura
+def reporte_margen(request):
+    agrupar = request.GET.get("agrupar", "producto")
+    if agrupar not in DIMENSIONES_MARGEN:
+        agrupar = "producto"
+    desde = _fecha_param(request, "desde")
+    hasta = _fecha_param(request, "hasta")
+
+    filas = margen_cacheado(agrupar, desde, hasta)
+
+    if request.GET.get("formato") == "csv":
+        columnas = DIMENSIONES_MARGEN[agrupar] + ["lineas", "venta_total", "costo", "margen", "margen_pct"]
+        writer = csv.writer(_Eco())
+        contenido = itertools.chain(
+            [writer.writerow(columnas)],
+            (writer.writerow([fila.get(c) for c in columnas]) for fila in filas),
+        )
+        response = StreamingHttpResponse(contenido, content_type="text/csv; charset=utf-8")
+        response["Content-Disposition"] = f'attachment; filename="margen_{agrupar}.csv"'
+        return response
+
+    params = request.GET.copy()
+    params["formato"] = "csv"
+
+    totales = {
+        "venta_total": sum((f["venta_total"] for f in filas), Decimal("0.00")),
+        "costo": sum((f["costo"] for f in filas), Decimal("0.00")),
+    }
+    totales["margen"] = totales["venta_total"] - totales["costo"]
+
+    context = {
+        # En pantalla se corta (agrupar por línea puede ser un año entero); el CSV va completo
+        "filas": filas[:1000],
+        "recortado": len(filas) > 1000,
+        "total_filas": len(filas),
+        "totales": totales,
+        "agrupar": agrupar,
+        "dimensiones": list(DIMENSIONES_MARGEN),
+        "desde": request.GET.get("desde", ""),
+        "hasta": request.GET.get("hasta", ""),
+        "csv_querystring": params.urlencode(),
+    }
+    return render(request, "sistema/reporte_margen.html", context)
+
+
 # -----------------------------
 # BÚSQUEDA GLOBAL
 # -----------------------------
+@vista_de_lectura
 def busqueda_global(request):
     q = request.GET.get("q", "").strip()
 
@@ -244,12 +559,169 @@ def busqueda_global(request):
     return render(request, "sistema/busqueda.html", {"q": q, "productos": productos, "clientes": clientes})
 
 
+# Búsqueda mientras se escribe: el navegador espera DEBOUNCE_BUSQUEDA sin teclear antes de
+# pedir, manda ?pagina=<token al cargar la página> y ?seq=N creciente y cancela
+# (AbortController) la petición anterior. Aquí, si ya llegó una tecla más nueva de la misma
+# página se responde 204 sin consultar la BD. Solo bajo ASGI se espera además
+# DEBOUNCE_BUSQUEDA antes de decidir: con WSGI (el Procfile) esa espera retendría un worker
+# síncrono por tecla. La entrada se borra al contestar la más nueva: el seq vuelve a empezar
+# en cada carga y cada pestaña lleva su propio token, así que no se comparan seq de páginas
+# distintas. Sin token no hay debounce. Es por proceso (cada worker lleva su registro).
+DEBOUNCE_BUSQUEDA = 0.15
+LIMITE_BUSQUEDA = 20
+_ultima_busqueda = {}
+
+
+async def _busqueda_superada(request):
+    seq = safe_int(request.GET.get("seq"), default=0)
+    pagina = request.GET.get("pagina", "")[:64]
+    if not seq or not pagina:
+        return False
+
+    clave = (request.path, pagina)
+    if len(_ultima_busqueda) > 10_000:
+        _ultima_busqueda.clear()
+    _ultima_busqueda[clave] = max(seq, _ultima_busqueda.get(clave, 0))
+
+    if isinstance(request, ASGIRequest):
+        await asyncio.sleep(DEBOUNCE_BUSQUEDA)
+    if _ultima_busqueda.get(clave, 0) > seq:
+        return True
+    _ultima_busqueda.pop(clave, None)
+    return False
+
+
+async def _lista(qs):
+    return [fila async for fila in qs]
+
+
+@vista_de_lectura
+async def busqueda_api(request):
+    """Versión JSON/async de busqueda_global: productos y clientes en paralelo."""
+    q = request.GET.get("q", "").strip()
+    if not q:
+        return JsonResponse({"q": q, "productos": [], "clientes": []})
+
+    if await _busqueda_superada(request):
+        return HttpResponse(status=204)
+
+    productos, clientes = await asyncio.gather(
+        _lista(
+            Producto.objects.filter(Q(codigo__icontains=q) | Q(descripcion__icontains=q))
+            .order_by("codigo")
+            .values("id", "codigo", "descripcion")[:LIMITE_BUSQUEDA]
+        ),
+        _lista(
+            Cliente.objects.filter(
+                Q(proveedor__icontains=q)
+                | Q(comercio__icontains=q)
+                | Q(contacto__icontains=q)
+                | Q(direccion__icontains=q)
+            )
+            .order_by("comercio")
+            .values("id", "proveedor", "comercio", "direccion", "contacto")[:LIMITE_BUSQUEDA]
+        ),
+    )
+    return JsonResponse({"q": q, "productos": productos, "clientes": clientes})
+
+
 # -----------------------------
 # REMISIONES
 # -----------------------------
+def _rango_mes(mes):
+    """'2025-03' -> (date(2025, 3, 1), date(2025, 4, 1)). None si no es válido."""
+    m = re.fullmatch(r"(\d{4})-(\d{1,2})", mes or "")
+    if not m or not 1 <= int(m.group(2)) <= 12:
+        return None
+    year, month = int(m.group(1)), int(m.group(2))
+    inicio = date(year, month, 1)
+    fin = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+    return inicio, fin
+
+
+def _meses_entre(primera, ultima):
+    """Primer día de cada mes de `ultima` a `primera` (descendente); [] si no hay fechas."""
+    if primera is None or ultima is None:
+        return []
+    meses = []
+    year, month = ultima.year, ultima.month
+    while (year, month) >= (primera.year, primera.month):
+        meses.append(date(year, month, 1))
+        year, month = (year - 1, 12) if month == 1 else (year, month - 1)
+    return meses
+
+
+def _fecha_param(request, nombre):
+    """Lee una fecha YYYY-MM-DD del querystring; None si falta o es inválida."""
+    try:
+        return parse_date(request.GET.get(nombre, "").strip())
+    except ValueError:
+        return None
+
+
+@vista_de_lectura
 def remision_list(request):
-    remisiones = Remision.objects.select_related("cliente").order_by("-fecha", "-id")
-    return render(request, "sistema/remisiones_list.html", {"remisiones": remisiones})
+    cliente_id = request.GET.get("cliente", "")
+    mes = request.GET.get("mes", "")
+    desde = _fecha_param(request, "desde")
+    hasta = _fecha_param(request, "hasta")
+    folio = request.GET.get("folio", "").strip()
+    con_imagen = request.GET.get("imagen", "")
+    con_venta = request.GET.get("venta", "")
+
+    # Filtros en el mismo orden que los índices (cliente, -fecha, -id) / (-fecha, -id)
+    filtros = Remision.objects.all()
+    if cliente_id.isdigit():
+        filtros = filtros.filter(cliente_id=cliente_id)
+
+    # Meses para navegar (mismo criterio que upload_to="remisiones/%Y/%m/"): del primero
+    # al último con remisiones. Cada extremo es una sola lectura del índice, no un
+    # DISTINCT sobre todas las remisiones del cliente
+    fechas = filtros.order_by().values_list("fecha", flat=True)
+    meses = _meses_entre(fechas.order_by("fecha").first(), fechas.order_by("-fecha").first())
+
+    rango = _rango_mes(mes)
+    if rango:
+        filtros = filtros.filter(fecha__gte=rango[0], fecha__lt=rango[1])
+    if desde:
+        filtros = filtros.filter(fecha__gte=desde)
+    if hasta:
+        filtros = filtros.filter(fecha__lte=hasta)
+    if folio:
+        filtros = filtros.filter(folio__startswith=folio)
+    if con_imagen == "1":
+        filtros = filtros.exclude(imagen="").exclude(imagen__isnull=True)
+    elif con_imagen == "0":
+        filtros = filtros.filter(Q(imagen="") | Q(imagen__isnull=True))
+    # Con venta: viva o archivada (periodo cerrado)
+    if con_venta == "1":
+        filtros = filtros.filter(Q(venta__isnull=False) | Q(venta_archivada__isnull=False))
+    elif con_venta == "0":
+        filtros = filtros.filter(venta__isnull=True, venta_archivada__isnull=True)
+
+    remisiones = filtros.select_related("cliente").order_by("-fecha", "-id")
+    page = Paginator(remisiones, 100).get_page(request.GET.get("page"))
+
+    # Querystring sin "page" para armar los links del paginador
+    params = request.GET.copy()
+    params.pop("page", None)
+
+    context = {
+        "remisiones": page.object_list,
+        "page": page,
+        "meses": meses,
+        # Solo el cliente elegido; los demás se buscan mientras se escribe (busqueda_api)
+        "cliente": Cliente.objects.filter(pk=cliente_id).first() if cliente_id.isdigit() else None,
+        "cliente_sel": cliente_id,
+        "mes_sel": mes if rango else "",
+        "desde": request.GET.get("desde", ""),
+        "hasta": request.GET.get("hasta", ""),
+        "folio": folio,
+        "imagen_sel": con_imagen,
+        "venta_sel": con_venta,
+        "querystring": params.urlencode(),
+    }
+    return render(request, "sistema/remisiones_list.html", context)
 
 
 def remision_create(request):
@@ -272,6 +744,7 @@ def remision_detail(request, pk):
 # -----------------------------
 # VENTAS CRUD
 # -----------------------------
+@vista_de_lectura
 def venta_list(request):
     ventas = Venta.objects.select_related("remision", "remision__cliente").order_by("-fecha", "-id")
     return render(request, "sistema/ventas_list.html", {"ventas": ventas})
@@ -283,6 +756,11 @@ def venta_create_from_remision(request, remision_id):
 
     if hasattr(remision, "venta"):
         return redirect("sistema:venta_edit", pk=remision.venta.pk)
+    if hasattr(remision, "venta_archivada"):
+        return redirect("sistema:venta_detail", pk=remision.venta_archivada.pk)
+    if PeriodoCerrado.cerrado(remision.fecha):
+        messages.error(request, "La remisión es de un periodo cerrado; no se le puede registrar venta.")
+        return redirect("sistema:remision_detail", pk=remision.pk)
 
     venta = Venta.objects.create(
         remision=remision,
@@ -296,140 +774,430 @@ def venta_create_from_remision(request, remision_id):
 
 
 def venta_detail(request, pk):
-    venta = get_object_or_404(Venta.objects.select_related("remision", "remision__cliente"), pk=pk)
+    # Las ventas de periodos cerrados conservan su id en el archivo
+    venta = Venta.objects.select_related("remision", "remision__cliente").filter(pk=pk).first()
+    archivada = venta is None
+    if archivada:
+        venta = get_object_or_404(VentaArchivada.objects.select_related("remision", "remision__cliente"), pk=pk)
     detalles = venta.detalles.select_related("producto").all()
-    return render(request, "sistema/venta_detail.html", {"venta": venta, "detalles": detalles})
+    return render(
+        request, "sistema/venta_detail.html", {"venta": venta, "detalles": detalles, "archivada": archivada}
+    )
 
 
-@transaction.atomic
 def venta_edit(request, pk):
-    venta = get_object_or_404(Venta.objects.select_related("remision", "remision__cliente"), pk=pk)
-
+    venta = Venta.objects.select_related("remision", "remision__cliente").filter(pk=pk).first()
+    if venta is None:
+        get_object_or_404(VentaArchivada, pk=pk)
+        messages.error(request, "La venta es de un periodo cerrado y ya no se puede editar.")
+        return redirect("sistema:venta_detail", pk=pk)
+
+    # La versión que vio el usuario; un POST inválido la regresa tal cual (no la de la BD)
+    # para que el siguiente envío de esos mismos datos no pase por encima de otro guardado
+    version = venta.version
+    conflicto = False
+    # Un solo snapshot para todos los renglones del formset
+    form_kwargs = {"catalogo": obtener_catalogo()}
     if request.method == "POST":
         form = VentaForm(request.POST, instance=venta)
-        formset = DetalleVentaFormSet(request.POST, instance=venta)
+        formset = DetalleVentaFormSet(request.POST, instance=venta, form_kwargs=form_kwargs)
+        version = safe_int(request.POST.get("version"), default=-1)
 
         if form.is_valid() and formset.is_valid():
-            form.save()
-            formset.save()
-            venta.recalcular_totales(commit=True)
-            messages.success(request, "Venta actualizada correctamente.")
-            return redirect("sistema:venta_detail", pk=venta.pk)
+            # Solo la escritura va dentro de la transacción. El UPDATE condicionado a la
+            # versión que vio el usuario evita que dos ediciones se pisen en silencio.
+            with transaction.atomic():
+                actualizadas = Venta.objects.filter(pk=venta.pk, version=version).update(
+                    version=F("version") + 1
+                )
+                if actualizadas:
+                    form.instance.version = version + 1
+                    form.save()
+                    formset.save()
+                    venta.recalcular_totales(commit=True)
+                    registrar_salidas_venta(venta)
+                    marcar_desactualizados([venta.cliente_id])
+
+            if actualizadas:
+                messages.success(request, "Venta actualizada correctamente.")
+                return redirect("sistema:venta_detail", pk=venta.pk)
+
+            # Conflicto: la misma página que el GET (con las líneas actuales) más el aviso
+            conflicto = True
     else:
         form = VentaForm(instance=venta)
-        formset = DetalleVentaFormSet(instance=venta)
+        formset = DetalleVentaFormSet(instance=venta, form_kwargs=form_kwargs)
+
+    # Por default las líneas se editan una por una (venta_linea); ?completo=1 muestra el
+    # formset de todas las líneas (sirve sin JavaScript)
+    completo = request.GET.get("completo") == "1"
+    lineas = [] if completo else list(venta.detalles.select_related("producto").order_by("id"))
+
+    # Venta vacía: se ofrece llenarla con lo que el cliente suele pedir
+    habitual = habituales = None
+    if request.method == "GET" and not completo and not lineas:
+        habitual, habituales = pedido_habitual(venta.cliente_id)
+
+    return render(
+        request,
+        "sistema/venta_edit.html",
+        {
+            "venta": venta,
+            "form": form,
+            "formset": formset,
+            "version": version,
+            "completo": completo,
+            "lineas": lineas,
+            "unidades": DetalleVenta.UNIDAD_CHOICES,
+            "habitual": habitual,
+            "habituales": habituales,
+            "conflicto": conflicto,
+        },
+        status=409 if conflicto else 200,
+    )
+
+
+@require_POST
+def venta_pedido_habitual(request, pk):
+    """
+    Agrega a la venta las líneas elegidas del pedido habitual de su cliente con un solo
+    bulk_create; totales, versión e inventario se actualizan una vez para todas.
+    """
+    venta = get_object_or_404(Venta.objects.only("id", "fecha", "version", "cliente_id"), pk=pk)
+    version = safe_int(request.POST.get("version"), default=-1)
+
+    # Cada línea elegida viene como "producto-unidad" con su cantidad_<producto-unidad>:
+    # no se vuelve a calcular el pedido (sus ids cambian si otra venta lo dejó no vigente)
+    elegidas = {}
+    for valor in request.POST.getlist("linea"):
+        producto_id, _, unidad = valor.partition("-")
+        cantidad = safe_decimal(request.POST.get(f"cantidad_{valor}"))
+        if safe_int(producto_id) and cantidad.is_finite() and cantidad > 0:
+            elegidas[(safe_int(producto_id), unidad)] = cantidad.quantize(Decimal("0.001"))
+
+    detalles = detalles_para_venta(venta, elegidas)
+    if not detalles:
+        messages.info(request, "No había líneas por agregar.")
+        return redirect("sistema:venta_edit", pk=venta.pk)
+
+    aumento = sum((d.subtotal for d in detalles), Decimal("0.00"))
+    try:
+        with transaction.atomic():
+            actualizadas = Venta.objects.filter(pk=venta.pk, version=version).update(
+                version=F("version") + 1,
+                subtotal=F("subtotal") + aumento,
+                total=F("total") + aumento,
+                updated_at=timezone.now(),
+            )
+            if actualizadas:
+                DetalleVenta.objects.bulk_create(detalles)
+                registrar_salidas_venta(venta)
+                marcar_desactualizados([venta.cliente_id])
+    except IntegrityError:
+        # Otra petición agregó uno de esos productos entre la lectura y el INSERT
+        actualizadas = 0
+
+    if actualizadas:
+        messages.success(request, f"Se agregaron {len(detalles)} líneas del pedido habitual.")
+    else:
+        messages.error(request, "La venta cambió mientras la editabas; revisa sus líneas y vuelve a intentar.")
+    return redirect("sistema:venta_edit", pk=venta.pk)
+
+
+@require_POST
+def venta_linea(request, pk, linea_id=None):
+    """
+    Alta, cambio o baja (borrar=1) de UNA línea desde venta_edit, sin reenviar el
+    formset: se valida solo esa línea y, en una transacción corta, se guarda, se ajusta
+    el total de la venta por la diferencia de su subtotal y se registran sus movimientos
+    de inventario. El trabajo no depende de cuántas líneas tenga la venta.
+
+    Responde JSON con la fila ya renderizada y los totales y la versión nuevos; 400 si
+    la línea no es válida y 409 si la venta cambió desde la `version` que manda el cliente.
+    """
+    venta = get_object_or_404(Venta.objects.only("id", "fecha", "version", "cliente_id"), pk=pk)
+    version = safe_int(request.POST.get("version"), default=-1)
+    borrar = request.POST.get("borrar") == "1"
+
+    linea = antes = None
+    subtotal_antes = Decimal("0.00")
+    if linea_id is not None:
+        linea = get_object_or_404(DetalleVenta.objects.select_related("producto"), pk=linea_id, venta_id=venta.pk)
+        antes = (linea.producto, linea.cantidad, linea.unidad)
+        subtotal_antes = linea.subtotal
+    elif borrar:
+        return JsonResponse({"errores": {"__all__": ["Falta la línea a borrar."]}}, status=400)
+
+    despues = None
+    if not borrar:
+        form = DetalleVentaForm(request.POST, instance=linea or DetalleVenta(venta=venta))
+        if not form.is_valid():
+            return JsonResponse({"errores": form.errors}, status=400)
+        datos = form.cleaned_data
+        # La unicidad (venta, producto, unidad) no la valida el form porque venta no es campo
+        repetida = DetalleVenta.objects.filter(venta_id=venta.pk, producto=datos["producto"], unidad=datos["unidad"])
+        if linea is not None:
+            repetida = repetida.exclude(pk=linea.pk)
+        if repetida.exists():
+            return JsonResponse(
+                {"errores": {"producto": ["Ese producto ya está en la venta con esa unidad."]}}, status=400
+            )
+        despues = (datos["producto"], datos["cantidad"], datos["unidad"])
 
-    return render(request, "sistema/venta_edit.html", {"venta": venta, "form": form, "formset": formset})
+    try:
+        with transaction.atomic():
+            if borrar:
+                linea.delete()
+                diferencia = -subtotal_antes
+            else:
+                linea = form.save()
+                diferencia = linea.subtotal - subtotal_antes
+            actualizadas = Venta.objects.filter(pk=venta.pk, version=version).update(
+                version=F("version") + 1,
+                subtotal=F("subtotal") + diferencia,
+                total=F("total") + diferencia,
+                updated_at=timezone.now(),
+            )
+            if actualizadas:
+                registrar_cambio_linea(venta, antes, despues)
+                marcar_desactualizados([venta.cliente_id])
+            else:
+                transaction.set_rollback(True)
+    except IntegrityError:
+        # Otra petición agregó el mismo producto/unidad entre la validación y el INSERT
+        actualizadas = 0
+
+    totales = Venta.objects.filter(pk=venta.pk).values("subtotal", "total", "version").get()
+    data = {
+        "venta": {
+            "subtotal": str(totales["subtotal"]),
+            "total": str(totales["total"]),
+            "version": totales["version"],
+        }
+    }
+    if not actualizadas:
+        data["conflicto"] = True
+        return JsonResponse(data, status=409)
+
+    data["linea"] = None if borrar else linea.pk
+    data["html"] = "" if borrar else render_to_string("sistema/_venta_linea.html", {"d": linea}, request)
+    return JsonResponse(data)
 
 
 # -----------------------------
-# IMPORTAR REMISIONES DESDE EXCEL
+# INVENTARIO
 # -----------------------------
-def importar_remisiones_excel(request):
+@vista_de_lectura
+def inventario(request):
     if request.method == "POST":
-        archivo = request.FILES.get("excel_file")
-        if not archivo:
-            return render(request, "sistema/importar_remisiones.html", {"error": "No se subió archivo."})
+        form = EntradaInventarioForm(request.POST)
+        if form.is_valid():
+            registrar_entrada(
+                form.cleaned_data["producto"],
+                form.cleaned_data["cantidad"],
+                form.cleaned_data["unidad"],
+                referencia=form.cleaned_data["referencia"],
+            )
+            messages.success(request, "Entrada registrada.")
+            return redirect("sistema:inventario")
+    else:
+        form = EntradaInventarioForm()
 
-        wb = load_workbook(archivo, data_only=True)
+    existencias = existencias_actuales()
+    productos = []
+    for p in Producto.objects.order_by("codigo").only("id", "codigo", "descripcion", "piezas_por_paquete"):
+        piezas = existencias.get(p.id, Decimal("0"))
+        paquetes, sueltas = divmod(piezas, p.piezas_por_paquete) if p.piezas_por_paquete > 1 else (None, piezas)
+        productos.append({"producto": p, "piezas": piezas, "paquetes": paquetes, "sueltas": sueltas})
 
-        sheet_name = "REL REM ENTREG1"
-        if sheet_name not in wb.sheetnames:
-            return render(
-                request,
-                "sistema/importar_remisiones.html",
-                {"error": f"No encontré la hoja '{sheet_name}'. Hojas: {wb.sheetnames}"},
-            )
+    return render(request, "sistema/inventario.html", {"form": form, "productos": productos})
 
-        ws = wb[sheet_name]
 
-        header_row = 5
-        date_map = {}
+# -----------------------------
+# IMPORTAR REMISIONES DESDE EXCEL
+# -----------------------------
+LOTE_REMISIONES = 1000
 
-        mon_map = {
-            "Ene": 1, "Feb": 2, "Mar": 3, "Abr": 4, "May": 5, "Jun": 6,
-            "Jul": 7, "Ago": 8, "Sep": 9, "Oct": 10, "Nov": 11, "Dic": 12,
-            "Jan": 1, "Feb": 2, "Mar": 3, "Apr": 4, "May": 5, "Jun": 6,
-            "Jul": 7, "Aug": 8, "Sep": 9, "Oct": 10, "Nov": 11, "Dec": 12,
-        }
 
-        for col in range(1, ws.max_column + 1):
-            val = ws.cell(row=header_row, column=col).value
-            if isinstance(val, str):
-                m = re.search(r"(\d{2})/([A-Za-z]{3})/(\d{2})", val)
-                if m:
-                    dd, mon, yy = m.groups()
-                    month = mon_map.get(mon)
-                    if month:
-                        year = 2000 + int(yy)
-                        date_map[col] = date(year, month, int(dd))
-
-        if not date_map:
-            return render(request, "sistema/importar_remisiones.html", {"error": "No pude detectar columnas con fechas en la fila 5."})
-
-        creadas = 0
-        ya_existian = 0
-        ventas_creadas = 0
-
-        for row in range(6, ws.max_row + 1):
-            clave_cte = ws.cell(row=row, column=3).value
-            comercio = ws.cell(row=row, column=4).value
-            contacto = ws.cell(row=row, column=5).value
-
-            if not clave_cte:
-                continue
-
-            clave_cte = safe_str(clave_cte)
-            comercio = safe_str(comercio)
-            contacto = safe_str(contacto)
-
-            cliente, _ = Cliente.objects.get_or_create(
-                proveedor=clave_cte,
-                defaults={
-                    "numero": 0,
-                    "comercio": comercio,
-                    "contacto": contacto,
-                    "direccion": "",
-                    "telefono": "",
-                    "referencia": "",
-                },
-            )
+def importar_remisiones_excel(request):
+    """
+    Uno o varios libros con una o varias hojas de entregas. Las hojas se leen en paralelo
+    (sistema.remisiones_excel) y el resultado se junta en una sola escritura por lotes:
+    clientes nuevos, remisiones nuevas y sus ventas vacías, cada uno con un bulk_create.
+    """
+    if request.method == "POST":
+        archivos = request.FILES.getlist("excel_file")
+        if not archivos:
+            return render(request, "sistema/importar_remisiones.html", {"error": "No se subió archivo."})
 
-            for col, fecha in date_map.items():
-                cell_val = ws.cell(row=row, column=col).value
-                if not cell_val:
-                    continue
+        # Hojas a importar separadas por coma; vacío = todas las que tengan fila de fechas
+        elegidas = {h.strip() for h in request.POST.get("hojas", "").split(",") if h.strip()}
+
+        perfil = PerfilImportacion(perfilar=bool(request.POST.get("perfilar")))
+        with perfil:
+            with perfil.fase("abrir"):
+                registro = RegistroImportacion(
+                    Importacion.TIPO_REMISIONES, archivos, forzar=bool(request.POST.get("forzar"))
+                )
+                previa = registro.ya_importado()
+            if previa:
+                return render(
+                    request,
+                    "sistema/importar_remisiones.html",
+                    {"duplicado": previa},
+                )
+
+            with rutas_en_disco(archivos) as rutas:
+                with perfil.fase("abrir"):
+                    tareas = [
+                        (archivo.name, ruta, hoja)
+                        for archivo, ruta in zip(archivos, rutas)
+                        for hoja in hojas_de(ruta)
+                        if not elegidas or hoja in elegidas
+                    ]
+                if not tareas:
+                    return render(
+                        request,
+                        "sistema/importar_remisiones.html",
+                        {"error": f"No encontré las hojas {', '.join(sorted(elegidas))} en los archivos."},
+                    )
 
-                if isinstance(cell_val, str) and "remision" in cell_val.lower():
-                    folio = cell_val.replace("Remision", "").replace("remision", "").strip()
-                    if not folio:
-                        continue
+                # Tiempo de pared: con el pool, cerca de lo que tarda la hoja más lenta
+                with perfil.fase("leer"):
+                    leidas = leer_hojas(
+                        [(ruta, hoja) for _, ruta, hoja in tareas], settings.IMPORTACION_PROCESOS
+                    )
 
-                    remision, created = Remision.objects.get_or_create(
-                        cliente=cliente,
-                        folio=folio,
-                        defaults={"fecha": fecha, "observaciones": ""},
+            # Juntar todas las hojas: un cliente por clave y una remisión por (clave, folio);
+            # si el folio aparece en dos hojas gana la primera.
+            hojas = []
+            clientes = {}
+            remisiones = {}
+            duplicadas = 0
+            with perfil.fase("normalizar"):
+                for (nombre, _, hoja), leida in zip(tareas, leidas):
+                    hojas.append({
+                        "archivo": nombre,
+                        "hoja": hoja,
+                        "encabezado": leida["encabezado"],
+                        "dias": leida["dias"],
+                        "clientes": len(leida["filas"]),
+                        "remisiones": sum(len(folios) for *_, folios in leida["filas"]),
+                        "segundos": leida["segundos"],
+                    })
+                    for clave, comercio, contacto, folios in leida["filas"]:
+                        perfil.filas += 1
+                        comercio_previo, contacto_previo = clientes.get(clave, ("", ""))
+                        clientes[clave] = (comercio_previo or comercio, contacto_previo or contacto)
+                        for folio, fecha in folios:
+                            if (clave, folio) in remisiones:
+                                duplicadas += 1
+                            else:
+                                remisiones[(clave, folio)] = fecha
+
+            if not any(h["encabezado"] for h in hojas):
+                return render(
+                    request,
+                    "sistema/importar_remisiones.html",
+                    {"error": "No pude detectar una fila de fechas en ninguna hoja.", "hojas": hojas},
+                )
+
+            with perfil.fase("casar"):
+                # Solo las remisiones (cliente, folio) nuevas o con fecha distinta a la última importación
+                pendientes = {
+                    (clave, folio): fecha
+                    for (clave, folio), fecha in remisiones.items()
+                    if registro.cambio(f"{clave}|{folio}", huella(fecha.isoformat()))
+                }
+                # Periodos cerrados: sus ventas ya están archivadas y no se agregan más
+                corte = PeriodoCerrado.corte()
+                cerradas = 0
+                if corte:
+                    cerradas = sum(1 for fecha in pendientes.values() if fecha < corte)
+                    pendientes = {clave: fecha for clave, fecha in pendientes.items() if fecha >= corte}
+
+                folios_por_clave = {}
+                for clave, folio in pendientes:
+                    folios_por_clave.setdefault(clave, set()).add(folio)
+
+                cliente_ids = {}
+                for bloque in en_bloques(folios_por_clave):
+                    for pk, proveedor in (
+                        Cliente.objects.filter(proveedor__in=bloque).order_by("pk").values_list("pk", "proveedor")
+                    ):
+                        cliente_ids.setdefault(proveedor, pk)
+                # La misma clave escrita con otros espacios/guiones, o la de un cliente ya fusionado
+                cliente_ids.update(resolver_claves(clave for clave in folios_por_clave if clave not in cliente_ids))
+
+                existentes = set()
+                clave_de = {pk: clave for clave, pk in cliente_ids.items()}
+                for bloque in en_bloques(clave_de, 200):
+                    folios = set().union(*(folios_por_clave[clave_de[pk]] for pk in bloque))
+                    existentes.update(
+                        (clave_de[cliente_id], folio)
+                        for cliente_id, folio in Remision.objects.filter(
+                            cliente_id__in=bloque, folio__in=folios
+                        ).values_list("cliente_id", "folio")
                     )
 
-                    if created:
-                        creadas += 1
-                        if not hasattr(remision, "venta"):
-                            Venta.objects.create(
-                                remision=remision,
-                                fecha=remision.fecha,
-                                subtotal=Decimal("0.00"),
-                                total=Decimal("0.00"),
-                                descuento=Decimal("0.00"),
-                                iva=Decimal("0.00"),
-                            )
-                            ventas_creadas += 1
-                    else:
-                        ya_existian += 1
+            # La fase "confirmar" incluye guardar la bitácora y el commit
+            with perfil.fase("confirmar"), transaction.atomic():
+                with perfil.fase("escribir"):
+                    nuevos = [
+                        Cliente(
+                            numero=0,
+                            proveedor=clave,
+                            comercio=clientes[clave][0],
+                            contacto=clientes[clave][1],
+                            direccion="",
+                            telefono="",
+                            referencia="",
+                        )
+                        for clave in folios_por_clave
+                        if clave not in cliente_ids
+                    ]
+                    Cliente.objects.bulk_create(nuevos, batch_size=LOTE_REMISIONES)
+                    cliente_ids.update((cliente.proveedor, cliente.pk) for cliente in nuevos)
+                    indexar_clientes(nuevos)
+
+                    creadas = Remision.objects.bulk_create(
+                        [
+                            Remision(cliente_id=cliente_ids[clave], folio=folio, fecha=fecha, observaciones="")
+                            for (clave, folio), fecha in pendientes.items()
+                            if (clave, folio) not in existentes
+                        ],
+                        batch_size=LOTE_REMISIONES,
+                    )
+                    ventas = Venta.objects.bulk_create(
+                        Venta.objects.vacias((r.pk, r.cliente_id, r.fecha) for r in creadas),
+                        batch_size=LOTE_REMISIONES,
+                    )
+
+                importacion = registro.guardar()
+                # Los clientes nuevos que se parecen a uno existente quedan para revisar en el admin
+                with perfil.fase("casar"):
+                    duplicados = marcar_duplicados(nuevos, importacion)
+        perfil.guardar(importacion)
 
         return render(
             request,
             "sistema/importar_remisiones.html",
-            {"ok": True, "creadas": creadas, "ya_existian": ya_existian, "ventas_creadas": ventas_creadas},
+            {
+                "ok": True,
+                "creadas": len(creadas),
+                "ya_existian": len(pendientes) - len(creadas),
+                "ventas_creadas": len(ventas),
+                "clientes_creados": len(nuevos),
+                "posibles_duplicados": len(duplicados),
+                "duplicadas": duplicadas,
+                "cerradas": cerradas,
+                "sin_cambios": importacion.sin_cambios,
+                "importacion": importacion,
+                "hojas": hojas,
+                "segundos_lectura": next(
+                    (f["segundos"] for f in importacion.metricas["fases"] if f["fase"] == "leer"), None
+                ),
+            },
         )
 
     return render(request, "sistema/importar_remisiones.html")
@@ -438,6 +1206,7 @@ def importar_remisiones_excel(request):
 # -----------------------------
 # VENTAS (FILTRO POR CLIENTE Y PRODUCTO)
 # -----------------------------
+@vista_de_lectura
 def ventas_lista(request):
     cliente_id = request.GET.get("cliente")
     producto_id = request.GET.get("producto")